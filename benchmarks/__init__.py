@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Benchmarks for python-cmuclmtk.
+
+    The benchmarks run every wrapper and the text2lm pipeline on synthetic Zipf-distributed corpora of different sizes and record wall time, throughput, CPU time and peak memory of the tools as JSON, so that the results of different versions can be compared. By default, lightweight stand-ins for the CMUCLMTK tools are used (see benchmarks.standin), which measure the overhead of the wrappers and don't require CMUCLMTK to be installed.
+
+    Run "python -m benchmarks --help" from the root of the repository for usage.
+"""
+
+from .corpus import generate_corpus
+from .standin import install_standins
+from .runner import run_benchmarks, compare
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import sys
+import json
+import argparse
+
+from .runner import run_benchmarks, compare
+
+def parse_size(size):
+    """
+        Parses sizes like '512K', '10M' or '1G' into a number of bytes.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    size = size.strip().upper()
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+def print_result(result):
+    rss = result['tool_max_rss']
+    print('%-22s %-52s %10d bytes %9.3f s %9.2f MB/s %12s tool RSS' % (
+        result['benchmark'], json.dumps(result['params'], sort_keys=True), result['size'],
+        result['wall_time'], result['throughput'] or 0, rss if rss is not None else '-'))
+    sys.stdout.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks the python-cmuclmtk wrappers on synthetic corpora.')
+    parser.add_argument('--sizes', default='1M,10M', help='comma-separated corpus sizes, e.g. 1M,10M,100M (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='workers for the parallel benchmarks (default: number of CPUs)')
+    parser.add_argument('--benchmark', action='append', dest='names', help='only run this benchmark (can be given several times)')
+    parser.add_argument('--real', action='store_true', help='use the CMUCLMTK tools on $PATH instead of the stand-ins')
+    parser.add_argument('--data-dir', help='directory to keep the generated corpora in')
+    parser.add_argument('--output', '-o', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two JSON result files instead of running benchmarks')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        for name, params, size, old_time, new_time, ratio in compare(old, new):
+            print('%-22s %-52s %10d bytes %9.3f s -> %9.3f s  (x%.2f)' % (name, json.dumps(params, sort_keys=True), size, old_time, new_time, ratio or 0))
+        return 0
+
+    results = run_benchmarks([parse_size(size) for size in args.sizes.split(',')], repeat=args.repeat, workers=args.workers,
+                             standins=not args.real, data_dir=args.data_dir, names=args.names, log=print_result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
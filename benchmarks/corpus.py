@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Synthetic corpora for benchmarking.
+
+    Word frequencies follow Zipf's law (the frequency of the word with rank r is proportional to 1 / r^exponent), like those of natural language. Words are made up from letters, with frequent words being shorter, and every sentence is wrapped in <s> and </s> like in the corpora CMUCLMTK is usually fed with.
+"""
+
+import os
+import random
+import string
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Words generated at once
+BATCH_SIZE = 100000
+
+def make_word(rank):
+    """
+        Returns the made-up word for a rank (0 being the most frequent word): a, b, ..., z, aa, ab, ...
+    """
+    letters = string.ascii_lowercase
+    length = 1
+    while rank >= len(letters) ** length:
+        rank -= len(letters) ** length
+        length += 1
+    word = []
+    for _ in range(length):
+        rank, i = divmod(rank, len(letters))
+        word.append(letters[i])
+    return ''.join(reversed(word))
+
+class ZipfSampler(object):
+    """
+        Draws word ranks from a Zipf distribution over vocab_size words. Uses NumPy if available.
+    """
+    def __init__(self, vocab_size, exponent=1.0, seed=0):
+        weights = [1.0 / (rank ** exponent) for rank in range(1, vocab_size + 1)]
+        self.cum_weights = list(itertools.accumulate(weights))
+        if np is not None:
+            self._rng = np.random.default_rng(seed)
+            self._cdf = np.array(self.cum_weights) / self.cum_weights[-1]
+        else:
+            self._rng = random.Random(seed)
+
+    def sample(self, count):
+        if np is not None:
+            return np.searchsorted(self._cdf, self._rng.random(count), side='right').tolist()
+        return self._rng.choices(range(len(self.cum_weights)), cum_weights=self.cum_weights, k=count)
+
+def iter_sentences(words, vocab_size=50000, exponent=1.0, mean_length=12, seed=0):
+    """
+        Yields sentences (strings without trailing newline) with a total of (about) words words.
+    """
+    sampler = ZipfSampler(vocab_size, exponent, seed)
+    lengths = random.Random(seed)
+    vocab = [make_word(rank) for rank in range(vocab_size)]
+    remaining = words
+    while remaining > 0:
+        ranks = sampler.sample(min(BATCH_SIZE, remaining))
+        remaining -= len(ranks)
+        i = 0
+        while i < len(ranks):
+            length = max(1, int(lengths.expovariate(1.0 / mean_length)))
+            yield '<s> %s </s>' % ' '.join(vocab[rank] for rank in ranks[i:i+length])
+            i += length
+
+def generate_corpus(path, size, vocab_size=50000, exponent=1.0, mean_length=12, seed=0):
+    """
+        Writes a corpus of (at least) size bytes to path and returns the number of words in it (including sentence markers). Corpora with the same parameters are identical.
+    """
+    words = 0
+    written = 0
+    # Estimate of the average number of bytes per word, adjusted while writing
+    per_word = 5.0
+    with open(path, 'w') as f:
+        while written < size:
+            batch = max(1000, int((size - written) / per_word))
+            for sentence in iter_sentences(batch, vocab_size, exponent, mean_length, seed + words):
+                f.write(sentence + '\n')
+                written += len(sentence) + 1
+                words += sentence.count(' ') + 1
+                if written >= size:
+                    break
+            per_word = float(written) / words
+    return words
+
+def corpus_file(directory, size, **kwargs):
+    """
+        Returns the path of a corpus of size bytes in directory, generating it unless it exists already.
+    """
+    name = 'corpus-%d-%s.txt' % (size, '-'.join('%s=%s' % item for item in sorted(kwargs.items())))
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        temp_path = path + '.tmp'
+        generate_corpus(temp_path, size, **kwargs)
+        os.rename(temp_path, path)
+    return path
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Runs the benchmarks and compares their results.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import pathlib
+import platform
+import tempfile
+import datetime
+import importlib
+import inspect
+import multiprocessing
+
+from .corpus import corpus_file
+from .standin import install_standins
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MB = 1024 * 1024
+
+# Largest corpus that is also benchmarked as string held in memory
+MAX_STRING_SIZE = 64 * MB
+
+# Parameters swept by the benchmarks (the defaults of the wrappers are n=3 and buffersize=100)
+N_VALUES = (2, 3, 4)
+BUFFERSIZES = (16, 256)
+CUTOFFS = ([1, 1], [2, 4])
+
+def _load_cmuclmtk(standins):
+    """
+        Imports cmuclmtk, with the stand-in tools on $PATH if standins is a directory.
+    """
+    if standins:
+        os.environ['PATH'] = os.pathsep.join([install_standins(standins), os.environ.get('PATH', '')])
+    return importlib.import_module('cmuclmtk')
+
+def _lines(path):
+    with open(path) as f:
+        for line in f:
+            yield line
+
+def _accepts(func, name):
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+def _benchmarks(cmuclmtk, corpus, workdir, workers):
+    """
+        Returns a list of (name, params, function) for a corpus. The inputs the functions need (vocabulary, word and id n-grams, a binary language model) are created here, so that they are not part of the measurements.
+        Besides the defaults, the n-gram order (N_VALUES), the buffer size of text2idngram and wngram2idngram (BUFFERSIZES) and the cutoffs and spec_num of idngram2lm are swept, and text2lm is run with and without auto_tune. Benchmarks with default parameters keep the params they always had, so that their results can be compared to older ones.
+    """
+    path = pathlib.Path(corpus)
+    out = lambda name: os.path.join(workdir, name)
+    suffix = lambda n: '' if n == 3 else '.%d' % n
+    cmuclmtk.text2wfreq(path, out('wfreq'))
+    cmuclmtk.wfreq2vocab(out('wfreq'), out('vocab'))
+    for n in N_VALUES:
+        cmuclmtk.text2idngram(path, out('vocab'), out('idngram' + suffix(n)), n=n)
+        cmuclmtk.text2wngram(path, out('wngram' + suffix(n)), n=n)
+    cmuclmtk.idngram2lm(out('idngram'), out('vocab'), out('binlm'), arpa_output=False)
+    text = open(corpus).read() if os.path.getsize(corpus) <= MAX_STRING_SIZE else None
+
+    def text2wfreq_file():
+        with open(corpus) as f:
+            cmuclmtk.text2wfreq(f, out('wfreq.out'))
+
+    benchmarks = [
+        ('text2wfreq', {'input': 'path'}, lambda: cmuclmtk.text2wfreq(path, out('wfreq.out'))),
+        ('text2wfreq', {'input': 'file'}, text2wfreq_file),
+        ('text2wfreq', {'input': 'lines'}, lambda: cmuclmtk.text2wfreq(_lines(corpus), out('wfreq.out'))),
+        ('wfreq2vocab', {}, lambda: cmuclmtk.wfreq2vocab(out('wfreq'), out('vocab.out'))),
+    ]
+    for n in N_VALUES:
+        params = {'input': 'path'} if n == 3 else {'input': 'path', 'n': n}
+        benchmarks.append(('text2wngram', params, lambda n=n: cmuclmtk.text2wngram(path, out('wngram.out'), n=n)))
+    for n in N_VALUES:
+        params = {'input': 'path'} if n == 3 else {'input': 'path', 'n': n}
+        benchmarks.append(('text2idngram', params, lambda n=n: cmuclmtk.text2idngram(path, out('vocab'), out('idngram.out'), n=n)))
+    for buffersize in BUFFERSIZES:
+        benchmarks.append(('text2idngram', {'input': 'path', 'buffersize': buffersize},
+                           lambda buffersize=buffersize: cmuclmtk.text2idngram(path, out('vocab'), out('idngram.out'), buffersize=buffersize)))
+    for n in N_VALUES:
+        params = {} if n == 3 else {'n': n}
+        benchmarks.append(('wngram2idngram', params, lambda n=n: cmuclmtk.wngram2idngram(out('wngram' + suffix(n)), out('vocab'), out('idngram.out'), n=n)))
+    for buffersize in BUFFERSIZES:
+        benchmarks.append(('wngram2idngram', {'buffersize': buffersize},
+                           lambda buffersize=buffersize: cmuclmtk.wngram2idngram(out('wngram'), out('vocab'), out('idngram.out'), buffersize=buffersize)))
+    benchmarks.extend([
+        ('ngram2mgram', {'n': 3, 'm': 2, 'input': 'words'}, lambda: cmuclmtk.ngram2mgram(out('wngram'), out('wngram.out'), 3, 2, words=True)),
+        ('ngram2mgram', {'n': 3, 'm': 2, 'input': 'idngram'}, lambda: cmuclmtk.ngram2mgram(out('idngram'), out('idngram.out'), 3, 2)),
+        ('idngram2stats', {}, lambda: cmuclmtk.idngram2stats(out('idngram'), out('stats.out'))),
+        ('mergeidngram', {'files': 2}, lambda: cmuclmtk.mergeidngram(out('idngram.merged'), [out('idngram'), out('idngram')])),
+    ])
+    for n in N_VALUES:
+        params = {} if n == 3 else {'n': n}
+        benchmarks.append(('idngram2lm', params, lambda n=n: cmuclmtk.idngram2lm(out('idngram' + suffix(n)), out('vocab'), out('lm.out'), n=n)))
+    if _accepts(cmuclmtk.idngram2lm, 'cutoffs'):
+        for cutoffs in CUTOFFS:
+            benchmarks.append(('idngram2lm', {'cutoffs': cutoffs}, lambda cutoffs=cutoffs: cmuclmtk.idngram2lm(out('idngram'), out('vocab'), out('lm.out'), cutoffs=cutoffs)))
+    if _accepts(cmuclmtk.idngram2lm, 'spec_num'):
+        # Binary id n-grams are n word ids and a count of 4 bytes each, so the number of records is an upper bound for the number of 2-grams and 3-grams
+        records = os.path.getsize(out('idngram')) // (4 * 4)
+        benchmarks.append(('idngram2lm', {'spec_num': 'records'}, lambda: cmuclmtk.idngram2lm(out('idngram'), out('vocab'), out('lm.out'), spec_num=[records, records])))
+    benchmarks.extend([
+        ('idngram2lm', {'output': 'binary'}, lambda: cmuclmtk.idngram2lm(out('idngram'), out('vocab'), out('binlm.out'), arpa_output=False)),
+        ('binlm2arpa', {}, lambda: cmuclmtk.binlm2arpa(out('binlm'), out('lm.out'))),
+        ('text2lm', {'input': 'path', 'workers': 1}, lambda: cmuclmtk.text2lm(path, out('lm.out'))),
+        ('text2lm', {'input': 'lines', 'workers': 1}, lambda: cmuclmtk.text2lm(_lines(corpus), out('lm.out'))),
+    ])
+    if _accepts(cmuclmtk.text2lm, 'auto_tune'):
+        for auto_tune in (False, True):
+            benchmarks.append(('text2lm', {'input': 'path', 'workers': 1, 'auto_tune': auto_tune},
+                               lambda auto_tune=auto_tune: cmuclmtk.text2lm(path, out('lm.out'), auto_tune=auto_tune)))
+    if text is not None:
+        benchmarks.insert(1, ('text2wfreq', {'input': 'string'}, lambda: cmuclmtk.text2wfreq(text, out('wfreq.out'))))
+        benchmarks.append(('text2lm', {'input': 'string', 'workers': 1}, lambda: cmuclmtk.text2lm(text, out('lm.out'))))
+    if os.path.getsize(corpus) <= getattr(cmuclmtk, 'IN_PROCESS_MAX_SIZE', -1):
+        try:
+            idngram = importlib.import_module('cmuclmtk.idngram')
+        except ImportError:
+            idngram = None
+        if hasattr(idngram, 'count_idngrams'):
+            benchmarks.append(('count_idngrams', {'input': 'path'}, lambda: idngram.count_idngrams(path, out('vocab'), out('idngram.out'))))
+    if workers > 1 and hasattr(cmuclmtk, 'sharded_text2idngram'):
+        benchmarks.append(('sharded_text2idngram', {'workers': workers}, lambda: cmuclmtk.sharded_text2idngram(path, out('vocab'), out('idngram.out'), workers=workers)))
+        benchmarks.append(('text2lm', {'input': 'path', 'workers': workers}, lambda: cmuclmtk.text2lm(path, out('lm.out'), workers=workers)))
+    return benchmarks
+
+def _children_usage():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _max_rss(kilobytes):
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    return kilobytes * (1 if sys.platform == 'darwin' else 1024)
+
+def _measure(cmuclmtk, func):
+    """
+        Runs func once and returns its wall time, the CPU time of the tools it ran and their peak memory. Uses cmuclmtk.metrics if this version of cmuclmtk has it.
+        The peak memory is None if it couldn't be measured: without cmuclmtk.metrics (as ru_maxrss of RUSAGE_CHILDREN includes the benchmark process itself, which every tool is forked from) or if every tool exited before its memory was sampled.
+    """
+    try:
+        metrics = importlib.import_module('cmuclmtk.metrics')
+    except ImportError:
+        metrics = None
+    if metrics is not None:
+        with metrics.collect() as records:
+            start = time.perf_counter()
+            func()
+            wall_time = time.perf_counter() - start
+        tools = [record for record in records if record.cmd is not None]
+        cpu = sum((record.user_time or 0) + (record.sys_time or 0) for record in tools)
+        max_rss = [record.max_rss for record in tools if record.max_rss is not None]
+        return wall_time, cpu, max(max_rss) if max_rss else None
+
+    cpu_before = _children_usage()
+    start = time.perf_counter()
+    func()
+    wall_time = time.perf_counter() - start
+    return wall_time, _children_usage() - cpu_before, None
+
+def run_benchmarks(sizes, repeat=3, workers=None, standins=True, data_dir=None, names=None, log=None):
+    """
+        Runs all benchmarks on corpora of the given sizes (in bytes) repeat times each and returns the results as a dict (see the README). Unless standins is False, the stand-in tools are used instead of CMUCLMTK. Corpora are generated in (and reused from) data_dir, which defaults to a temporary directory. If names is given, only the benchmarks with these names are run.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    workdir = tempfile.mkdtemp(prefix='cmuclmtk-benchmark-')
+    try:
+        cmuclmtk = _load_cmuclmtk(os.path.join(workdir, 'bin') if standins else None)
+        corpus_dir = data_dir or os.path.join(workdir, 'corpora')
+        if not os.path.isdir(corpus_dir):
+            os.makedirs(corpus_dir)
+
+        results = []
+        for size in sizes:
+            corpus = corpus_file(corpus_dir, size)
+            with open(corpus) as f:
+                words = sum(len(line.split()) for line in f)
+            size_dir = os.path.join(workdir, 'size-%d' % size)
+            os.makedirs(size_dir)
+            for name, params, func in _benchmarks(cmuclmtk, corpus, size_dir, workers):
+                if names and name not in names:
+                    continue
+                runs = [_measure(cmuclmtk, func) for _ in range(repeat)]
+                times = sorted(run[0] for run in runs)
+                max_rss = [run[2] for run in runs if run[2] is not None]
+                best = times[0]
+                result = {'benchmark': name,
+                          'params': params,
+                          'size': size,
+                          'words': words,
+                          'times': [run[0] for run in runs],
+                          'wall_time': best,
+                          'median_time': times[len(times) // 2],
+                          'throughput': size / best / MB if best else None,
+                          'words_per_second': words / best if best else None,
+                          'tool_cpu_time': min(run[1] for run in runs),
+                          'tool_max_rss': max(max_rss) if max_rss else None,
+                          'python_max_rss': _max_rss(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) if resource else None}
+                results.append(result)
+                if log:
+                    log(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'created': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': multiprocessing.cpu_count(),
+            'tools': 'stand-in' if standins else 'cmuclmtk',
+            'repeat': repeat,
+            'results': results}
+
+def _key(result):
+    return (result['benchmark'], json.dumps(result['params'], sort_keys=True), result['size'])
+
+def compare(old, new):
+    """
+        Compares two benchmark results (as returned by run_benchmarks or loaded from their JSON files) and returns a list of (benchmark, params, size, old wall time, new wall time, new / old) for all benchmarks in both.
+    """
+    old_results = dict((_key(result), result) for result in old['results'])
+    rows = []
+    for result in new['results']:
+        key = _key(result)
+        if key in old_results:
+            old_time = old_results[key]['wall_time']
+            rows.append((result['benchmark'], result['params'], result['size'], old_time, result['wall_time'],
+                         result['wall_time'] / old_time if old_time else None))
+    return rows
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Lightweight stand-ins for the CMUCLMTK tools.
+
+    The stand-ins read all of their input and write output in the formats of the real tools, so that every wrapper and the text2lm pipeline run end to end. Apart from that they do as little work as possible: the counts are taken from the first SAMPLE_SIZE bytes of the input only. Benchmarks run against them therefore measure the overhead of the wrappers (spooling, encoding, temporary files and directories, process handling) rather than the tools.
+
+    The evallm stand-in is interactive like the real one, but only knows the unigrams of a model (which is all the idngram2lm stand-in writes).
+
+    The tool is selected by the name the script is run as, see install_standins.
+"""
+
+import os
+import sys
+import math
+import struct
+import collections
+
+TOOLS = ('text2wfreq', 'wfreq2vocab', 'text2wngram', 'text2idngram', 'ngram2mgram', 'wngram2idngram', 'idngram2stats', 'mergeidngram', 'idngram2lm', 'binlm2arpa', 'evallm')
+
+CHUNKSIZE = 1024 * 1024
+
+# Number of bytes of the input the stand-ins actually look at
+SAMPLE_SIZE = 1024 * 1024
+
+# Words per progress dot, like the real tools print them
+WORDS_PER_DOT = 20000
+
+LAUNCHER = '''#!%(python)s
+import sys
+import runpy
+argv = list(sys.argv)
+sys.exit(runpy.run_path(%(script)r)['main'](argv))
+'''
+
+def install_standins(directory):
+    """
+        Creates an executable launcher for every tool in directory, which runs this script with the current Python interpreter. Put directory on $PATH to use the stand-ins instead of CMUCLMTK.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for tool in TOOLS:
+        path = os.path.join(directory, tool)
+        with open(path, 'w') as f:
+            f.write(LAUNCHER % {'python': sys.executable, 'script': os.path.abspath(__file__)})
+        os.chmod(path, 0o755)
+    return directory
+
+def _option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def _read_input(stream, progress=False):
+    """
+        Reads stream to its end and returns its first SAMPLE_SIZE bytes (cut at the last whitespace).
+    """
+    sample = []
+    sample_size = 0
+    words = 0
+    dots = 0
+    if progress:
+        sys.stderr.write('%s n-grams processed for each ".", 1,000,000 for each line.\n' % '{:,}'.format(WORDS_PER_DOT))
+    while True:
+        chunk = stream.read(CHUNKSIZE)
+        if not chunk:
+            break
+        if sample_size < SAMPLE_SIZE:
+            sample.append(chunk)
+            sample_size += len(chunk)
+        if progress:
+            words += chunk.count(b' ') + chunk.count(b'\n')
+            while dots < words // WORDS_PER_DOT:
+                dots += 1
+                sys.stderr.write('.\n' if dots % 50 == 0 else '.')
+            sys.stderr.flush()
+    if progress:
+        sys.stderr.write('\n')
+    sample = b''.join(sample)[:SAMPLE_SIZE]
+    if len(sample) == SAMPLE_SIZE:
+        sample = sample[:max(sample.rfind(b' '), sample.rfind(b'\n')) + 1]
+    return sample
+
+def _read_vocab(path):
+    vocab = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip() and not line.startswith(b'##'):
+                vocab[line.split()[0]] = len(vocab) + 1
+    return vocab
+
+def _read_idngram(data, n, ascii_input):
+    counts = collections.Counter()
+    if ascii_input:
+        for line in data.splitlines():
+            fields = line.split()
+            if fields:
+                counts[tuple(int(x) for x in fields[:n])] += int(fields[n])
+    else:
+        record = struct.Struct('>%dIi' % n)
+        for values in record.iter_unpack(data[:len(data) - len(data) % record.size]):
+            counts[values[:n]] += values[n]
+    return counts
+
+def _write_idngram(f, counts, n, ascii_output):
+    record = struct.Struct('>%dIi' % n)
+    for ngram in sorted(counts):
+        if ascii_output:
+            f.write(('%s %d\n' % (' '.join(str(x) for x in ngram), counts[ngram])).encode('utf-8'))
+        else:
+            f.write(record.pack(*(ngram + (counts[ngram],))))
+
+def _ngrams(words, n):
+    return zip(*[words[i:] for i in range(n)])
+
+def _read_unigrams(path):
+    """
+        Returns the log10 probabilities of the unigrams of an ARPA model (binary models of the idngram2lm stand-in are ARPA models, too).
+    """
+    unigrams = {}
+    section = None
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b'\\'):
+                section = line
+            elif section == b'\\1-grams:' and line:
+                fields = line.split()
+                unigrams[fields[1]] = float(fields[0])
+    return unigrams
+
+def _perplexity(unigrams, context_cues, args, stdout):
+    text_file = _option(args, '-text')
+    with open(text_file, 'rb') as f:
+        words = f.read().split()
+    logprobs = []
+    oovs = []
+    cues = 0
+    for word in words:
+        if word in context_cues:
+            cues += 1
+        elif word in unigrams:
+            logprobs.append(unigrams[word])
+        else:
+            oovs.append(word)
+    if _option(args, '-probs'):
+        with open(_option(args, '-probs'), 'wb') as f:
+            for logprob in logprobs:
+                f.write(b'%.8g\n' % 10 ** logprob)
+    if _option(args, '-oovs'):
+        with open(_option(args, '-oovs'), 'wb') as f:
+            for word in oovs:
+                f.write(word + b'\n')
+    entropy = -sum(logprobs) / max(1, len(logprobs)) * math.log(10, 2)
+    stdout.write(b'Computing perplexity of the language model with respect\n   to the text %s\n' % text_file.encode('utf-8'))
+    stdout.write(b'Perplexity = %.2f, Entropy = %.2f bits\n' % (2 ** entropy, entropy))
+    stdout.write(b'Computation based on %d words.\n' % len(logprobs))
+    stdout.write(b'%d OOVs (%.2f%%) and %d context cues were removed from the calculation.\n' % (len(oovs), 100.0 * len(oovs) / max(1, len(words)), cues))
+
+def _evallm(args, stdin, stdout):
+    """
+        Reads commands from stdin, answering perplexity commands with the unigrams of the model only.
+    """
+    unigrams = _read_unigrams(_option(args, '-arpa') or _option(args, '-binary'))
+    context_cues = set(_read_vocab(_option(args, '-context'))) if _option(args, '-context') else set()
+    while True:
+        stdout.write(b'evallm : ')
+        stdout.flush()
+        line = stdin.readline()
+        if not line:
+            return 0
+        command = line.decode('utf-8').split()
+        if not command:
+            continue
+        if command[0] == 'quit':
+            stdout.write(b'evallm : Done.\n')
+            stdout.flush()
+            return 0
+        if command[0] == 'perplexity':
+            _perplexity(unigrams, context_cues, command[1:], stdout)
+        else:
+            stdout.write(b'Unknown command : %s\n' % command[0].encode('utf-8'))
+
+def main(argv=None):
+    argv = argv or sys.argv
+    tool = os.path.basename(argv[0])
+    args = argv[1:]
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    n = int(_option(args, '-n', 3))
+    sys.stderr.write('%s (stand-in)\n' % tool)
+
+    if tool == 'text2wfreq':
+        for word, count in collections.Counter(_read_input(stdin).split()).items():
+            stdout.write(b'%s %d\n' % (word, count))
+    elif tool == 'wfreq2vocab':
+        counts = {}
+        for line in _read_input(stdin).splitlines():
+            fields = line.split()
+            if len(fields) == 2:
+                counts[fields[0]] = int(fields[1])
+        words = sorted(counts, key=lambda word: -counts[word])
+        if _option(args, '-top'):
+            words = words[:int(_option(args, '-top'))]
+        elif _option(args, '-gt'):
+            words = [word for word in words if counts[word] > int(_option(args, '-gt'))]
+        stdout.write(b'## Vocabulary written by the wfreq2vocab stand-in\n')
+        for word in sorted(words):
+            stdout.write(word + b'\n')
+    elif tool == 'text2wngram':
+        for ngram, count in sorted(collections.Counter(_ngrams(_read_input(stdin).split(), n)).items()):
+            stdout.write(b'%s %d\n' % (b' '.join(ngram), count))
+    elif tool in ('text2idngram', 'wngram2idngram'):
+        vocab = _read_vocab(_option(args, '-vocab'))
+        sample = _read_input(stdin, progress=True)
+        counts = collections.Counter()
+        if tool == 'text2idngram':
+            counts.update(_ngrams([vocab.get(word, 0) for word in sample.split()], n))
+        else:
+            for line in sample.splitlines():
+                fields = line.split()
+                if len(fields) == n + 1:
+                    counts[tuple(vocab.get(word, 0) for word in fields[:n])] += int(fields[n])
+        with open(_option(args, '-idngram'), 'wb') as f:
+            _write_idngram(f, counts, n, '-write_ascii' in args)
+        sys.stderr.write('Sorting n-grams...\n%s : Done.\n' % tool)
+    elif tool == 'mergeidngram':
+        inputs = [arg for i, arg in enumerate(args) if not arg.startswith('-') and args[i-1] != '-n']
+        counts = collections.Counter()
+        for path in inputs:
+            with open(path, 'rb') as f:
+                counts.update(_read_idngram(f.read(), n, '-ascii_input' in args))
+        _write_idngram(stdout, counts, n, '-ascii_output' in args)
+    elif tool == 'idngram2lm':
+        with open(_option(args, '-idngram'), 'rb') as f:
+            counts = _read_idngram(_read_input(f, progress=True), n, '-ascii_input' in args)
+        vocab = _read_vocab(_option(args, '-vocab'))
+        words = [b'<UNK>'] + sorted(vocab, key=vocab.get)
+        unigrams = collections.Counter()
+        for ngram, count in counts.items():
+            unigrams[ngram[-1]] += count
+        total = float(sum(unigrams.values()) + len(words))
+        sys.stderr.write('Calculating discounted counts.\nWriting out language model...\n')
+        with open(_option(args, '-arpa') or _option(args, '-binary'), 'wb') as f:
+            f.write(b'\\data\\\nngram 1=%d\n\n\\1-grams:\n' % len(words))
+            for i, word in enumerate(words):
+                f.write(b'%.4f %s 0.0000\n' % (math.log10((unigrams[i] + 1) / total), word))
+            f.write(b'\n\\end\\\n')
+        sys.stderr.write('idngram2lm : Done.\n')
+    elif tool == 'binlm2arpa':
+        with open(_option(args, '-binary'), 'rb') as input_f, open(_option(args, '-arpa'), 'wb') as output_f:
+            output_f.write(input_f.read())
+    elif tool == 'evallm':
+        return _evallm(args, stdin, stdout)
+    elif tool in ('ngram2mgram', 'idngram2stats'):
+        while True:
+            chunk = stdin.read(CHUNKSIZE)
+            if not chunk:
+                break
+            stdout.write(chunk)
+    else:
+        sys.stderr.write('Unknown tool %s\n' % tool)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
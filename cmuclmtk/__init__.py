@@ -30,53 +30,76 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
     Wrapper library for accessing the language model tools for CMU Sphinx (CMUCLMTK)
-
-    TODO:
-       - add wrapper functions for tools 'evallm' and 'interpolate'
 """
 
 import os
+import errno
 import tempfile
 import subprocess
 import shutil
 import sys
 import logging
+import time
+import functools
 from contextlib import contextmanager
 
-if sys.version_info < (3, 3):
-    import distutils.spawn
+# Only what every wrapper needs is imported here, so that importing cmuclmtk stays cheap. The other submodules (and heavier parts of the standard library) are imported by the functions that use them.
+from .cache import ArtifactCache
+from . import toolchain
+from .toolchain import Toolchain, ToolNotFoundError, get_toolchain, set_toolchain
+from . import policy as policy_module
+from .policy import ExecutionPolicy
 
 def check_cmuclmtk_installation():
-    if sys.version_info < (3, 3):
-        cmd_exists = distutils.spawn.find_executable
-    else:
-        cmd_exists = shutil.which
-    # Required binaries for this module
-    cmds = ('text2wfreq', 'wfreq2vocab', 'text2wngram', 'text2idngram', 'ngram2mgram', 'wngram2idngram', 'idngram2stats', 'mergeidngram', 'idngram2lm', 'binlm2arpa')
-    for cmd in cmds:
-        if not cmd_exists(cmd):
-            logger = logging.getLogger(__name__)
-            logger.critical("Can't find CMUCLMTK command '%s'! Please check if CMUCLMTK is installed and in your $PATH." % cmd)
-            return False
-    return True
-
-if not check_cmuclmtk_installation():
-    raise ImportError("CMUCLMTK command(s) missing or not in $PATH.")
+    """
+        Returns True if all CMUCLMTK tools can be found by the toolchain (see cmuclmtk.toolchain), logging the ones that can't. The tools are looked up when they are first run anyway, so this is only needed to fail early.
+    """
+    found = True
+    for cmd in toolchain.TOOLS:
+        try:
+            get_toolchain().path(cmd)
+        except ToolNotFoundError as e:
+            logging.getLogger(__name__).critical(str(e))
+            found = False
+    return found
 
 class ConversionError(Exception):
     pass
 
+class LimitExceededError(ConversionError):
+    """
+        Raised if a tool breached a limit of its ExecutionPolicy. limit is one of 'timeout', 'memory' and 'file_size'.
+    """
+    def __init__(self, message, limit):
+        super(LimitExceededError, self).__init__(message)
+        self.limit = limit
+
 @contextmanager
 def do_in_tempdir():
+    """
+        Changes the working directory of the whole process to a temporary directory. This is not thread-safe, the wrappers use scratch_dir() instead.
+    """
     # Save CWD
     curdir = os.getcwd()
     # Go into tempdir
+    with scratch_dir() as tempdir:
+        os.chdir(tempdir)
+        try:
+            yield
+        finally:
+            # Go back (the tempdir is thrown away by scratch_dir)
+            os.chdir(curdir)
+
+@contextmanager
+def scratch_dir():
+    """
+        Creates a temporary directory for a tool to run in (via the cwd argument of subprocess) and removes it afterwards, even if the tool failed.
+    """
     tempdir = tempfile.mkdtemp(prefix='cmuclmtk-')
-    os.chdir(tempdir)
-    yield
-    # Go back and throw away tempdir
-    os.chdir(curdir)
-    shutil.rmtree(tempdir)
+    try:
+        yield tempdir
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
 
 @contextmanager
 def output_to_debuglogger():
@@ -85,69 +108,304 @@ def output_to_debuglogger():
         f.seek(0)
         logger = logging.getLogger(__name__)
         for line in f:
-            message = (line.decode('utf-8') if sys.version_info >= (3,) and type(line) is bytes else line).strip()
+            message = line.decode('utf-8').strip()
             if message:
                 logger.debug(message)
 
-def text2wfreq(text, output_file, hashtablesize=1000000, verbosity=2):
+# Number of bytes that are written to a tool's stdin at once when streaming a corpus
+CHUNKSIZE = 64 * 1024
+
+# Largest corpus (in bytes) whose id n-grams text2lm counts in-process rather than with text2idngram, if NumPy is available
+IN_PROCESS_MAX_SIZE = 4 * 1024 * 1024
+
+# The text2idngram options cmuclmtk.idngram.count_idngrams supports
+IN_PROCESS_OPTIONS = ('n', 'write_ascii', 'fof_size')
+
+def _to_bytes(s):
+    return s.encode('utf-8') if not isinstance(s, bytes) else s
+
+def _is_path(text):
+    return hasattr(text, '__fspath__')
+
+def _corpus_chunks(text, chunksize=CHUNKSIZE):
     """
-        List of every word which occurred in the text, along with its number of occurrences.
-        Notes : Uses a hash-table to provide an efficient method of counting word occurrences. Output list is not sorted (due to "randomness" of the hash-table), but can be easily sorted into the user's desired order by the UNIX sort command. In any case, the output does not need to be sorted in order to serve as input for wfreq2vocab. Higher values for the hashtablesize parameter require more memory, but can reduce computation time.
+        Yields the corpus as chunks of UTF-8 encoded bytes. The corpus can be a string, an open file object or an iterable of lines. Lines without a trailing newline get one appended, so that words of adjacent lines are not glued together.
     """
-    cmd = ['text2wfreq', '-hash', hashtablesize,
-                         '-verbosity', verbosity]
+    if isinstance(text, (bytes, str)):
+        if text:
+            yield _to_bytes(text)
+    elif hasattr(text, 'read'):
+        while True:
+            chunk = text.read(chunksize)
+            if not chunk:
+                break
+            yield _to_bytes(chunk)
+    else:
+        buf = []
+        size = 0
+        for line in text:
+            line = _to_bytes(line)
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            buf.append(line)
+            size += len(line)
+            if size >= chunksize:
+                yield b''.join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield b''.join(buf)
+
+def _corpus_size(text):
+    """
+        Returns the size of a corpus in bytes (in characters for strings), or None if it can't be known without reading it.
+    """
+    if _is_path(text):
+        return os.path.getsize(text)
+    if isinstance(text, (bytes, str)):
+        return len(text)
+    return None
 
-    # Ensure that every parameter is of type 'str'
-    cmd = [str(x) for x in cmd]
+def _in_process_counter(text, in_process, text2idngram_kwargs):
+    """
+        Returns cmuclmtk.idngram.count_idngrams if the id n-grams of text are to be counted in-process, or None if text2idngram counts them. If in_process is None, that is decided automatically: the corpus must be at most IN_PROCESS_MAX_SIZE bytes and no other text2idngram options than IN_PROCESS_OPTIONS may be given.
+    """
+    unsupported = sorted(set(text2idngram_kwargs) - set(IN_PROCESS_OPTIONS))
+    if in_process is None:
+        size = _corpus_size(text)
+        if size is None or size > IN_PROCESS_MAX_SIZE or unsupported:
+            return None
+    elif not in_process:
+        return None
+    elif unsupported:
+        logging.getLogger(__name__).warning("Counting the id n-grams in-process, ignoring the text2idngram options %s", ', '.join(unsupported))
+
+    try:
+        from .idngram import count_idngrams
+    except ImportError:
+        if in_process:
+            raise
+        logging.getLogger(__name__).debug("NumPy is not available, counting the id n-grams with text2idngram")
+        return None
+    return count_idngrams
+
+def _in_process_kwargs(text2idngram_kwargs):
+    """
+        Returns the text2idngram options for count_idngrams, with defaults filled in.
+    """
+    kwargs = {'n': 3, 'write_ascii': False, 'fof_size': 10}
+    kwargs.update((name, value) for name, value in text2idngram_kwargs.items() if name in IN_PROCESS_OPTIONS)
+    return kwargs
+
+def _propagate(func):
+    """
+        Returns func wrapped for running in a worker thread on behalf of the calling thread, so that its metrics and progress are reported like the caller's.
+    """
+    from . import metrics, progress
+    return metrics.propagate(progress.propagate(func))
+
+def _pipeline(name):
+    """
+        Decorator that measures every call of a function as a pipeline (see cmuclmtk.metrics.pipeline).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from . import metrics
+            with metrics.pipeline(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _as_path(path):
+    """
+        Returns path as a pathlib.Path, so that _run hands the file itself to the tool.
+    """
+    import pathlib
+    return pathlib.Path(path)
+
+def _mktemp(suffix):
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        return f.name
+
+def _wait(proc):
+    """
+        Waits for proc to terminate and returns its exit code and resource usage (or None, if os.wait4 is not available).
+    """
+    if not hasattr(os, 'wait4'):
+        return proc.wait(), None
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except ChildProcessError:
+            # Reaped by the Popen object already
+            return proc.wait(), None
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    # Let the Popen object know that the child has been reaped already
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return proc.returncode, rusage
+
+def _call(cmd, text=None, policy=None, **kwargs):
+    """
+        Runs cmd like subprocess.call() does, but feeds the corpus text to the child's stdin incrementally, so that it never has to be held in memory (or copied into a temporary file) as a whole.
+        Paths (i.e. objects implementing os.PathLike, such as pathlib.Path) are opened and handed to the child directly, so that no data passes through Python at all.
+        If a policy (see cmuclmtk.policy) is given, it is applied to the child, which is killed once its timeout has passed. The child is also killed (along with any processes it started) if anything goes wrong here, including a KeyboardInterrupt.
+        Returns the exit code, the resource usage of the child (see _wait), the number of bytes of text, whether the child was killed because of the timeout and, if metrics are enabled, the peak memory of the child (see cmuclmtk.metrics.MemoryMonitor).
+    """
+    from . import metrics
+    if policy is None:
+        policy = ExecutionPolicy()
+    cmd = policy.command(cmd)
+    kwargs.update(policy.popen_kwargs())
+
+    if text is None or _is_path(text):
+        input_f = open(os.fspath(text), 'rb') if text is not None else None
+        stdin = input_f
+    else:
+        input_f = None
+        stdin = subprocess.PIPE
+    try:
+        proc = subprocess.Popen(cmd, stdin=stdin, **kwargs)
+        memory = metrics.MemoryMonitor(proc.pid) if metrics.enabled() else None
+        deadline = policy.watch(proc)
+        try:
+            if stdin == subprocess.PIPE:
+                bytes_in = _feed(proc, text)
+            else:
+                bytes_in = os.fstat(input_f.fileno()).st_size if input_f else 0
+            result = _wait(proc)
+        except BaseException:
+            # The child runs in a session of its own, so it doesn't get e.g. the SIGINT of a Ctrl-C and has to be killed here
+            policy.kill(proc)
+            proc.wait()
+            raise
+        finally:
+            deadline.cancel()
+            max_rss = memory.stop() if memory else None
+        return result + (bytes_in, deadline.expired, max_rss)
+    finally:
+        if input_f:
+            input_f.close()
+
+def _feed(proc, text):
+    """
+        Writes the corpus text to the stdin of proc and closes it. Returns the number of bytes written.
+    """
+    bytes_in = 0
+    try:
+        for chunk in _corpus_chunks(text):
+            proc.stdin.write(chunk)
+            bytes_in += len(chunk)
+        proc.stdin.close()
+    except (IOError, OSError) as e:
+        # The child exited without reading all of its input, its exit code will tell us why
+        if e.errno not in (errno.EPIPE, errno.EINVAL):
+            raise
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+    return bytes_in
+
+def _file_sizes(paths):
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+def _run(cmd, text=None, output_file=None, inputs=(), outputs=(), policy=None):
+    """
+        Runs a CMUCLMTK tool in a scratch directory of its own, streaming text (if given, see _call) to its stdin. The tool's stdout is written to output_file or, if no output_file is given, returned as a string. Its stderr is logged and reported as progress events while the tool runs (see cmuclmtk.progress).
+        A StageMetrics record is emitted for every run (see cmuclmtk.metrics). The files in inputs and outputs, which the tool reads and writes via its command line, are counted as its input and output.
+        Raises a ConversionError if the tool fails, a LimitExceededError if it breached a limit of the policy, or a ToolNotFoundError if it isn't installed.
+    """
+    from . import metrics, progress
+    executable = get_toolchain().command(cmd)
+    record = metrics.StageMetrics(cmd[0], cmd)
+    start = time.time()
+    with (open(output_file,'wb') if output_file else tempfile.SpooledTemporaryFile()) as output_f:
+        with progress.StderrReader(cmd) as err_f:
+            with scratch_dir() as cwd:
+                monitor = metrics.DiskMonitor(cwd) if metrics.enabled() else None
+                try:
+                    exitcode, rusage, bytes_in, timed_out, max_rss = _call(executable, text, policy, stdout=output_f, stderr=err_f, cwd=cwd)
+                finally:
+                    if monitor:
+                        record.temp_disk = monitor.stop()
+            if timed_out:
+                err_f.close(policy_module.STDERR_GRACE)
+        try:
+            record.bytes_out = output_f.tell()
+        except (IOError, OSError):
+            # output_file is a named pipe
+            record.bytes_out = 0
+        if not output_file:
+            output_f.seek(0)
+            output = output_f.read()
+
+    record.wall_time = time.time() - start
+    record.exitcode = exitcode
+    record.bytes_in = bytes_in + _file_sizes(inputs)
+    record.bytes_out += _file_sizes(outputs)
+    if rusage is not None:
+        record.set_rusage(rusage)
+    record.max_rss = max_rss
+    metrics.emit(record)
 
-    with tempfile.SpooledTemporaryFile() as input_f:
-        input_f.write(text.encode('utf-8') if sys.version_info >= (3,) and type(text) is str else text)
-        input_f.seek(0)
-        with open(output_file,'w+') as output_f:
-            with  output_to_debuglogger() as err_f:
-                exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-    
     logger = logging.getLogger(__name__)
     logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
 
     if exitcode != 0:
+        limit = policy.breach(exitcode, timed_out, err_f.parser.last_lines) if policy is not None else None
+        if limit:
+            raise LimitExceededError("'%s' exceeded its %s limit (exit status '%s')" % (cmd[0], limit.replace('_', ' '), exitcode), limit)
         raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
 
-def wfreq2vocab(wfreq_file, output_file, top=None, gt=None, records=1000000, verbosity=2):
+    if not output_file:
+        return output.decode('utf-8').strip()
+
+def _text2wfreq_cmd(hashtablesize=1000000, verbosity=2):
+    cmd = ['text2wfreq', '-hash', hashtablesize,
+                         '-verbosity', verbosity]
+
+    # Ensure that every parameter is of type 'str'
+    cmd = [str(x) for x in cmd]
+    return cmd
+
+def text2wfreq(text, output_file, hashtablesize=1000000, verbosity=2, policy=None):
     """
-        Takes a a word unigram file, as produced by text2wfreq and converts it to a vocabulary file.
-        The top parameter allows the user to specify the size of the vocabulary; if the function is called with the parameter top=20000, then the vocabulary will consist of the most common 20,000 words.
-        The gt parameter allows the user to specify the number of times that a word must occur to be included in the vocabulary; if the function is called with the parameter gt=10, then the vocabulary will consist of all the words which occurred more than 10 times.
-        If neither the gt, nor the top parameters are specified, then the function runs with the default setting of taking the top 20,000 words.
-        The records parameter (default: 1000000) allows the user to specify how many of the word and count records to allocate memory for. If the number of words in the input exceeds this number, then the function will fail and raise a ConversionError, but a high number will obviously result in a higher memory requirement.
+        List of every word which occurred in the text, along with its number of occurrences.
+        Notes : Uses a hash-table to provide an efficient method of counting word occurrences. Output list is not sorted (due to "randomness" of the hash-table), but can be easily sorted into the user's desired order by the UNIX sort command. In any case, the output does not need to be sorted in order to serve as input for wfreq2vocab. Higher values for the hashtablesize parameter require more memory, but can reduce computation time.
+        The text can be given as a string, as a path (e.g. a pathlib.Path), as an open file object or as an iterable of lines. It is streamed to the tool, so the corpus never needs to fit into memory.
     """
+    cmd = _text2wfreq_cmd(hashtablesize, verbosity)
+    _run(cmd, text, output_file, policy=policy)
+
+def _wfreq2vocab_cmd(top=None, gt=None, records=1000000, verbosity=2):
     cmd = ['wfreq2vocab', '-verbosity', verbosity,
                            '-records', records]
 
-    # Ensure that every parameter is of type 'str'
-    cmd = [str(x) for x in cmd]
-
     if top:
         cmd.extend(['-top',top])
     elif gt:
         cmd.extend(['-gt',gt])
 
-    with open(wfreq_file,'r') as input_f:
-        with open(output_file,'w+') as output_f:
-            with  output_to_debuglogger() as err_f:
-                exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
+    # Ensure that every parameter is of type 'str'
+    cmd = [str(x) for x in cmd]
+    return cmd
 
-def text2wngram(text, output_file, n=3, chars=63636363, words=9090909, compress=False, verbosity=2):
+def wfreq2vocab(wfreq_file, output_file, top=None, gt=None, records=1000000, verbosity=2, policy=None):
     """
-        List of every word n-gram which occurred in the text, along with its number of occurrences.
-        The maximum numbers of charactors and words that can be stored in the buffer are given by the chars and words parameters.
+        Takes a a word unigram file, as produced by text2wfreq and converts it to a vocabulary file.
+        The top parameter allows the user to specify the size of the vocabulary; if the function is called with the parameter top=20000, then the vocabulary will consist of the most common 20,000 words.
+        The gt parameter allows the user to specify the number of times that a word must occur to be included in the vocabulary; if the function is called with the parameter gt=10, then the vocabulary will consist of all the words which occurred more than 10 times.
+        If neither the gt, nor the top parameters are specified, then the function runs with the default setting of taking the top 20,000 words.
+        The records parameter (default: 1000000) allows the user to specify how many of the word and count records to allocate memory for. If the number of words in the input exceeds this number, then the function will fail and raise a ConversionError, but a high number will obviously result in a higher memory requirement.
     """
+    cmd = _wfreq2vocab_cmd(top, gt, records, verbosity)
+    _run(cmd, _as_path(wfreq_file), output_file, policy=policy)
+
+def _text2wngram_cmd(n=3, chars=63636363, words=9090909, compress=False, verbosity=2):
     cmd = ['text2wngram']
     
     if n:
@@ -167,32 +425,20 @@ def text2wngram(text, output_file, n=3, chars=63636363, words=9090909, compress=
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
+    return cmd
 
-    with tempfile.SpooledTemporaryFile() as input_f:
-        input_f.write(text.encode('utf-8') if sys.version_info >= (3,) and type(text) is str else text)
-        input_f.seek(0)
-        with open(output_file,'w+') as output_f:
-            with  output_to_debuglogger() as err_f:
-                with do_in_tempdir():
-                    exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
-
-def text2idngram(text, vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10):
+def text2wngram(text, output_file, n=3, chars=63636363, words=9090909, compress=False, verbosity=2, policy=None):
     """
-        Takes a text stream, plus a vocabulary file, and outputs an idngram file (a ist of every id n-gram which occurred in the text, along with its number of occurrences)
-        Notes : Maps each word in the text stream to a short integer as soon as it has been read, thus enabling more n-grams to be stored and sorted in memory.
-        By default, the id n-gram file is written out as binary file, unless the parameter write_ascii is set to True.
-        The size of the buffer which is used to store the n-grams can be specified using the buffersize parameter. This value is in megabytes, and the default value can be changed from 100 by changing the value of STD_MEM in the file src/toolkit.h before compiling the toolkit.
-        The function will also report the frequency of frequency of n-grams, and the corresponding recommended value for the spec_num parameters of idngram2lm. The fof_size parameter allows the user to specify the length of this list. A value of 0 will result in no list being displayed.
-        In the case of really huge quantities of data, it may be the case that more temporary files are generated than can be opened at one time by the filing system. In this case, the temporary files will be merged in chunks, and the files parameter can be used to specify how many files are allowed to be open at one time.
+        List of every word n-gram which occurred in the text, along with its number of occurrences.
+        The maximum numbers of charactors and words that can be stored in the buffer are given by the chars and words parameters.
+        The text can be given as a string, as a path (e.g. a pathlib.Path), as an open file object or as an iterable of lines. It is streamed to the tool, so the corpus never needs to fit into memory.
     """
-    cmd = ['text2idngram', '-vocab', os.path.abspath(vocab_file),
-                           '-idngram', os.path.abspath(output_file)]
+    cmd = _text2wngram_cmd(n, chars, words, compress, verbosity)
+    _run(cmd, text, output_file, policy=policy)
+
+def _text2idngram_cmd(vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10):
+    cmd = ['text2idngram', '-vocab', vocab_file,
+                           '-idngram', output_file]
 
     if buffersize:
         cmd.extend(['-buffer', buffersize])
@@ -220,31 +466,22 @@ def text2idngram(text, vocab_file, output_file, buffersize=100, hashtablesize=20
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
-    
-    with tempfile.SpooledTemporaryFile() as output_f:
-        with tempfile.SpooledTemporaryFile() as input_f:
-            input_f.write(text.encode('utf-8') if sys.version_info >= (3,) and type(text) is str else text)
-            input_f.seek(0)
-            with  output_to_debuglogger() as err_f:
-                with do_in_tempdir():
-                    exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-        output = output_f.read()
-
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%r' returned with non-zero exit status '%s'" % (cmd, exitcode))
+    return cmd
 
-    if sys.version_info >= (3,) and type(output) is bytes:
-        output = output.decode('utf-8')
-
-    return output.strip()
-
-def ngram2mgram(input_file, output_file, n, m, words=False, ascii_idngram=False):
+def text2idngram(text, vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10, policy=None):
     """
-        Takes either a word n-gram file, or an id n-gram file and outputs a file of the same type where m < n.
+        Takes a text stream, plus a vocabulary file, and outputs an idngram file (a ist of every id n-gram which occurred in the text, along with its number of occurrences)
+        Notes : Maps each word in the text stream to a short integer as soon as it has been read, thus enabling more n-grams to be stored and sorted in memory.
+        By default, the id n-gram file is written out as binary file, unless the parameter write_ascii is set to True.
+        The size of the buffer which is used to store the n-grams can be specified using the buffersize parameter. This value is in megabytes, and the default value can be changed from 100 by changing the value of STD_MEM in the file src/toolkit.h before compiling the toolkit.
+        The function will also report the frequency of frequency of n-grams, and the corresponding recommended value for the spec_num parameters of idngram2lm. The fof_size parameter allows the user to specify the length of this list. A value of 0 will result in no list being displayed.
+        In the case of really huge quantities of data, it may be the case that more temporary files are generated than can be opened at one time by the filing system. In this case, the temporary files will be merged in chunks, and the files parameter can be used to specify how many files are allowed to be open at one time.
+        The text can be given as a string, as a path (e.g. a pathlib.Path), as an open file object or as an iterable of lines. It is streamed to the tool, so the corpus never needs to fit into memory.
     """
+    cmd = _text2idngram_cmd(os.path.abspath(vocab_file), os.path.abspath(output_file), buffersize, hashtablesize, files, compress, verbosity, n, write_ascii, fof_size)
+    return _run(cmd, text, inputs=[vocab_file], outputs=[output_file], policy=policy)
+
+def _ngram2mgram_cmd(n, m, words=False, ascii_idngram=False):
     cmd = ['ngram2mgram', '-n', n,
                           '-m', m]
 
@@ -260,26 +497,18 @@ def ngram2mgram(input_file, output_file, n, m, words=False, ascii_idngram=False)
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
+    return cmd
 
-    with open(input_file,'r') as input_f:
-        with open(output_file,'w+') as output_f:
-            with  output_to_debuglogger() as err_f:
-                exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
-
-def wngram2idngram(input_file, vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10):
+def ngram2mgram(input_file, output_file, n, m, words=False, ascii_idngram=False, policy=None):
     """
-        Takes a word N-gram file and a vocabulary file and lists every id n-gram which occurred in the text, along with its number of occurrences, in either ASCII or binary format.
-
-        Note : It is important that the vocabulary file is in alphabetical order. If you are using vocabularies generated by wfreq2vocab then this should not be an issue, as they will already be alphabetically sorted.
+        Takes either a word n-gram file, or an id n-gram file and outputs a file of the same type where m < n.
     """
-    cmd = ['wngram2idngram', '-vocab', os.path.abspath(vocab_file),
-                             '-idngram', os.path.abspath(output_file)]
+    cmd = _ngram2mgram_cmd(n, m, words, ascii_idngram)
+    _run(cmd, _as_path(input_file), output_file, policy=policy)
+
+def _wngram2idngram_cmd(vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10):
+    cmd = ['wngram2idngram', '-vocab', vocab_file,
+                             '-idngram', output_file]
     if buffersize:
         cmd.extend(['-buffer', buffersize])
 
@@ -305,64 +534,43 @@ def wngram2idngram(input_file, vocab_file, output_file, buffersize=100, hashtabl
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
-    
-    with tempfile.SpooledTemporaryFile() as output_f:
-        with tempfile.SpooledTemporaryFile() as input_f:
-            input_f.write(text.encode('utf-8') if sys.version_info >= (3,) and type(text) is str else text)
-            input_f.seek(0)
-            with  output_to_debuglogger() as err_f:
-                with do_in_tempdir():
-                    exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-        output = output_f.read()
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%r' returned with non-zero exit status '%s'" % (cmd, exitcode))
-
-    if sys.version_info >= (3,) and type(output) is bytes:
-        output = output.decode('utf-8')
+    return cmd
 
-    return output.strip()
-
-def idngram2stats(input_file, output_file, n=3, fof_size=50, verbosity=2, ascii_input=False):
+def wngram2idngram(input_file, vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10, policy=None):
     """
-        Lists the frequency-of-frequencies for each of the 2-grams, ... , n-grams, which can enable the user to choose appropriate cut-offs, and to specify appropriate memory requirements with the spec_num parameter in idngram2lm.
+        Takes a word N-gram file and a vocabulary file and lists every id n-gram which occurred in the text, along with its number of occurrences, in either ASCII or binary format.
+
+        Note : It is important that the vocabulary file is in alphabetical order. If you are using vocabularies generated by wfreq2vocab then this should not be an issue, as they will already be alphabetically sorted.
     """
+    cmd = _wngram2idngram_cmd(os.path.abspath(vocab_file), os.path.abspath(output_file), buffersize, hashtablesize, files, compress, verbosity, n, write_ascii, fof_size)
+    return _run(cmd, _as_path(input_file), inputs=[vocab_file], outputs=[output_file], policy=policy)
+
+def _idngram2stats_cmd(n=3, fof_size=50, verbosity=2, ascii_input=False):
     cmd = ['idngram2stats']
     if n:
         cmd.extend(['-n', n])
     
     if fof_size:
-        cmd.extend(['-fof_size'], fof_size)
+        cmd.extend(['-fof_size', fof_size])
 
     if verbosity:
-        cmd.extend(['-verbosity'], verbosity)
+        cmd.extend(['-verbosity', verbosity])
 
     if ascii_input:
-        cmd.append(['-ascii_input'])
+        cmd.append('-ascii_input')
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
+    return cmd
 
-    with open(input_file,'r') as input_f:
-        with open(output_file,'w+') as output_f:
-            with  output_to_debuglogger() as err_f:
-                exitcode = subprocess.call(cmd, stdin=input_f, stdout=output_f, stderr=err_f)
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
-
-def mergeidngram(output_file, input_files, n=3, ascii_input=False, ascii_output=False):
+def idngram2stats(input_file, output_file, n=3, fof_size=50, verbosity=2, ascii_input=False, policy=None):
     """
-        Takes a set of id n-gram files (in either binary (by default) or ASCII (if specified) format - note that they should all be in the same format, however) and outputs a merged id N-gram.
-
-        Notes : This function can also be used to convert id n-gram files between ascii and binary formats.
+        Lists the frequency-of-frequencies for each of the 2-grams, ... , n-grams, which can enable the user to choose appropriate cut-offs, and to specify appropriate memory requirements with the spec_num parameter in idngram2lm.
     """
+    cmd = _idngram2stats_cmd(n, fof_size, verbosity, ascii_input)
+    _run(cmd, _as_path(input_file), output_file, policy=policy)
+
+def _mergeidngram_cmd(input_files, n=3, ascii_input=False, ascii_output=False):
     cmd = ['mergeidngram']
     if n:
         cmd.extend(['-n', n])
@@ -373,38 +581,35 @@ def mergeidngram(output_file, input_files, n=3, ascii_input=False, ascii_output=
     if ascii_output:
         cmd.append('-ascii_output')
 
-    if len(input_file) > 1:
-        raise MergeError("mergeidngram needs at least 1 input file")
+    input_files = list(input_files)
+    if len(input_files) < 1:
+        raise ConversionError("mergeidngram needs at least 1 input file")
 
     cmd.extend(input_files)
 
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
+    return cmd
 
-    with open(output_file,'w+') as output_f:
-        with  output_to_debuglogger() as err_f:
-            exitcode = subprocess.call(cmd, stdout=output_f, stderr=err_f)
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
-
-def idngram2lm(idngram_file, vocab_file, output_file, context_file=None, vocab_type=1, oov_fraction=0.5, four_byte_counts=False, min_unicount=0, zeroton_fraction=False, n=3, verbosity=2, arpa_output=True, ascii_input=False):
+def mergeidngram(output_file, input_files, n=3, ascii_input=False, ascii_output=False, policy=None):
     """
-        Takes an idngram-file (in either binary (by default) or ASCII (if specified) format), a vocabulary file, and (optionally) a context cues file. Additional command line parameters will specify the cutoffs, the discounting strategy and parameters, etc. It outputs a language model, in either binary format (to be read by evallm), or in ARPA format.
+        Takes a set of id n-gram files (in either binary (by default) or ASCII (if specified) format - note that they should all be in the same format, however) and outputs a merged id N-gram.
+
+        Notes : This function can also be used to convert id n-gram files between ascii and binary formats.
     """
+    input_files = [os.path.abspath(f) for f in input_files]
+    cmd = _mergeidngram_cmd(input_files, n, ascii_input, ascii_output)
+    _run(cmd, output_file=output_file, inputs=input_files, policy=policy)
+
+def _idngram2lm_cmd(idngram_file, vocab_file, output_file, context_file=None, vocab_type=1, oov_fraction=0.5, four_byte_counts=False, min_unicount=0, zeroton_fraction=False, n=3, verbosity=2, arpa_output=True, ascii_input=False, calc_mem=False, buffersize=None, spec_num=None, cutoffs=None):
      # TODO: Args still missing
-     # [ -calc_mem | -buffer 100 | -spec_num y ... z ]
      # [ -two_byte_bo_weights   
      #     [ -min_bo_weight nnnnn] [ -max_bo_weight nnnnn] [ -out_of_range_bo_weights] ]
      # [ -linear | -absolute | -good_turing | -witten_bell ]
      # [ -disc_ranges 1 7 7 ]
-     # [ -cutoffs 0 ... 0 ]
 
-    cmd = ['idngram2lm', '-idngram', os.path.abspath(idngram_file),
-                         '-vocab', os.path.abspath(vocab_file),
+    cmd = ['idngram2lm', '-idngram', idngram_file,
+                         '-vocab', vocab_file,
                          '-vocab_type', vocab_type,
                          '-oov_fraction', oov_fraction,
                          '-min_unicount',min_unicount,
@@ -415,6 +620,9 @@ def idngram2lm(idngram_file, vocab_file, output_file, context_file=None, vocab_t
     else:
         cmd.extend(['-binary',output_file])
 
+    if context_file:
+        cmd.extend(['-context', context_file])
+
     if four_byte_counts:
         cmd.append('-four_byte_counts')
 
@@ -426,100 +634,428 @@ def idngram2lm(idngram_file, vocab_file, output_file, context_file=None, vocab_t
     else:
         cmd.append('-bin_input')
 
-    # Ensure that every parameter is of type 'str'
-    cmd = [str(x) for x in cmd]
-
-    with tempfile.SpooledTemporaryFile() as output_f:
-        with  output_to_debuglogger() as err_f:
-            exitcode = subprocess.call(cmd, stdout=output_f, stderr=err_f)
-        output = output_f.read()
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
-
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
+    if spec_num:
+        cmd.append('-spec_num')
+        cmd.extend(spec_num)
+    elif buffersize:
+        cmd.extend(['-buffer', buffersize])
+    elif calc_mem:
+        cmd.append('-calc_mem')
 
-    if sys.version_info >= (3,) and type(output) is bytes:
-        output = output.decode('utf-8')
+    if cutoffs:
+        cmd.append('-cutoffs')
+        cmd.extend(cutoffs)
 
-    return output.strip()
+    # Ensure that every parameter is of type 'str'
+    cmd = [str(x) for x in cmd]
+    return cmd
 
-def binlm2arpa(input_file, output_file, verbosity=2):
+def idngram2lm(idngram_file, vocab_file, output_file, context_file=None, vocab_type=1, oov_fraction=0.5, four_byte_counts=False, min_unicount=0, zeroton_fraction=False, n=3, verbosity=2, arpa_output=True, ascii_input=False, calc_mem=False, buffersize=None, spec_num=None, cutoffs=None, policy=None):
     """
-        Converts a binary format language model, as generated by idngram2lm, into an an ARPA format language model.
+        Takes an idngram-file (in either binary (by default) or ASCII (if specified) format), a vocabulary file, and (optionally) a context cues file. Additional command line parameters will specify the cutoffs, the discounting strategy and parameters, etc. It outputs a language model, in either binary format (to be read by evallm), or in ARPA format.
+        Memory for the n-grams is allocated according to one of the parameters spec_num (a list with the number of 2-grams, ..., n-grams), buffersize (in megabytes) or calc_mem (if True, idngram2lm reads the idngram file twice to calculate the exact memory requirement), in that order of precedence.
+        cutoffs is a list with the cutoff for 2-grams, ..., n-grams: n-grams occurring at most that often are left out of the model (default: 0).
     """
+    cmd = _idngram2lm_cmd(os.path.abspath(idngram_file), os.path.abspath(vocab_file), os.path.abspath(output_file), context_file and os.path.abspath(context_file), vocab_type, oov_fraction, four_byte_counts, min_unicount, zeroton_fraction, n, verbosity, arpa_output, ascii_input, calc_mem, buffersize, spec_num, cutoffs)
+    return _run(cmd, inputs=[idngram_file, vocab_file, context_file], outputs=[output_file], policy=policy)
+
+def _binlm2arpa_cmd(input_file, output_file, verbosity=2):
     cmd = ['binlm2arpa', '-binary', input_file,
-                         '-arpa'. output_file]
+                         '-arpa', output_file]
     
     if verbosity:
         cmd.extend(['-verbosity', verbosity])
     
     # Ensure that every parameter is of type 'str'
     cmd = [str(x) for x in cmd]
+    return cmd
 
-    with tempfile.SpooledTemporaryFile() as output_f:
-        with  output_to_debuglogger() as err_f:
-            exitcode = subprocess.call(cmd, stdout=output_f, stderr=err_f)
-        output = output_f.read()
-    
-    logger = logging.getLogger(__name__)
-    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))        
+def binlm2arpa(input_file, output_file, verbosity=2, policy=None):
+    """
+        Converts a binary format language model, as generated by idngram2lm, into an an ARPA format language model.
+    """
+    cmd = _binlm2arpa_cmd(os.path.abspath(input_file), os.path.abspath(output_file), verbosity)
+    return _run(cmd, inputs=[input_file], outputs=[output_file], policy=policy)
 
-    if exitcode != 0:
-        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
+def _interpolate_cmd(probs_files, fixed=(), test_all=False, test_first=None, test_last=None, cv=False, tags_file=None, captions_file=None, in_lambdas=None, out_lambdas=None, stop_ratio=0.999, probs_file=None, max_probs=6000000):
+    cmd = ['interpolate']
+
+    probs_files = list(probs_files)
+    if len(probs_files) < 1:
+        raise ConversionError("interpolate needs at least 1 probability stream")
+
+    for i, f in enumerate(probs_files):
+        cmd.extend(['+-' if i in fixed else '+', f])
+
+    if test_all:
+        cmd.append('-test_all')
+    elif test_first:
+        cmd.extend(['-test_first', test_first])
+    elif test_last:
+        cmd.extend(['-test_last', test_last])
+    elif cv:
+        cmd.append('-cv')
+
+    if tags_file:
+        cmd.extend(['-tags', tags_file])
+
+    if captions_file:
+        cmd.extend(['-captions', captions_file])
+
+    if in_lambdas:
+        cmd.extend(['-in_lambdas', in_lambdas])
 
-    if sys.version_info >= (3,) and type(output) is bytes:
-        output = output.decode('utf-8')
+    if out_lambdas:
+        cmd.extend(['-out_lambdas', out_lambdas])
 
-    return output.strip()
+    if stop_ratio:
+        cmd.extend(['-stop_ratio', stop_ratio])
 
-def text2vocab(text, output_file, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}):
+    if probs_file:
+        cmd.extend(['-probs', probs_file])
+
+    if max_probs:
+        cmd.extend(['-max_probs', max_probs])
+
+    # Ensure that every parameter is of type 'str'
+    cmd = [str(x) for x in cmd]
+    return cmd
+
+def interpolate(probs_files, fixed=(), test_all=False, test_first=None, test_last=None, cv=False, tags_file=None, captions_file=None, in_lambdas=None, out_lambdas=None, stop_ratio=0.999, probs_file=None, max_probs=6000000, policy=None):
+    """
+        Takes the probability streams of several language models on the same text (as written by evallm's perplexity command with -probs) and finds the weights of their linear interpolation that minimize the perplexity, using the EM algorithm. Returns the output of the tool, which reports the weights and the perplexity.
+        The weights of the models whose indices are in fixed are not changed from their initial values, which are read from in_lambdas (default: all equal). The final weights are written to out_lambdas and the interpolated probability stream to probs_file.
+        The weights are tuned on all of the text, unless one of test_all (evaluate on all of the text), test_first or test_last (hold out the first or last n probabilities for testing) or cv (two-way cross-validation) is given. tags_file assigns every word a tag and tunes separate weights per tag, captions_file names them.
+        EM stops when an iteration improves the perplexity by a factor smaller than stop_ratio. max_probs is the maximum number of probabilities read from each stream. See also cmuclmtk.mixture, which tunes the weights with NumPy.
+    """
+    cmd = _interpolate_cmd([os.path.abspath(f) for f in probs_files], fixed, test_all, test_first, test_last, cv, tags_file and os.path.abspath(tags_file), captions_file and os.path.abspath(captions_file), in_lambdas and os.path.abspath(in_lambdas), out_lambdas and os.path.abspath(out_lambdas), stop_ratio, probs_file and os.path.abspath(probs_file), max_probs)
+    return _run(cmd, inputs=list(probs_files) + [tags_file, captions_file, in_lambdas], outputs=[out_lambdas, probs_file], policy=policy)
+
+@contextmanager
+def _fifo(name):
+    """
+        Creates a named pipe in a temporary directory and removes it afterwards.
+    """
+    with scratch_dir() as tempdir:
+        path = os.path.join(tempdir, name)
+        os.mkfifo(path)
+        yield path
+
+def _break_fifo(path):
+    """
+        Unblocks the other end of a named pipe after one end failed: a stage waiting to open it goes on and sees end of file or a broken pipe, and the pipe is replaced by a directory, so that a stage opening it later fails right away.
+    """
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return
+    try:
+        os.remove(path)
+        os.mkdir(path)
+    finally:
+        os.close(fd)
+
+def _connected(fifo, producer, consumer):
+    """
+        Runs producer(), which writes to the named pipe fifo, in a worker thread and consumer(), which reads from it, in the calling thread. Returns both of their results. If either of them fails, the other one is unblocked and the error of the one that failed first is raised.
+    """
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(_propagate(producer))
+        future.add_done_callback(lambda future: future.exception() is not None and _break_fifo(fifo))
+        try:
+            consumed = consumer()
+        except BaseException:
+            if future.done() and future.exception() is not None:
+                # The consumer only failed because the producer did
+                raise future.exception()
+            _break_fifo(fifo)
+            raise
+        return future.result(), consumed
+
+@_pipeline('text2vocab')
+def text2vocab(text, output_file, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, pipe=False, policy=None):
     """
         Convienience function that uses text2wfreq and wfreq2vocab to create a vocabulary file from text.
+        If pipe is True, text2wfreq writes the word frequencies to a named pipe that wfreq2vocab reads at the same time, so they never touch the disk. Where named pipes are not available (e.g. on Windows), a temporary file is used instead.
     """
-    with tempfile.NamedTemporaryFile(suffix='.wfreq', delete=False) as f:
-        wfreq_file = f.name
+    if pipe and hasattr(os, 'mkfifo'):
+        with _fifo('wfreq') as wfreq_file:
+            _connected(wfreq_file, lambda: text2wfreq(text, wfreq_file, policy=policy, **text2wfreq_kwargs),
+                                   lambda: wfreq2vocab(wfreq_file, output_file, policy=policy, **wfreq2vocab_kwargs))
+        return
+
+    wfreq_file = _mktemp('.wfreq')
 
     try:
-        text2wfreq(text, wfreq_file, **text2wfreq_kwargs)
-        wfreq2vocab(wfreq_file, output_file, **wfreq2vocab_kwargs)
+        text2wfreq(text, wfreq_file, policy=policy, **text2wfreq_kwargs)
+        wfreq2vocab(wfreq_file, output_file, policy=policy, **wfreq2vocab_kwargs)
     except ConversionError:
         raise
     finally:
         os.remove(wfreq_file)
 
-def text2lm(text, output_file, vocab_file=None, text2idngram_kwargs={}, idngram2lm_kwargs={}):
+class _TeeReader(object):
     """
-        Convienience function to directly convert text (and vocabulary) into a language model.
+        File-like object that reads the corpus chunk by chunk and writes a copy of everything that has been read to copy_f.
     """
-    if vocab_file:
-        used_vocab_file = vocab_file
-    else:
-        # Create temporary vocab file
-        with tempfile.NamedTemporaryFile(suffix='.vocab', delete=False) as f:
-            used_vocab_file = f.name
-        text2vocab(text, used_vocab_file)
+    def __init__(self, text, copy_f):
+        self._chunks = _corpus_chunks(text)
+        self._copy_f = copy_f
 
-    # Create temporary idngram file
-    with tempfile.NamedTemporaryFile(suffix='.idngram', delete=False) as f:
-        idngram_file = f.name
+    def read(self, size=-1):
+        chunk = next(self._chunks, b'')
+        self._copy_f.write(chunk)
+        return chunk
 
+class _ShardReader(object):
+    """
+        File-like object that reads the byte range [start, end) of a corpus file, preceded by the given prefix.
+    """
+    def __init__(self, path, start, end, prefix=b''):
+        self._path = path
+        self._start = start
+        self._end = end
+        self._prefix = prefix
+        self._f = None
+
+    def read(self, size=CHUNKSIZE):
+        if self._prefix:
+            chunk, self._prefix = self._prefix, b''
+            return chunk
+        if self._f is None:
+            self._f = open(self._path, 'rb')
+            self._f.seek(self._start)
+        size = min(size, self._end - self._f.tell())
+        chunk = self._f.read(size) if size > 0 else b''
+        if not chunk:
+            self._f.close()
+        return chunk
+
+def _shard_offsets(path, shards):
+    """
+        Returns the byte offsets at which a corpus file can be split into (at most) the given number of shards. Shards always start at the beginning of a line.
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            f.seek(max(size * i // shards, offsets[-1]))
+            f.readline()
+            offset = f.tell()
+            if offset >= size:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+    offsets.append(size)
+    return offsets
+
+def _words_before(path, offset, count):
+    """
+        Returns the last count words in a corpus file before the given byte offset.
+    """
+    if count <= 0:
+        return []
+    blocksize = 4096
+    with open(path, 'rb') as f:
+        start = offset
+        while True:
+            start = max(0, start - blocksize)
+            f.seek(start)
+            words = f.read(offset - start).split()
+            # The first word might have been cut in half, so make sure we got more than we need
+            if start == 0 or len(words) > count:
+                return words[-count:]
+            blocksize *= 2
+
+@_pipeline('sharded_text2idngram')
+def sharded_text2idngram(corpus_file, vocab_file, output_file, workers=None, **kwargs):
+    """
+        Like text2idngram, but splits the corpus file into one shard per worker, counts the id n-grams of all shards in parallel and merges them with mergeidngram afterwards. The result is identical to running text2idngram on the whole corpus.
+        Each shard (except the first) is preceded by the last n-1 words of the previous shard, so that the n-grams spanning a shard boundary are counted exactly once. Any additional keyword arguments are passed to text2idngram.
+        The number of workers defaults to the number of CPUs.
+    """
+    import concurrent.futures
+    corpus_file = os.path.abspath(corpus_file)
+    n = kwargs.get('n', 3)
+    offsets = _shard_offsets(corpus_file, workers or os.cpu_count() or 1)
+    if len(offsets) <= 2:
+        return text2idngram(_as_path(corpus_file), vocab_file, output_file, **kwargs)
+
+    shard_files = [_mktemp('.idngram') for _ in offsets[1:]]
     try:
-        output1 = text2idngram(text, vocab_file=used_vocab_file, output_file=idngram_file, **text2idngram_kwargs)
-        output2 = idngram2lm(idngram_file, vocab_file=used_vocab_file, output_file=output_file, **idngram2lm_kwargs)
-    except ConversionError:
-        output = (None, None)
-        raise
-    else:
-        output = (output1, output2)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(shard_files)) as executor:
+            futures = []
+            for i, shard_file in enumerate(shard_files):
+                start, end = offsets[i], offsets[i+1]
+                prefix = b' '.join(_words_before(corpus_file, start, n - 1))
+                shard = _ShardReader(corpus_file, start, end, prefix + b'\n' if prefix else b'')
+                futures.append(executor.submit(_propagate(text2idngram), shard, vocab_file, shard_file, **kwargs))
+            outputs = [future.result() for future in futures]
+
+        write_ascii = kwargs.get('write_ascii', False)
+        mergeidngram(output_file, shard_files, n=n, ascii_input=write_ascii, ascii_output=write_ascii, policy=kwargs.get('policy'))
     finally:
-        # Remove temporary files
-        if not vocab_file:
-            os.remove(used_vocab_file)
-        os.remove(idngram_file)
+        for shard_file in shard_files:
+            os.remove(shard_file)
+    return '\n'.join(output for output in outputs if output)
+
+def _cached_stage(cache, key, output_file, stage):
+    """
+        Runs stage() to create output_file and returns its output, unless there already is an artifact for key in the cache.
+    """
+    if cache is not None:
+        output = cache.get(key, output_file)
+        if output is not None:
+            return output
+    output = stage()
+    if cache is not None:
+        cache.put(key, output_file, output)
     return output
 
+def _tuned(tool, tuned, kwargs, parameters):
+    """
+        Returns kwargs updated with the automatically tuned parameters for a tool, and records them in parameters. Parameters given explicitly take precedence.
+    """
+    tuned = dict(tuned, **kwargs)
+    logging.getLogger(__name__).info("Parameters for %s: %s", tool, ', '.join('%s=%s' % item for item in sorted(tuned.items())))
+    parameters[tool] = tuned
+    return tuned
+
+class LMOutputs(tuple):
+    """
+        The outputs of text2idngram and idngram2lm, as returned by text2lm. parameters maps the name of every tool whose parameters were tuned with auto_tune to the keyword arguments it was run with.
+    """
+    def __new__(cls, outputs, parameters=None):
+        self = super(LMOutputs, cls).__new__(cls, outputs)
+        self.parameters = parameters or {}
+        return self
+
+@_pipeline('text2lm')
+def text2lm(text, output_file, vocab_file=None, text2idngram_kwargs={}, idngram2lm_kwargs={}, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, workers=1, cache=None, auto_tune=False, pipe=False, normalizer=None, policy=None, in_process=None, normalize_workers=None):
+    """
+        Convienience function to directly convert text (and vocabulary) into a language model.
+        If no vocab_file is given, the vocabulary is created from the text, too. The corpus is read only once in that case: text2wfreq counts the words while the corpus is being read and a copy is spooled to a single temporary file, which text2idngram reads as soon as the vocabulary is ready. Strings and paths can be read twice without copying, so they are passed to both stages directly.
+        If workers is greater than 1, the id n-grams are counted by that many text2idngram processes in parallel (see sharded_text2idngram).
+        If a cache (see cmuclmtk.cache.ArtifactCache) is given, the results of all stages are looked up in and stored to it, keyed on the hash of their input and their effective command line. E.g. if only idngram2lm_kwargs change between two builds of the same corpus, the second build skips straight to idngram2lm. If the language model itself is cached, the stored tool outputs are returned (with None for text2idngram's if its id n-grams have been evicted).
+        If auto_tune is True, the memory parameters of the tools (hash table sizes, buffer sizes and the n-gram counts for idngram2lm) are derived from the corpus (see cmuclmtk.tuning), logged and returned in the parameters attribute of the result (see LMOutputs). Parameters given in the kwargs dicts are used as they are.
+        If pipe is True, the word frequencies and the id n-grams are passed between the tools through named pipes instead of temporary files, with both tools running at the same time (see text2vocab). The id n-grams still go through a temporary file if they have to be read more than once: to store them in the cache, to count them for auto_tune or for idngram2lm's calc_mem.
+        If a normalizer (see cmuclmtk.normalize.Normalizer) is given, the text is normalized by a pool of normalize_workers processes (default: one per CPU) while it is streamed to the tools.
+        The policy (see cmuclmtk.policy.ExecutionPolicy) applies to every tool run, separately.
+        If in_process is True, the id n-grams are counted in-process with NumPy (see cmuclmtk.idngram.count_idngrams) instead of by text2idngram, which is much faster for small corpora; text2idngram_kwargs other than n, write_ascii and fof_size are ignored then. By default (in_process=None), this is done if NumPy is installed, the corpus is a string or path of at most IN_PROCESS_MAX_SIZE bytes and text2idngram_kwargs holds no other options. The first output returned is the frequency of frequencies report in text2idngram's layout in that case.
+    """
+    if normalizer is not None:
+        from .normalize import normalize
+        text = normalize(text, normalizer, normalize_workers)
+    if auto_tune:
+        from . import tuning
+    if cache is not None:
+        from .cache import hash_file, hash_bytes
+
+    temp_files = []
+    parameters = {}
+    try:
+        if vocab_file:
+            used_vocab_file = vocab_file
+        else:
+            # Create temporary vocab file
+            used_vocab_file = _mktemp('.vocab')
+            temp_files.append(used_vocab_file)
+        vocab_done = bool(vocab_file)
+
+        is_string = isinstance(text, (bytes, str))
+        if not _is_path(text) and (workers > 1 or cache is not None or (auto_tune and not is_string) or not (vocab_file or is_string)):
+            # Spool the corpus to disk (while creating the vocabulary, if possible)
+            corpus_file = _mktemp('.txt')
+            temp_files.append(corpus_file)
+            with open(corpus_file, 'wb') as copy_f:
+                if vocab_done or cache is not None or auto_tune:
+                    for chunk in _corpus_chunks(text):
+                        copy_f.write(chunk)
+                else:
+                    text2vocab(_TeeReader(text, copy_f), used_vocab_file, text2wfreq_kwargs, wfreq2vocab_kwargs, pipe, policy)
+                    vocab_done = True
+            text = _as_path(corpus_file)
+
+        if auto_tune:
+            estimate = tuning.estimate_corpus(text)
+            logging.getLogger(__name__).info("Corpus estimate: %d words, %d distinct words", estimate.words, estimate.distinct_words)
+            if not vocab_done:
+                text2wfreq_kwargs = _tuned('text2wfreq', tuning.text2wfreq_parameters(estimate), text2wfreq_kwargs, parameters)
+                wfreq2vocab_kwargs = _tuned('wfreq2vocab', tuning.wfreq2vocab_parameters(estimate), wfreq2vocab_kwargs, parameters)
+
+        if cache is None:
+            if not vocab_done:
+                text2vocab(text, used_vocab_file, text2wfreq_kwargs, wfreq2vocab_kwargs, pipe, policy)
+        else:
+            corpus_key = hash_file(text) if _is_path(text) else hash_bytes(_to_bytes(text))
+            if vocab_file:
+                vocab_key = hash_file(vocab_file)
+            else:
+                wfreq_key = cache.key(corpus_key, _text2wfreq_cmd(**text2wfreq_kwargs))
+                vocab_key = cache.key(wfreq_key, _wfreq2vocab_cmd(**wfreq2vocab_kwargs))
+                if cache.get(vocab_key, used_vocab_file) is None:
+                    wfreq_file = _mktemp('.wfreq')
+                    temp_files.append(wfreq_file)
+                    _cached_stage(cache, wfreq_key, wfreq_file, lambda: text2wfreq(text, wfreq_file, policy=policy, **text2wfreq_kwargs))
+                    wfreq2vocab(wfreq_file, used_vocab_file, policy=policy, **wfreq2vocab_kwargs)
+                    cache.put(vocab_key, used_vocab_file)
+
+        count_in_process = _in_process_counter(text, in_process, text2idngram_kwargs)
+
+        if auto_tune and count_in_process is None:
+            text2idngram_kwargs = _tuned('text2idngram', tuning.text2idngram_parameters(estimate, tuning.count_vocab(used_vocab_file), text2idngram_kwargs.get('n', 3), workers), text2idngram_kwargs, parameters)
+
+        if cache is None:
+            idngram_key = lm_key = None
+        else:
+            if count_in_process is None:
+                idngram_key = cache.key(corpus_key, vocab_key, _text2idngram_cmd('{vocab}', '{idngram}', **text2idngram_kwargs))
+            else:
+                idngram_key = cache.key(corpus_key, vocab_key, ['count_idngrams'] + ['-%s=%s' % item for item in sorted(_in_process_kwargs(text2idngram_kwargs).items())])
+            context_file = idngram2lm_kwargs.get('context_file')
+            lm_key = cache.key(idngram_key, vocab_key, hash_file(context_file) if context_file else '',
+                               _idngram2lm_cmd('{idngram}', '{vocab}', '{lm}', **idngram2lm_kwargs))
+
+            output2 = cache.get(lm_key, output_file)
+            if output2 is not None:
+                return LMOutputs((cache.output(idngram_key), output2), parameters)
+
+        tune_spec_num = auto_tune and not any(idngram2lm_kwargs.get(name) for name in ('spec_num', 'buffersize', 'calc_mem'))
+
+        def count_idngrams(idngram_file):
+            if count_in_process is not None:
+                return count_in_process(text, used_vocab_file, idngram_file, **_in_process_kwargs(text2idngram_kwargs))
+            if workers > 1:
+                return sharded_text2idngram(text, vocab_file=used_vocab_file, output_file=idngram_file, workers=workers, policy=policy, **text2idngram_kwargs)
+            return text2idngram(text, vocab_file=used_vocab_file, output_file=idngram_file, policy=policy, **text2idngram_kwargs)
+
+        def build_lm(idngram_file):
+            kwargs = idngram2lm_kwargs
+            if tune_spec_num:
+                # The n-gram counts are known exactly once the id n-grams exist
+                spec_num = tuning.idngram2lm_spec_num(idngram_file, kwargs.get('n', 3), kwargs.get('ascii_input', False))
+                kwargs = _tuned('idngram2lm', {'spec_num': spec_num} if spec_num else {'calc_mem': True}, kwargs, parameters)
+            return idngram2lm(idngram_file, vocab_file=used_vocab_file, output_file=output_file, policy=policy, **kwargs)
+
+        if pipe and hasattr(os, 'mkfifo'):
+            if cache is None and not tune_spec_num and not idngram2lm_kwargs.get('calc_mem'):
+                with _fifo('idngram') as idngram_file:
+                    return LMOutputs(_connected(idngram_file, lambda: count_idngrams(idngram_file), lambda: build_lm(idngram_file)), parameters)
+            logging.getLogger(__name__).debug("The id n-grams are read more than once, using a temporary file instead of a pipe")
+
+        # Create temporary idngram file
+        idngram_file = _mktemp('.idngram')
+        temp_files.append(idngram_file)
+
+        output1 = _cached_stage(cache, idngram_key, idngram_file, lambda: count_idngrams(idngram_file))
+        output2 = _cached_stage(cache, lm_key, output_file, lambda: build_lm(idngram_file))
+    finally:
+        # Remove temporary files
+        for temp_file in temp_files:
+            os.remove(temp_file)
+    return LMOutputs((output1, output2), parameters)
+
 if __name__ == "__main__":
 
     # Initialize logging system
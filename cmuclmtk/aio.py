@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    asyncio versions of the CMUCLMTK wrappers.
+
+    The coroutines take the same arguments and raise the same ConversionError as their blocking counterparts in the cmuclmtk module, but run the tools with asyncio.create_subprocess_exec, so that a single event loop can drive many builds concurrently. Cancelling a coroutine kills the tool it is waiting for.
+
+    Corpus text can additionally be given as an asynchronous iterable of lines.
+"""
+
+import os
+import time
+import asyncio
+import pathlib
+import tempfile
+import shutil
+import logging
+
+from . import metrics
+from . import progress
+from .toolchain import get_toolchain
+from .policy import ExecutionPolicy, TIMEOUT
+from . import (ConversionError, LimitExceededError, CHUNKSIZE, _to_bytes, _is_path, _corpus_chunks, _mktemp,
+               _text2wfreq_cmd, _wfreq2vocab_cmd, _text2idngram_cmd, _idngram2lm_cmd, _binlm2arpa_cmd)
+
+async def _acorpus_chunks(text, chunksize=CHUNKSIZE):
+    """
+        Asynchronous variant of cmuclmtk._corpus_chunks, which also accepts asynchronous iterables of lines.
+    """
+    if hasattr(text, '__aiter__'):
+        buf = []
+        size = 0
+        async for line in text:
+            line = _to_bytes(line)
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            buf.append(line)
+            size += len(line)
+            if size >= chunksize:
+                yield b''.join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield b''.join(buf)
+    else:
+        for chunk in _corpus_chunks(text, chunksize):
+            yield chunk
+
+async def _feed(stream, text):
+    bytes_in = 0
+    try:
+        async for chunk in _acorpus_chunks(text):
+            stream.write(chunk)
+            bytes_in += len(chunk)
+            await stream.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # The child exited without reading all of its input, its exit code will tell us why
+        pass
+    finally:
+        stream.close()
+    return bytes_in
+
+async def _log_stderr(stream, cmd):
+    parser = progress.ProgressParser(cmd, progress.current_listeners())
+    while True:
+        data = await stream.read(4096)
+        if not data:
+            break
+        parser.feed(data)
+    parser.close()
+    return parser
+
+async def _run(cmd, text=None, output_file=None, scratch_dir=False, policy=None):
+    """
+        Runs cmd, streaming text (if given) to its stdin and its stdout either to output_file or, if no output_file is given, into the returned string.
+        If scratch_dir is True, the tool runs in a temporary directory of its own, which is removed afterwards.
+        A StageMetrics record is emitted like for the blocking wrappers, but without CPU time, as the child is reaped by asyncio.
+        The policy (see cmuclmtk.policy) is applied like for the blocking wrappers.
+    """
+    if policy is None:
+        policy = ExecutionPolicy()
+    executable = get_toolchain().command(cmd)
+    record = metrics.StageMetrics(cmd[0], cmd)
+    start = time.time()
+    input_f = open(os.fspath(text), 'rb') if _is_path(text) else None
+    output_f = open(output_file, 'wb') if output_file else None
+    cwd = tempfile.mkdtemp(prefix='cmuclmtk-') if scratch_dir else None
+    try:
+        if input_f:
+            stdin = input_f
+        else:
+            stdin = asyncio.subprocess.PIPE if text is not None else None
+        proc = await asyncio.create_subprocess_exec(*policy.command(executable), stdin=stdin,
+                                                    stdout=output_f or asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE, cwd=cwd, **policy.popen_kwargs())
+        memory = metrics.MemoryMonitor(proc.pid) if metrics.enabled() else None
+        try:
+            tasks = [_log_stderr(proc.stderr, cmd)]
+            if stdin == asyncio.subprocess.PIPE:
+                tasks.append(_feed(proc.stdin, text))
+            if not output_f:
+                tasks.append(proc.stdout.read())
+
+            async def communicate():
+                results = await asyncio.gather(*tasks)
+                return results, await proc.wait()
+
+            try:
+                results, exitcode = await asyncio.wait_for(communicate(), policy.timeout)
+            except asyncio.TimeoutError:
+                policy.kill(proc)
+                record.exitcode = await proc.wait()
+                record.max_rss = memory.stop() if memory else None
+                record.wall_time = time.time() - start
+                metrics.emit(record)
+                raise LimitExceededError("'%s' exceeded its timeout limit (exit status '%s')" % (cmd[0], record.exitcode), TIMEOUT)
+            if stdin == asyncio.subprocess.PIPE:
+                record.bytes_in = results[1]
+            elif input_f:
+                record.bytes_in = os.fstat(input_f.fileno()).st_size
+            record.bytes_out = output_f.tell() if output_f else len(results[-1])
+        except BaseException:
+            # Kill the child if anything went wrong, including cancellation
+            if proc.returncode is None:
+                policy.kill(proc)
+                await proc.wait()
+            raise
+        finally:
+            if memory:
+                record.max_rss = memory.stop()
+    finally:
+        for f in (input_f, output_f):
+            if f:
+                f.close()
+        if cwd:
+            shutil.rmtree(cwd, ignore_errors=True)
+
+    record.wall_time = time.time() - start
+    record.exitcode = exitcode
+    metrics.emit(record)
+
+    logger = logging.getLogger(__name__)
+    logger.debug("Command '%s' returned with exit code '%d'." % (' '.join(cmd), exitcode))
+
+    if exitcode != 0:
+        limit = policy.breach(exitcode, False, results[0].last_lines)
+        if limit:
+            raise LimitExceededError("'%s' exceeded its %s limit (exit status '%s')" % (cmd[0], limit.replace('_', ' '), exitcode), limit)
+        raise ConversionError("'%s' returned with non-zero exit status '%s'" % (cmd[0], exitcode))
+
+    if not output_f:
+        return results[-1].decode('utf-8').strip()
+
+async def text2wfreq(text, output_file, hashtablesize=1000000, verbosity=2, policy=None):
+    """
+        Coroutine version of cmuclmtk.text2wfreq.
+    """
+    await _run(_text2wfreq_cmd(hashtablesize, verbosity), text, output_file, scratch_dir=True, policy=policy)
+
+async def wfreq2vocab(wfreq_file, output_file, top=None, gt=None, records=1000000, verbosity=2, policy=None):
+    """
+        Coroutine version of cmuclmtk.wfreq2vocab.
+    """
+    await _run(_wfreq2vocab_cmd(top, gt, records, verbosity), pathlib.Path(wfreq_file), output_file, scratch_dir=True, policy=policy)
+
+async def text2idngram(text, vocab_file, output_file, buffersize=100, hashtablesize=2000000, files=20, compress=False, verbosity=2, n=3, write_ascii=False, fof_size=10, policy=None):
+    """
+        Coroutine version of cmuclmtk.text2idngram.
+    """
+    cmd = _text2idngram_cmd(os.path.abspath(vocab_file), os.path.abspath(output_file), buffersize, hashtablesize, files, compress, verbosity, n, write_ascii, fof_size)
+    return await _run(cmd, text, scratch_dir=True, policy=policy)
+
+async def idngram2lm(idngram_file, vocab_file, output_file, context_file=None, vocab_type=1, oov_fraction=0.5, four_byte_counts=False, min_unicount=0, zeroton_fraction=False, n=3, verbosity=2, arpa_output=True, ascii_input=False, calc_mem=False, buffersize=None, spec_num=None, cutoffs=None, policy=None):
+    """
+        Coroutine version of cmuclmtk.idngram2lm.
+    """
+    cmd = _idngram2lm_cmd(os.path.abspath(idngram_file), os.path.abspath(vocab_file), os.path.abspath(output_file), context_file and os.path.abspath(context_file), vocab_type, oov_fraction, four_byte_counts, min_unicount, zeroton_fraction, n, verbosity, arpa_output, ascii_input, calc_mem, buffersize, spec_num, cutoffs)
+    return await _run(cmd, scratch_dir=True, policy=policy)
+
+async def binlm2arpa(input_file, output_file, verbosity=2, policy=None):
+    """
+        Coroutine version of cmuclmtk.binlm2arpa.
+    """
+    return await _run(_binlm2arpa_cmd(os.path.abspath(input_file), os.path.abspath(output_file), verbosity), scratch_dir=True, policy=policy)
+
+async def text2vocab(text, output_file, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, policy=None):
+    """
+        Coroutine version of cmuclmtk.text2vocab.
+    """
+    wfreq_file = _mktemp('.wfreq')
+    try:
+        await text2wfreq(text, wfreq_file, policy=policy, **text2wfreq_kwargs)
+        await wfreq2vocab(wfreq_file, output_file, policy=policy, **wfreq2vocab_kwargs)
+    finally:
+        os.remove(wfreq_file)
+
+async def _tee(text, copy_f):
+    async for chunk in _acorpus_chunks(text):
+        copy_f.write(chunk)
+        yield chunk
+
+async def text2lm(text, output_file, vocab_file=None, text2idngram_kwargs={}, idngram2lm_kwargs={}, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, policy=None):
+    """
+        Coroutine version of cmuclmtk.text2lm. Like the blocking version, it reads the corpus only once.
+    """
+    temp_files = []
+    try:
+        if vocab_file:
+            used_vocab_file = vocab_file
+        else:
+            # Create temporary vocab file
+            used_vocab_file = _mktemp('.vocab')
+            temp_files.append(used_vocab_file)
+
+        if isinstance(text, (bytes, str)) or _is_path(text):
+            if not vocab_file:
+                await text2vocab(text, used_vocab_file, text2wfreq_kwargs, wfreq2vocab_kwargs, policy)
+        else:
+            # Spool the corpus to disk (while creating the vocabulary, if necessary)
+            corpus_file = _mktemp('.txt')
+            temp_files.append(corpus_file)
+            with open(corpus_file, 'wb') as copy_f:
+                if vocab_file:
+                    async for chunk in _acorpus_chunks(text):
+                        copy_f.write(chunk)
+                else:
+                    await text2vocab(_tee(text, copy_f), used_vocab_file, text2wfreq_kwargs, wfreq2vocab_kwargs, policy)
+            text = pathlib.Path(corpus_file)
+
+        # Create temporary idngram file
+        idngram_file = _mktemp('.idngram')
+        temp_files.append(idngram_file)
+
+        output1 = await text2idngram(text, vocab_file=used_vocab_file, output_file=idngram_file, policy=policy, **text2idngram_kwargs)
+        output2 = await idngram2lm(idngram_file, vocab_file=used_vocab_file, output_file=output_file, policy=policy, **idngram2lm_kwargs)
+    finally:
+        # Remove temporary files
+        for temp_file in temp_files:
+            os.remove(temp_file)
+    return (output1, output2)
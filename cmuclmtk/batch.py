@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Batch building of many language models at once.
+
+    Every build job gets a (rough) estimate of its peak memory footprint, derived from the memory parameters of the tools it runs. Jobs are then started on a pool of worker threads as long as they fit into a global memory and CPU budget, so that a large batch can run in parallel without exhausting the memory of the build host.
+"""
+
+import os
+import time
+import logging
+import multiprocessing
+import concurrent.futures
+
+from . import tuning, text2lm, _corpus_size, _in_process_counter
+
+MB = 1024 * 1024
+
+# Approximate number of bytes a single hash table slot and a single word record occupy in the CMUCLMTK tools
+HASH_ENTRY_SIZE = 32
+WORD_RECORD_SIZE = 40
+
+# Approximate number of bytes idngram2lm needs for every n-gram it holds, and average size of a word (including whitespace) in a corpus
+NGRAM_ENTRY_SIZE = 16
+AVG_WORD_SIZE = 6
+
+# Approximate number of bytes the in-process counter (see cmuclmtk.idngram.count_idngrams) needs for every word of a corpus
+IN_PROCESS_WORD_SIZE = 96
+
+def physical_memory():
+    """
+        Returns the size of the physical memory of this machine in bytes, or None if it can't be determined.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+class BuildJob(object):
+    """
+        A single language model build, i.e. the arguments of one text2lm call. Any additional keyword arguments (e.g. cache) are passed to text2lm as well.
+        If memory (in bytes) is given, it is used instead of the estimate.
+    """
+    def __init__(self, text, output_file, vocab_file=None, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, text2idngram_kwargs={}, idngram2lm_kwargs={}, workers=1, memory=None, **kwargs):
+        self.text = text
+        self.output_file = output_file
+        self.vocab_file = vocab_file
+        self.text2wfreq_kwargs = text2wfreq_kwargs
+        self.wfreq2vocab_kwargs = wfreq2vocab_kwargs
+        self.text2idngram_kwargs = text2idngram_kwargs
+        self.idngram2lm_kwargs = idngram2lm_kwargs
+        self.workers = workers
+        self.memory = memory
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return '<BuildJob %r>' % (self.output_file,)
+
+    def estimate_memory(self):
+        """
+            Returns the estimated peak memory footprint of this job in bytes. Stages run one after another, so this is the maximum over the stages:
+            text2wfreq allocates its hash table, wfreq2vocab its word records and every text2idngram process its n-gram buffer plus a hash table (or the in-process counter its copy of the corpus, if text2lm chooses it). idngram2lm holds all n-grams of all orders, which is estimated from the corpus size. With auto_tune, the tuned parameters are estimated from the corpus as text2lm does.
+            Only the size of strings and paths is known in advance. The corpus of a file object or an iterable of lines counts as empty, so pass memory for such jobs. Raises an OSError if the corpus file can't be read.
+        """
+        if self.memory is not None:
+            return self.memory
+
+        corpus_size = _corpus_size(self.text)
+        text2wfreq_kwargs = self.text2wfreq_kwargs
+        wfreq2vocab_kwargs = self.wfreq2vocab_kwargs
+        text2idngram_kwargs = self.text2idngram_kwargs
+        in_process = _in_process_counter(self.text, self.kwargs.get('in_process'), text2idngram_kwargs) is not None
+        if self.kwargs.get('auto_tune') and corpus_size is not None:
+            estimate = tuning.estimate_corpus(self.text)
+            text2wfreq_kwargs = dict(tuning.text2wfreq_parameters(estimate), **text2wfreq_kwargs)
+            wfreq2vocab_kwargs = dict(tuning.wfreq2vocab_parameters(estimate), **wfreq2vocab_kwargs)
+            vocab_size = tuning.count_vocab(self.vocab_file) if self.vocab_file else estimate.distinct_words
+            text2idngram_kwargs = dict(tuning.text2idngram_parameters(estimate, vocab_size, text2idngram_kwargs.get('n', 3), self.workers), **text2idngram_kwargs)
+        corpus_size = corpus_size or 0
+
+        stages = []
+        if not self.vocab_file:
+            stages.append(text2wfreq_kwargs.get('hashtablesize', 1000000) * HASH_ENTRY_SIZE)
+            stages.append(wfreq2vocab_kwargs.get('records', 1000000) * WORD_RECORD_SIZE)
+
+        if in_process:
+            stages.append(corpus_size // AVG_WORD_SIZE * IN_PROCESS_WORD_SIZE)
+        else:
+            text2idngram_memory = (text2idngram_kwargs.get('buffersize', 100) * MB +
+                                   text2idngram_kwargs.get('hashtablesize', 2000000) * HASH_ENTRY_SIZE)
+            stages.append(text2idngram_memory * max(1, self.workers))
+
+        n = self.idngram2lm_kwargs.get('n', 3)
+        stages.append(n * corpus_size // AVG_WORD_SIZE * NGRAM_ENTRY_SIZE)
+
+        return max(stages)
+
+    def estimate_cpus(self):
+        """
+            Returns the number of CPUs this job keeps busy at the same time: its text2idngram workers, plus one if pipe is True (as the tools connected by a pipe run concurrently), plus the normalize_workers (default: number of CPUs) that normalize the corpus while it is streamed to the tools, if a normalizer is given.
+        """
+        cpus = max(1, self.workers)
+        if self.kwargs.get('pipe') and hasattr(os, 'mkfifo'):
+            cpus += 1
+        if self.kwargs.get('normalizer') is not None:
+            cpus += max(1, self.kwargs.get('normalize_workers') or multiprocessing.cpu_count())
+        return cpus
+
+    def run(self):
+        return text2lm(self.text, self.output_file, vocab_file=self.vocab_file,
+                       text2idngram_kwargs=self.text2idngram_kwargs, idngram2lm_kwargs=self.idngram2lm_kwargs,
+                       text2wfreq_kwargs=self.text2wfreq_kwargs, wfreq2vocab_kwargs=self.wfreq2vocab_kwargs,
+                       workers=self.workers, **self.kwargs)
+
+class BuildResult(object):
+    """
+        Result of a BuildJob. If the build failed, error holds the exception that was raised and output is None.
+    """
+    def __init__(self, job, memory, output=None, error=None, duration=None):
+        self.job = job
+        self.memory = memory
+        self.output = output
+        self.error = error
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<BuildResult %r %s>' % (self.job.output_file, 'ok' if self.ok else 'failed: %s' % self.error)
+
+def _timed_run(job):
+    start = time.time()
+    output = job.run()
+    return output, time.time() - start
+
+def build_many(jobs, max_memory=None, max_cpus=None):
+    """
+        Builds all jobs (a list of BuildJob objects) and returns a list of BuildResult objects in the same order.
+        Jobs are started in order as long as the sum of their estimated memory footprints stays below max_memory (default: 80% of the physical memory) and the sum of their CPUs (see BuildJob.estimate_cpus) stays below max_cpus (default: number of CPUs). If a job doesn't fit, later jobs that do fit are started first. A job that doesn't even fit into an empty budget runs on its own.
+        A failing job doesn't abort the batch, its exception is stored in its BuildResult. This includes errors while estimating its memory (e.g. a missing corpus file); such jobs are not started at all.
+    """
+    logger = logging.getLogger(__name__)
+    if max_memory is None:
+        physical = physical_memory()
+        max_memory = int(physical * 0.8) if physical else float('inf')
+    if max_cpus is None:
+        max_cpus = multiprocessing.cpu_count()
+
+    pending = []
+    results = [None] * len(jobs)
+    for i, job in enumerate(jobs):
+        try:
+            memory = job.estimate_memory()
+        except Exception as e:
+            logger.error("Estimating the memory of %r failed: %s", job, e)
+            results[i] = BuildResult(job, None, error=e)
+        else:
+            pending.append((i, job, memory, job.estimate_cpus()))
+    running = {}
+    used_memory = 0
+    used_cpus = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_cpus) as executor:
+        while pending or running:
+            for item in list(pending):
+                i, job, memory, cpus = item
+                if running and (used_memory + memory > max_memory or used_cpus + cpus > max_cpus):
+                    continue
+                logger.debug("Starting %r (estimated memory: %d bytes, cpus: %d)", job, memory, cpus)
+                running[executor.submit(_timed_run, job)] = item
+                pending.remove(item)
+                used_memory += memory
+                used_cpus += cpus
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i, job, memory, cpus = running.pop(future)
+                used_memory -= memory
+                used_cpus -= cpus
+                try:
+                    output, duration = future.result()
+                except Exception as e:
+                    logger.error("Building %r failed: %s", job, e)
+                    results[i] = BuildResult(job, memory, error=e)
+                else:
+                    results[i] = BuildResult(job, memory, output=output, duration=duration)
+    return results
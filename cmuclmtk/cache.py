@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Content-addressed on-disk cache for the intermediate and final artifacts of language model builds (word frequencies, vocabularies, id n-grams and language models).
+
+    Artifacts are keyed on a hash of their input content plus the effective command line of the tool that produced them, so that e.g. changing only the idngram2lm parameters of a build reuses the cached vocabulary and id n-grams.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import logging
+
+def hash_bytes(data):
+    """
+        Returns the SHA-256 hex digest of data.
+    """
+    import hashlib
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path, blocksize=1024*1024):
+    """
+        Returns the SHA-256 hex digest of the content of a file.
+    """
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def default_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'cmuclmtk')
+
+class ArtifactCache(object):
+    """
+        On-disk artifact cache with size-bounded LRU eviction.
+        If max_size (in bytes) is given, the least recently used artifacts are removed whenever the cache grows beyond it. Hits, misses and evictions are counted and can be retrieved with stats().
+    """
+    def __init__(self, directory=None, max_size=None):
+        self.directory = os.path.abspath(directory or default_cache_dir())
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @staticmethod
+    def key(*parts):
+        """
+            Returns a cache key for the given parts, which may be strings or lists of strings (e.g. command lines).
+        """
+        import hashlib
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (list, tuple)):
+                part = ' '.join(part)
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, dest=None):
+        """
+            Copies the artifact stored under key to dest (if given). Returns the tool output that was stored alongside it, or None if the key is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            if dest is None:
+                os.stat(path)
+            else:
+                shutil.copyfile(path, dest)
+            with open(path + '.out', 'r') as f:
+                output = f.read()
+        except (IOError, OSError):
+            with self._lock:
+                self.misses += 1
+            logging.getLogger(__name__).debug("Cache miss for key '%s'", key)
+            return None
+
+        # Mark artifact as recently used
+        for p in (path, path + '.out'):
+            try:
+                os.utime(p, None)
+            except OSError:
+                pass
+        with self._lock:
+            self.hits += 1
+        logging.getLogger(__name__).debug("Cache hit for key '%s'", key)
+        return output
+
+    def output(self, key):
+        """
+            Returns the tool output stored under key, or None if the key is not in the cache. Unlike get(), this neither counts as a hit or miss nor marks the artifact as recently used.
+        """
+        try:
+            with open(self._path(key) + '.out', 'r') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def put(self, key, src, output=''):
+        """
+            Stores a copy of the file src (and the tool output that came with it) under key.
+        """
+        path = self._path(key)
+        # Copy to a temporary file first and rename it afterwards, so that concurrent readers never see partial artifacts
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp_path)
+            with open(tmp_path + '.out', 'w') as f:
+                f.write(output or '')
+            os.rename(tmp_path + '.out', path + '.out')
+            os.rename(tmp_path, path)
+        finally:
+            for p in (tmp_path, tmp_path + '.out'):
+                if os.path.exists(p):
+                    os.remove(p)
+        self.evict()
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory))
+
+    def evict(self):
+        """
+            Removes the least recently used artifacts until the cache fits into max_size.
+        """
+        if self.max_size is None:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp-') or name.endswith('.out'):
+                continue
+            path = self._path(name)
+            try:
+                st = os.stat(path)
+                size = st.st_size + os.path.getsize(path + '.out')
+            except OSError:
+                continue
+            entries.append((st.st_mtime, size, path))
+            total += size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            for p in (path, path + '.out'):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logging.getLogger(__name__).debug("Evicted '%s' from cache", path)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def clear(self):
+        shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
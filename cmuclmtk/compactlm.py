@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Compact, memory-mapped representation of ARPA language models (requires NumPy).
+
+    arpa2compact converts an ARPA model (as written by idngram2lm or binlm2arpa) into a directory of .npy arrays. CompactLM memory-maps that directory, so that loading is near-instant and the pages are shared between all processes using the same model.
+
+    The n-grams of each order k > 1 are stored as a sorted array of 64-bit keys, where the key of w1 ... wk is (index of w1 ... wk-1 among the (k-1)-grams) * vocabulary size + id of wk. Unigrams are indexed by word id directly. Lookups are binary searches on these keys. Probabilities and back-off weights of orders k > 1 can optionally be quantized to 8 or 16 bit codes.
+"""
+
+import os
+import json
+import shutil
+import logging
+
+import numpy as np
+
+from . import _mktemp, binlm2arpa
+from .evallm import is_arpa_file
+
+FORMAT_VERSION = 1
+
+UNK_WORDS = ('<UNK>', '<unk>')
+
+def _read_arpa(f):
+    """
+        Parses an ARPA file lazily. Yields the n-gram counts from the \\data\\ header first, followed by (order, fields) for every n-gram.
+    """
+    counts = {}
+    order = 0
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('\\'):
+            if line == '\\end\\':
+                break
+            if line.endswith('-grams:'):
+                if order == 0:
+                    yield counts
+                order = int(line[1:line.index('-')])
+        elif order > 0:
+            yield order, line.split()
+        elif line.startswith('ngram '):
+            n, count = line[6:].split('=')
+            counts[int(n)] = int(count)
+
+def _quantize(values, bits):
+    """
+        Returns (codes, codebook) for values, using the quantiles of values as codebook.
+    """
+    levels = 1 << bits
+    codebook = np.unique(np.quantile(values, np.linspace(0, 1, levels))).astype(np.float32)
+    midpoints = (codebook[1:] + codebook[:-1]) / 2
+    codes = np.searchsorted(midpoints, values).astype(np.uint8 if bits <= 8 else np.uint16)
+    return codes, codebook
+
+def _lookup(keys, prev_idx, word_ids, vocab_size):
+    """
+        Vectorized lookup of the n-grams (prev_idx, word_ids) in keys. Returns their indices, or -1 for n-grams that don't exist.
+    """
+    valid = (prev_idx >= 0) & (word_ids >= 0)
+    query = np.where(valid, prev_idx, 0).astype(np.uint64) * np.uint64(vocab_size) + np.where(valid, word_ids, 0).astype(np.uint64)
+    pos = np.searchsorted(keys, query)
+    found = valid & (pos < len(keys))
+    found[found] &= keys[pos[found]] == query[found]
+    return np.where(found, pos, -1)
+
+def _save(output_dir, name, array):
+    np.save(os.path.join(output_dir, name + '.npy'), array)
+
+def arpa2compact(lm_file, output_dir, quantize=None):
+    """
+        Converts a language model into the compact format, stored in output_dir. Binary models (as written by idngram2lm with arpa_output=False) are converted to ARPA with binlm2arpa first.
+        If quantize is 8 or 16, probabilities and back-off weights of orders above 1 are stored as codes of that many bits.
+        Memory usage is bounded by the size of the largest n-gram section plus the keys of the lower orders.
+    """
+    if not is_arpa_file(lm_file):
+        arpa_file = _mktemp('.arpa')
+        try:
+            binlm2arpa(lm_file, arpa_file)
+            return arpa2compact(arpa_file, output_dir, quantize)
+        finally:
+            os.remove(arpa_file)
+
+    if quantize not in (None, 8, 16):
+        raise ValueError("quantize must be None, 8 or 16")
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    logger = logging.getLogger(__name__)
+    vocab = []
+    word_ids = {}
+    keys = {}
+    converted = set()
+
+    def convert_section(order, prob, bow, ids, count):
+        if count != len(prob):
+            raise ValueError("Expected %d %d-grams, found %d" % (len(prob), order, count))
+        if order > 1:
+            # Find the index of each n-gram's prefix among the (order-1)-grams
+            prefix_idx = ids[:, 0]
+            for k in range(2, order):
+                prefix_idx = _lookup(keys[k], prefix_idx, ids[:, k-1], len(vocab))
+            if (prefix_idx < 0).any():
+                missing = ids[np.argmax(prefix_idx < 0)]
+                raise ValueError("Prefix of %d-gram '%s' is missing" % (order, ' '.join(vocab[w] for w in missing)))
+            order_keys = prefix_idx.astype(np.uint64) * np.uint64(len(vocab)) + ids[:, -1].astype(np.uint64)
+            perm = np.argsort(order_keys, kind='stable')
+            _save(output_dir, '%d.keys' % order, order_keys[perm])
+            keys[order] = np.load(os.path.join(output_dir, '%d.keys.npy' % order), mmap_mode='r')
+            prob = prob[perm]
+            bow = bow[perm]
+
+        arrays = [('prob', prob)]
+        if order < max_order:
+            arrays.append(('bow', bow))
+        for name, values in arrays:
+            if quantize and order > 1 and len(values):
+                codes, codebook = _quantize(values, quantize)
+                _save(output_dir, '%d.%s.codes' % (order, name), codes)
+                _save(output_dir, '%d.%s.codebook' % (order, name), codebook)
+            else:
+                _save(output_dir, '%d.%s' % (order, name), values)
+        converted.add(order)
+
+    with open(lm_file, 'r', encoding='utf-8') as f:
+        entries = _read_arpa(f)
+        counts = next(entries, {})
+        if not counts:
+            raise ValueError("'%s' is not an ARPA file" % lm_file)
+        max_order = max(counts)
+
+        def new_section(order):
+            count = counts.get(order, 0)
+            return [order, np.empty(count, dtype=np.float32), np.zeros(count, dtype=np.float32), np.empty((count, order), dtype=np.int64), 0]
+
+        def convert_empty_sections(below):
+            # Orders without n-grams (e.g. 'ngram 3=0') have no section in the file, but still need their (empty) arrays
+            for order in range(1, below):
+                if order not in converted:
+                    convert_section(*new_section(order))
+
+        section = None
+        for order, fields in entries:
+            if section is None or section[0] != order:
+                if section is not None:
+                    convert_section(*section)
+                convert_empty_sections(order)
+                logger.debug("Converting %d %d-grams", counts.get(order, 0), order)
+                section = new_section(order)
+            _, prob, bow, ids, i = section
+            if i >= len(prob):
+                raise ValueError("Expected %d %d-grams, found more" % (len(prob), order))
+            words = fields[1:order+1]
+            prob[i] = float(fields[0])
+            if len(fields) > order + 1:
+                bow[i] = float(fields[order+1])
+            if order == 1:
+                word_ids[words[0]] = i
+                vocab.append(words[0])
+                ids[i, 0] = i
+            else:
+                try:
+                    ids[i] = [word_ids[word] for word in words]
+                except KeyError as e:
+                    raise ValueError("%d-gram '%s' contains unknown word %s" % (order, ' '.join(words), e))
+            section[4] += 1
+        if section is not None:
+            convert_section(*section)
+        convert_empty_sections(max_order + 1)
+
+    with open(os.path.join(output_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        for word in vocab:
+            f.write(word + '\n')
+    with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': FORMAT_VERSION, 'order': max_order, 'counts': counts, 'quantize': quantize}, f)
+
+class CompactLM(object):
+    """
+        Memory-mapped language model in the format written by arpa2compact.
+        Log probabilities are base 10, like in ARPA files. Words that are not in the vocabulary are mapped to <UNK> (if the model has it), otherwise their log probability is -inf.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != FORMAT_VERSION:
+            raise ValueError("Unsupported compact LM format version '%s'" % meta['version'])
+        self.order = meta['order']
+        with open(os.path.join(path, 'vocab.txt'), encoding='utf-8') as f:
+            self.vocab = f.read().split('\n')[:-1]
+        self.word_ids = dict((word, i) for i, word in enumerate(self.vocab))
+        self.unk_id = next((self.word_ids[w] for w in UNK_WORDS if w in self.word_ids), -1)
+
+        self._keys = {}
+        self._prob = {}
+        self._bow = {}
+        for order in range(1, self.order + 1):
+            if order > 1:
+                self._keys[order] = self._load('%d.keys' % order)
+            self._prob[order] = self._load_values('%d.prob' % order)
+            if order < self.order:
+                self._bow[order] = self._load_values('%d.bow' % order)
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+
+    def _load_values(self, name):
+        if os.path.exists(os.path.join(self.path, name + '.codes.npy')):
+            return _Quantized(self._load(name + '.codes'), self._load(name + '.codebook'))
+        return self._load(name)
+
+    def word_id(self, word):
+        return self.word_ids.get(word, self.unk_id)
+
+    def _logprobs(self, queries):
+        """
+            Computes log10 P(w | context) for every row of queries, an (M, order) array of word ids holding the context (right-aligned and padded with -1) followed by w.
+        """
+        rows, n = queries.shape
+        vocab_size = len(self.vocab)
+        result = np.full(rows, -np.inf)
+        done = np.zeros(rows, dtype=bool)
+        backoff = np.zeros(rows)
+        for k in range(n, 0, -1):
+            ngram = queries[:, n-k:]
+            idx = ngram[:, 0]
+            context_idx = idx
+            for c in range(1, k):
+                if c == k - 1:
+                    context_idx = idx
+                idx = _lookup(self._keys[c+1], idx, ngram[:, c], vocab_size)
+
+            found = (idx >= 0) & ~done
+            result[found] = self._prob[k][idx[found]] + backoff[found]
+            done |= found
+            if k > 1:
+                # Not found, so back off from the context of this n-gram
+                has_context = (context_idx >= 0) & ~done
+                backoff[has_context] += self._bow[k-1][context_idx[has_context]]
+        return result
+
+    def logprob(self, context, word):
+        """
+            Returns log10 P(word | context), where context is a sequence of words. Only the last order-1 words of the context are used.
+        """
+        ids = [self.word_id(w) for w in list(context)[-(self.order-1):]] if self.order > 1 else []
+        query = np.full((1, self.order), -1, dtype=np.int64)
+        query[0, self.order-1-len(ids):self.order-1] = ids
+        query[0, -1] = self.word_id(word)
+        return float(self._logprobs(query)[0])
+
+    def score_sentences(self, sentences, bos='<s>'):
+        """
+            Returns an array with the total log10 probability of each sentence. Sentences can be strings (which are split at whitespace) or sequences of words. A leading bos token is used as context only.
+        """
+        sentences = list(sentences)
+        queries = []
+        sentence_idx = []
+        for i, sentence in enumerate(sentences):
+            words = sentence.split() if isinstance(sentence, str) else list(sentence)
+            ids = [self.word_id(w) for w in words]
+            for j in range(1 if words and words[0] == bos else 0, len(ids)):
+                context = ids[max(0, j-self.order+1):j]
+                queries.append([-1] * (self.order - 1 - len(context)) + context + [ids[j]])
+                sentence_idx.append(i)
+        totals = np.zeros(len(sentences))
+        if queries:
+            logprobs = self._logprobs(np.array(queries, dtype=np.int64))
+            np.add.at(totals, np.array(sentence_idx), logprobs)
+        return totals
+
+class _Quantized(object):
+    """
+        Array-like view of quantized values, which decodes codes using the codebook on indexing.
+    """
+    def __init__(self, codes, codebook):
+        self.codes = codes
+        self.codebook = codebook
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        return self.codebook[self.codes[idx]]
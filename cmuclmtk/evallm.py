@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Wrapper for the interactive CMUCLMTK tool evallm.
+
+    Loading a large language model takes evallm a long time, so EvalLM starts the tool once and keeps it running, sending it one command per request. EvalLMPool distributes requests across several such workers.
+"""
+
+import os
+import re
+import pty
+import tty
+import queue
+import shutil
+import threading
+import subprocess
+import logging
+import multiprocessing
+import concurrent.futures
+
+from . import ConversionError, _is_path, _corpus_chunks, _mktemp
+from .toolchain import get_toolchain
+
+PROMPT = b'evallm : '
+
+_PERPLEXITY_RE = re.compile(r'Perplexity = (\S+), Entropy = (\S+) bits')
+_WORDS_RE = re.compile(r'Computation based on (\d+) words')
+_OOVS_RE = re.compile(r'(\d+) OOVs \((\S+)%\) and (\d+) context cues')
+
+def _has_whitespace(path):
+    return any(c.isspace() for c in path)
+
+def is_arpa_file(lm_file):
+    """
+        Returns True if lm_file looks like an ARPA format language model (as opposed to a binary one).
+    """
+    with open(lm_file, 'rb') as f:
+        return b'\\data\\' in f.read(64 * 1024)
+
+class PerplexityResult(object):
+    """
+        Result of evallm's perplexity command.
+    """
+    def __init__(self, perplexity, entropy, words, oovs=0, context_cues=0):
+        self.perplexity = perplexity
+        self.entropy = entropy
+        self.words = words
+        self.oovs = oovs
+        self.context_cues = context_cues
+
+    @property
+    def logprob(self):
+        """
+            Total log10 probability of the evaluated words.
+        """
+        return -self.words * self.entropy * 0.30102999566398120
+
+    def __repr__(self):
+        return '<PerplexityResult perplexity=%s words=%d oovs=%d>' % (self.perplexity, self.words, self.oovs)
+
+    @classmethod
+    def parse(cls, output):
+        match = _PERPLEXITY_RE.search(output)
+        if not match:
+            raise ConversionError("Unexpected evallm output: %r" % output)
+        words = _WORDS_RE.search(output)
+        oovs = _OOVS_RE.search(output)
+        return cls(float(match.group(1)), float(match.group(2)),
+                   int(words.group(1)) if words else 0,
+                   int(oovs.group(1)) if oovs else 0,
+                   int(oovs.group(3)) if oovs else 0)
+
+class EvalLM(object):
+    """
+        Long-lived evallm process for a binary or ARPA language model as produced by idngram2lm. The format is detected automatically unless arpa is given.
+        EvalLM objects can be used by several threads, but commands are processed one at a time. Use them as context managers or call close() to shut down evallm.
+    """
+    def __init__(self, lm_file, context_file=None, arpa=None):
+        if arpa is None:
+            arpa = is_arpa_file(lm_file)
+        cmd = ['evallm', '-arpa' if arpa else '-binary', os.path.abspath(lm_file)]
+        if context_file:
+            cmd.extend(['-context', os.path.abspath(context_file)])
+        self.cmd = cmd
+
+        # evallm doesn't flush its prompt when talking to a pipe, so it gets a pseudo terminal (in raw mode, i.e. without echo and newline translation)
+        self._fd, slave_fd = pty.openpty()
+        tty.setraw(slave_fd)
+        try:
+            self._proc = subprocess.Popen(get_toolchain().command(cmd), stdin=slave_fd, stdout=slave_fd, stderr=subprocess.PIPE, close_fds=True)
+        except Exception:
+            os.close(self._fd)
+            raise
+        finally:
+            os.close(slave_fd)
+
+        self._stderr_thread = threading.Thread(target=self._log_stderr)
+        self._stderr_thread.daemon = True
+        self._stderr_thread.start()
+
+        self._lock = threading.Lock()
+        self._buffer = b''
+        try:
+            with self._lock:
+                self._read_until_prompt()
+        except Exception:
+            self.close()
+            raise
+
+    def _log_stderr(self):
+        logger = logging.getLogger(__name__)
+        for line in iter(self._proc.stderr.readline, b''):
+            message = line.decode('utf-8', 'replace').strip()
+            if message:
+                logger.debug(message)
+
+    def _read_until_prompt(self):
+        while PROMPT not in self._buffer:
+            try:
+                chunk = os.read(self._fd, 4096)
+            except OSError:
+                # Linux raises EIO once the child has closed the terminal
+                chunk = b''
+            if not chunk:
+                raise ConversionError("evallm exited unexpectedly with exit status '%s'" % self._proc.wait())
+            self._buffer += chunk
+        output, self._buffer = self._buffer.split(PROMPT, 1)
+        return output.decode('utf-8', 'replace')
+
+    def command(self, command):
+        """
+            Sends a command to evallm and returns its output.
+        """
+        with self._lock:
+            if self._proc.poll() is not None:
+                raise ConversionError("evallm is not running")
+            logging.getLogger(__name__).debug("Sending '%s' to evallm", command)
+            os.write(self._fd, command.encode('utf-8') + b'\n')
+            return self._read_until_prompt()
+
+    def perplexity(self, text, probs_file=None, oovs_file=None):
+        """
+            Computes the perplexity of the language model with respect to text and returns a PerplexityResult. The text can be a path (e.g. a pathlib.Path), a string, an open file object or an iterable of lines.
+            If probs_file is given, evallm writes the probability of every word to it; if oovs_file is given, the out-of-vocabulary words are written to it.
+        """
+        if _is_path(text):
+            path = os.path.abspath(os.fspath(text))
+            if not _has_whitespace(path):
+                return self._perplexity(path, probs_file, oovs_file)
+            # evallm splits its commands on whitespace, so the text is read from a copy
+            with open(path, 'rb') as f:
+                return self.perplexity(f, probs_file, oovs_file)
+
+        text_file = _mktemp('.txt')
+        try:
+            with open(text_file, 'wb') as f:
+                for chunk in _corpus_chunks(text):
+                    f.write(chunk)
+            return self._perplexity(text_file, probs_file, oovs_file)
+        finally:
+            os.remove(text_file)
+
+    def _perplexity(self, text_file, probs_file, oovs_file):
+        command = 'perplexity -text %s' % text_file
+        moves = []
+        try:
+            for option, path in (('-probs', probs_file), ('-oovs', oovs_file)):
+                if path:
+                    path = os.path.abspath(path)
+                    if _has_whitespace(path):
+                        # Written to a temporary file that is moved into place afterwards
+                        moves.append((_mktemp(option.replace('-', '.')), path))
+                        path = moves[-1][0]
+                    command += ' %s %s' % (option, path)
+            result = PerplexityResult.parse(self.command(command))
+            for temp_file, path in moves:
+                shutil.move(temp_file, path)
+        finally:
+            for temp_file, path in moves:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+        return result
+
+    def perplexities(self, texts):
+        """
+            Computes the perplexity of every text (e.g. every sentence) in texts and returns a list of PerplexityResults.
+        """
+        return [self.perplexity(text) for text in texts]
+
+    def close(self):
+        if self._proc.poll() is None:
+            try:
+                os.write(self._fd, b'quit\n')
+                self._proc.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+                self._proc.wait()
+        self._stderr_thread.join()
+        self._proc.stderr.close()
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+class EvalLMPool(object):
+    """
+        Pool of EvalLM workers for the same language model, which evaluate texts in parallel. The number of workers defaults to the number of CPUs. Additional keyword arguments are passed to EvalLM.
+    """
+    def __init__(self, lm_file, workers=None, **kwargs):
+        workers = workers or multiprocessing.cpu_count()
+        self._workers = []
+        try:
+            for _ in range(workers):
+                self._workers.append(EvalLM(lm_file, **kwargs))
+        except Exception:
+            self.close()
+            raise
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def _perplexity(self, text, **kwargs):
+        worker = self._idle.get()
+        try:
+            return worker.perplexity(text, **kwargs)
+        finally:
+            self._idle.put(worker)
+
+    def perplexity(self, text, **kwargs):
+        """
+            Like EvalLM.perplexity, using the next idle worker.
+        """
+        return self._perplexity(text, **kwargs)
+
+    def perplexities(self, texts):
+        """
+            Evaluates all texts in parallel and returns a list of PerplexityResults in the same order.
+        """
+        return list(self._executor.map(self._perplexity, texts))
+
+    def close(self):
+        if hasattr(self, '_executor'):
+            self._executor.shutdown()
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
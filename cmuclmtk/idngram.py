@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Direct access to id n-gram files (requires NumPy).
+
+    Binary id n-gram files, as written by text2idngram and wngram2idngram and read by idngram2lm, idngram2stats and mergeidngram, are a sequence of records of n word ids followed by a count. The toolkit writes them in big-endian byte order with 4-byte ids and counts; both can be changed for toolkits built differently.
+    Binary files are exposed as zero-copy numpy.memmap structured arrays with the fields 'ids' (shape (n,)) and 'count'. ASCII files (write_ascii=True) are parsed in chunks.
+    count_idngrams is an in-process replacement for text2idngram. It holds the whole corpus in memory, but saves the cost of starting the tool and allocating its buffers, which dominates for small corpora.
+"""
+
+import os
+
+import numpy as np
+
+from . import _corpus_chunks, _is_path
+
+# Number of n-grams per chunk when iterating over id n-gram files
+CHUNKSIZE = 1024 * 1024
+
+def idngram_dtype(n=3, id_size=4, byteorder='>'):
+    """
+        Returns the NumPy dtype of a single record of a binary id n-gram file.
+    """
+    return np.dtype([('ids', '%su%d' % (byteorder, id_size), (n,)), ('count', '%si4' % byteorder)])
+
+def open_idngram(path, n=3, mode='r', id_size=4, byteorder='>'):
+    """
+        Memory-maps a binary id n-gram file and returns it as structured array. Use mode='r+' to modify counts in place.
+    """
+    dtype = idngram_dtype(n, id_size, byteorder)
+    size = os.path.getsize(path)
+    if size % dtype.itemsize:
+        raise ValueError("Size of '%s' is not a multiple of the %d-gram record size %d" % (path, n, dtype.itemsize))
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode)
+
+def _iter_ascii_idngram(path, n, chunksize, dtype):
+    with open(path, 'r') as f:
+        while True:
+            lines = [line for _, line in zip(range(chunksize), f)]
+            if not lines:
+                break
+            values = np.array(' '.join(lines).split(), dtype=np.int64).reshape(-1, n + 1)
+            chunk = np.empty(len(values), dtype=dtype)
+            chunk['ids'] = values[:, :n]
+            chunk['count'] = values[:, n]
+            yield chunk
+
+def iter_idngram(path, n=3, chunksize=CHUNKSIZE, ascii_input=False, min_count=None, max_count=None, id_size=4, byteorder='>'):
+    """
+        Iterates over an id n-gram file in chunks of (at most) chunksize n-grams, each being a structured array like the one returned by open_idngram. Chunks of binary files are views into the memory-mapped file.
+        If min_count or max_count are given, only n-grams whose count lies within these bounds are yielded.
+    """
+    dtype = idngram_dtype(n, id_size, byteorder)
+    if ascii_input:
+        chunks = _iter_ascii_idngram(path, n, chunksize, dtype)
+    else:
+        ngrams = open_idngram(path, n, id_size=id_size, byteorder=byteorder)
+        chunks = (ngrams[i:i+chunksize] for i in range(0, len(ngrams), chunksize))
+
+    for chunk in chunks:
+        if min_count is not None or max_count is not None:
+            mask = np.ones(len(chunk), dtype=bool)
+            if min_count is not None:
+                mask &= chunk['count'] >= min_count
+            if max_count is not None:
+                mask &= chunk['count'] <= max_count
+            chunk = chunk[mask]
+        if len(chunk):
+            yield chunk
+
+def write_idngram(path, ngrams, n=3, ascii_output=False, id_size=4, byteorder='>'):
+    """
+        Writes n-grams to an id n-gram file in the format the CMUCLMTK tools read. ngrams is either a structured array (see open_idngram) or an iterable of such chunks. The n-grams have to be sorted by ids already, like the tools produce them.
+    """
+    dtype = idngram_dtype(n, id_size, byteorder)
+    if isinstance(ngrams, np.ndarray):
+        ngrams = [ngrams]
+    with open(path, 'w' if ascii_output else 'wb') as f:
+        for chunk in ngrams:
+            if ascii_output:
+                values = np.column_stack([chunk['ids'].astype(np.int64), chunk['count'].astype(np.int64)])
+                np.savetxt(f, values, fmt='%d')
+            else:
+                out = np.empty(len(chunk), dtype=dtype)
+                out['ids'] = chunk['ids']
+                out['count'] = chunk['count']
+                # Not tofile(), which fails on pipes
+                f.write(out.tobytes())
+
+def filter_idngram(input_file, output_file, n=3, min_count=None, max_count=None, ascii_input=False, ascii_output=False):
+    """
+        Copies the n-grams of input_file whose count lies within min_count and max_count to output_file, e.g. to prune rare n-grams. Returns the number of n-grams written.
+    """
+    written = [0]
+
+    def chunks():
+        for chunk in iter_idngram(input_file, n, ascii_input=ascii_input, min_count=min_count, max_count=max_count):
+            written[0] += len(chunk)
+            yield chunk
+    write_idngram(output_file, chunks(), n, ascii_output=ascii_output)
+    return written[0]
+
+def count_of_counts(path, n=3, max_count=10, ascii_input=False):
+    """
+        Returns the frequency of frequencies of the n-grams in an id n-gram file (like idngram2stats does for the highest order) as array, where element i is the number of n-grams occurring exactly i times. Counts above max_count are ignored.
+    """
+    fof = np.zeros(max_count + 1, dtype=np.int64)
+    for chunk in iter_idngram(path, n, ascii_input=ascii_input, max_count=max_count):
+        fof += np.bincount(chunk['count'].astype(np.int64), minlength=max_count + 1)
+    return fof
+
+def read_vocab_ids(vocab_file):
+    """
+        Returns a dict mapping the words (as bytes) of a vocabulary file to their ids, as text2idngram assigns them: 1, 2, ... in the order of the file, skipping ## comments. Id 0 is reserved for out-of-vocabulary words.
+    """
+    ids = {}
+    with open(vocab_file, 'rb') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith(b'##'):
+                ids.setdefault(word, len(ids) + 1)
+    return ids
+
+def _unique_ngrams(ids, n, vocab_size):
+    """
+        Returns the distinct n-grams of the id sequence, sorted by ids, and their counts.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(ids, n)
+    bits = max(1, int(vocab_size).bit_length())
+    if bits * n > 64:
+        return np.unique(windows, axis=0, return_counts=True)
+
+    # Pack each n-gram into a single 64-bit key, the first id in the highest bits, so that keys sort like the n-grams
+    keys = np.zeros(len(windows), dtype=np.uint64)
+    for i in range(n):
+        keys <<= np.uint64(bits)
+        keys |= windows[:, i]
+    keys, counts = np.unique(keys, return_counts=True)
+    ngrams = np.empty((len(keys), n), dtype=np.uint64)
+    mask = np.uint64((1 << bits) - 1)
+    for i in range(n - 1, -1, -1):
+        ngrams[:, i] = keys & mask
+        keys >>= np.uint64(bits)
+    return ngrams, counts
+
+def _fof_report(ngrams, counts, n, fof_size):
+    """
+        Returns the frequency of frequencies of the 2-grams, ..., n-grams (the prefixes of the sorted n-grams) and the resulting suggestions for idngram2lm's spec_num, laid out like text2idngram reports them.
+    """
+    lines = []
+    for k in range(2, n + 1):
+        if k < n and len(counts):
+            starts = np.flatnonzero(np.concatenate([[True], np.any(ngrams[1:, :k] != ngrams[:-1, :k], axis=1)]))
+            kcounts = np.add.reduceat(counts, starts)
+        else:
+            kcounts = counts
+        fof = np.bincount(kcounts, minlength=fof_size + 1)
+        remaining = len(kcounts)
+        lines.append('%d-grams occurring:\tN times\t\t> N times\tSug. -spec_num value' % k)
+        lines.append('%7d\t\t\t\t%7d\t\t%7d' % (0, remaining, int(remaining * 1.01) + 10))
+        for j in range(1, fof_size + 1):
+            remaining -= fof[j]
+            lines.append('%7d\t\t%7d\t\t%7d\t\t%7d' % (j, fof[j], remaining, int(remaining * 1.01) + 10))
+        lines.append('')
+    return '\n'.join(lines)
+
+def count_idngrams(text, vocab_file, output_file, n=3, write_ascii=False, fof_size=10):
+    """
+        Counts the id n-grams of a text and writes them to output_file, like text2idngram with the same vocabulary, n and write_ascii does. The text can be given in any form text2idngram accepts; it is read into memory as a whole, so this is meant for small corpora.
+        Returns the frequency of frequencies of the n-grams for up to fof_size occurrences (none if 0), with the suggested spec_num values, as text2idngram reports them.
+    """
+    if _is_path(text):
+        with open(text, 'rb') as f:
+            words = f.read().split()
+    else:
+        words = b''.join(_corpus_chunks(text)).split()
+
+    vocab = read_vocab_ids(vocab_file)
+    ids = np.fromiter((vocab.get(word, 0) for word in words), dtype=np.uint64, count=len(words))
+    if len(ids) >= n:
+        ngrams, counts = _unique_ngrams(ids, n, len(vocab))
+    else:
+        ngrams, counts = np.zeros((0, n), dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    out = np.empty(len(counts), dtype=idngram_dtype(n))
+    out['ids'] = ngrams
+    out['count'] = counts
+    write_idngram(output_file, out, n, ascii_output=write_ascii)
+    return _fof_report(ngrams, counts, n, fof_size) if fof_size else ''
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Incremental language model builds.
+
+    An IncrementalLM keeps the word frequencies, the vocabulary and the id n-grams of all text it has seen in a directory. When new text arrives, only that text is counted (with text2idngram, against the unchanged vocabulary) and merged into the retained id n-grams with mergeidngram, so that just idngram2lm has to be rerun. If the new text changes the vocabulary, all id n-grams have to be recounted, so the model is rebuilt from all corpora instead.
+"""
+
+import os
+import json
+import shutil
+import pathlib
+import logging
+import concurrent.futures
+
+from . import _is_path, _propagate, _corpus_chunks, _mktemp, text2wfreq, wfreq2vocab, text2idngram, mergeidngram, idngram2lm
+from .cache import hash_file
+
+def _read_vocab(vocab_file):
+    with open(vocab_file, 'rb') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith(b'##')]
+
+def merge_wfreq(wfreq_files, output_file):
+    """
+        Merges the word frequency files (as written by text2wfreq) in wfreq_files into output_file, adding up the counts of words occurring in several files. All but the first file are held in memory, so the largest file should come first.
+    """
+    counts = {}
+    for wfreq_file in wfreq_files[1:]:
+        with open(wfreq_file, 'rb') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 2:
+                    counts[fields[0]] = counts.get(fields[0], 0) + int(fields[1])
+
+    with open(output_file, 'wb') as out_f:
+        if wfreq_files:
+            with open(wfreq_files[0], 'rb') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        out_f.write(b'%s %d\n' % (fields[0], int(fields[1]) + counts.pop(fields[0], 0)))
+        for word, count in counts.items():
+            out_f.write(b'%s %d\n' % (word, count))
+
+class IncrementalLM(object):
+    """
+        Language model that can be updated with new text without recounting the whole corpus. All state is kept in directory, so an IncrementalLM can be reopened later with the same arguments.
+        If vocab_file is given, the vocabulary is fixed and updates never need a full rebuild; otherwise it is derived from the word frequencies of all text with wfreq2vocab_kwargs. The kwargs dicts are passed to the tools like in cmuclmtk.text2lm.
+        Corpora given as paths are referenced, not copied, and must not change as long as they are part of the model (they are read again on a full rebuild). Other text is stored in directory.
+    """
+    def __init__(self, directory, n=3, vocab_file=None, text2wfreq_kwargs={}, wfreq2vocab_kwargs={}, text2idngram_kwargs={}, idngram2lm_kwargs={}, workers=1):
+        self.directory = os.path.abspath(directory)
+        self.n = n
+        self.fixed_vocab_file = vocab_file and os.path.abspath(vocab_file)
+        self.text2wfreq_kwargs = text2wfreq_kwargs
+        self.wfreq2vocab_kwargs = wfreq2vocab_kwargs
+        self.text2idngram_kwargs = dict(text2idngram_kwargs, n=n, write_ascii=False)
+        self.idngram2lm_kwargs = dict(idngram2lm_kwargs, n=n, ascii_input=False)
+        self.workers = workers
+
+        self.lm_file = self._path('lm')
+        self.vocab_file = self._path('vocab')
+        self.wfreq_file = self._path('wfreq')
+        self.idngram_file = self._path('idngram')
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        try:
+            with open(self._path('meta.json')) as f:
+                self.meta = json.load(f)
+        except (IOError, OSError):
+            self.meta = {'corpora': [], 'vocab_settings': None, 'next_id': 0}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _vocab_settings(self):
+        """
+            Everything the vocabulary and the id n-grams depend on, apart from the text.
+        """
+        if self.fixed_vocab_file:
+            vocab = hash_file(self.fixed_vocab_file)
+        else:
+            vocab = sorted(self.wfreq2vocab_kwargs.items())
+        return json.loads(json.dumps({'n': self.n, 'vocab': vocab}))
+
+    def _save_meta(self):
+        temp_file = self._path('meta.json.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump(self.meta, f)
+        os.rename(temp_file, self._path('meta.json'))
+
+    def _store(self, text):
+        """
+            Returns the path of the corpus text, which is spooled into the directory unless it is a path already.
+        """
+        if _is_path(text):
+            return os.path.abspath(os.fspath(text))
+        corpus_file = self._path('corpus-%d.txt' % self.meta['next_id'])
+        self.meta['next_id'] += 1
+        try:
+            with open(corpus_file, 'wb') as f:
+                for chunk in _corpus_chunks(text):
+                    f.write(chunk)
+        except BaseException:
+            os.remove(corpus_file)
+            raise
+        return corpus_file
+
+    def _discard(self, text, corpus_file):
+        """
+            Removes corpus_file if _store spooled it into the directory, i.e. unless text is a path.
+        """
+        if not _is_path(text) and os.path.exists(corpus_file):
+            os.remove(corpus_file)
+
+    def _count(self, corpus_files, vocab_file, output_file):
+        """
+            Counts the id n-grams of every corpus file separately (using up to self.workers threads) and merges them into output_file.
+        """
+        idngram_files = [_mktemp('.idngram') for _ in corpus_files]
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+                futures = [executor.submit(_propagate(text2idngram), pathlib.Path(corpus_file), vocab_file, idngram_file, **self.text2idngram_kwargs)
+                           for corpus_file, idngram_file in zip(corpus_files, idngram_files)]
+                for future in futures:
+                    future.result()
+            if len(idngram_files) == 1:
+                shutil.move(idngram_files[0], output_file)
+            else:
+                mergeidngram(output_file, idngram_files, n=self.n)
+        finally:
+            for idngram_file in idngram_files:
+                if os.path.exists(idngram_file):
+                    os.remove(idngram_file)
+
+    def _build_lm(self):
+        temp_file = self._path('lm.tmp')
+        output = idngram2lm(self.idngram_file, self.vocab_file, temp_file, **self.idngram2lm_kwargs)
+        os.rename(temp_file, self.lm_file)
+        return output
+
+    def build(self, text):
+        """
+            Builds the language model from scratch, discarding all text seen before.
+        """
+        self.meta = {'corpora': [], 'vocab_settings': None, 'next_id': self.meta['next_id']}
+        corpus_file = self._store(text)
+        try:
+            text2wfreq(pathlib.Path(corpus_file), self.wfreq_file, **self.text2wfreq_kwargs)
+            self.meta['corpora'] = [corpus_file]
+        finally:
+            if not self.meta['corpora']:
+                self._discard(text, corpus_file)
+        self._rebuild()
+
+    def _rebuild(self):
+        logging.getLogger(__name__).info("Rebuilding language model in '%s' from %d corpora", self.directory, len(self.meta['corpora']))
+        if self.fixed_vocab_file:
+            shutil.copyfile(self.fixed_vocab_file, self.vocab_file)
+        else:
+            wfreq2vocab(self.wfreq_file, self.vocab_file, **self.wfreq2vocab_kwargs)
+        self._count(self.meta['corpora'], self.vocab_file, self.idngram_file)
+        self._build_lm()
+        self.meta['vocab_settings'] = self._vocab_settings()
+        self._save_meta()
+
+    def needs_rebuild(self, wfreq_file=None):
+        """
+            Returns True if the vocabulary would change, i.e. if the retained id n-grams can't be reused. If wfreq_file is given, the vocabulary is derived from it instead of the current word frequencies.
+        """
+        if not self.meta['corpora'] or self.meta['vocab_settings'] != self._vocab_settings():
+            return True
+        if self.fixed_vocab_file:
+            return False
+        vocab_file = _mktemp('.vocab')
+        try:
+            wfreq2vocab(wfreq_file or self.wfreq_file, vocab_file, **self.wfreq2vocab_kwargs)
+            return _read_vocab(vocab_file) != _read_vocab(self.vocab_file)
+        finally:
+            os.remove(vocab_file)
+
+    def update(self, text, allow_rebuild=True):
+        """
+            Adds text to the language model. Returns True if the model was updated incrementally and False if it had to be rebuilt from all corpora, because the vocabulary changed.
+            If allow_rebuild is False, the vocabulary is kept as it is in that case (new words are mapped to <UNK>) until the next rebuild.
+        """
+        if not self.meta['corpora']:
+            self.build(text)
+            return False
+
+        corpus_file = self._store(text)
+        wfreq_file = _mktemp('.wfreq')
+        merged_wfreq_file = self._path('wfreq.tmp')
+        try:
+            text2wfreq(pathlib.Path(corpus_file), wfreq_file, **self.text2wfreq_kwargs)
+            merge_wfreq([self.wfreq_file, wfreq_file], merged_wfreq_file)
+            rebuild = allow_rebuild and self.needs_rebuild(merged_wfreq_file)
+            if not rebuild:
+                idngram_file = _mktemp('.idngram')
+                merged_idngram_file = self._path('idngram.tmp')
+                try:
+                    self._count([corpus_file], self.vocab_file, idngram_file)
+                    mergeidngram(merged_idngram_file, [self.idngram_file, idngram_file], n=self.n)
+                finally:
+                    os.remove(idngram_file)
+                os.rename(merged_idngram_file, self.idngram_file)
+            os.rename(merged_wfreq_file, self.wfreq_file)
+            self.meta['corpora'].append(corpus_file)
+        finally:
+            os.remove(wfreq_file)
+            if os.path.exists(merged_wfreq_file):
+                os.remove(merged_wfreq_file)
+            if corpus_file not in self.meta['corpora']:
+                self._discard(text, corpus_file)
+
+        if rebuild:
+            # Make sure an interrupted rebuild is redone by the next update
+            self.meta['vocab_settings'] = None
+            self._save_meta()
+            self._rebuild()
+        else:
+            logging.getLogger(__name__).info("Updating language model in '%s' incrementally", self.directory)
+            self._save_meta()
+            self._build_lm()
+        return not rebuild
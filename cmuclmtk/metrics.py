@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Performance metrics of the CMUCLMTK tools and of the pipelines built from them.
+
+    Every tool run by the wrappers produces a StageMetrics record with its command line, wall time, CPU time (as reported by os.wait4) and peak memory (sampled while it runs, see MemoryMonitor), the number of bytes read and written and the peak disk usage of its scratch directory. Pipelines (text2vocab, text2lm, sharded_text2idngram) produce a record of their own, which sums up the records of their tools.
+    Records are passed to every hook registered with add_hook(), e.g.:
+
+        with cmuclmtk.metrics.collect() as records:
+            cmuclmtk.text2lm(pathlib.Path('corpus.txt'), 'corpus.lm')
+        for record in records:
+            print(record.as_dict())
+"""
+
+import os
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+
+FIELDS = ('stage', 'cmd', 'exitcode', 'wall_time', 'user_time', 'sys_time', 'max_rss', 'bytes_in', 'bytes_out', 'temp_disk', 'tools')
+
+# Interval (in seconds) in which the scratch directory of a running tool is measured
+TEMP_DISK_INTERVAL = 0.5
+
+# Interval (in seconds) in which the peak memory of a running tool is sampled
+MEMORY_INTERVAL = 0.05
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_local = threading.local()
+
+class StageMetrics(object):
+    """
+        Metrics of a single tool run or pipeline. Times are in seconds, sizes in bytes. Fields that couldn't be measured (e.g. the resource usage on platforms without os.wait4, or the peak memory on platforms without /proc) are None.
+        For pipelines, cmd is None, tools is the number of tool runs, CPU times and byte counts are summed up over all tools and max_rss and temp_disk are the maximum over all tools.
+    """
+    def __init__(self, stage, cmd=None):
+        self.stage = stage
+        self.cmd = cmd
+        self.exitcode = None
+        self.wall_time = None
+        self.user_time = None
+        self.sys_time = None
+        self.max_rss = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.temp_disk = None
+        self.tools = 0
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in FIELDS)
+
+    def __repr__(self):
+        return '<StageMetrics %s wall_time=%.3f>' % (self.stage, self.wall_time or 0)
+
+    def set_rusage(self, rusage):
+        # ru_maxrss isn't used: a child inherits the peak memory of the Python process it was forked from, see MemoryMonitor
+        self.user_time = rusage.ru_utime
+        self.sys_time = rusage.ru_stime
+
+    def add(self, record):
+        """
+            Adds the metrics of a tool run to this pipeline record.
+        """
+        self.tools += 1
+        self.bytes_in += record.bytes_in
+        self.bytes_out += record.bytes_out
+        for field in ('user_time', 'sys_time'):
+            if getattr(record, field) is not None:
+                setattr(self, field, (getattr(self, field) or 0) + getattr(record, field))
+        for field in ('max_rss', 'temp_disk'):
+            if getattr(record, field) is not None:
+                setattr(self, field, max(getattr(self, field) or 0, getattr(record, field)))
+
+def add_hook(hook):
+    """
+        Registers a callable that is called with every StageMetrics record. Hooks are called in the thread that ran the stage and must not raise.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+def remove_hook(hook):
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+def enabled():
+    """
+        Returns True if anybody is interested in metrics, i.e. if any hooks are registered.
+    """
+    return bool(_hooks)
+
+def log_hook(record):
+    """
+        Hook that logs every record at INFO level.
+    """
+    logging.getLogger(__name__).info("%s: %s", record.stage, ', '.join('%s=%s' % (field, getattr(record, field)) for field in FIELDS[2:]))
+
+@contextmanager
+def collect():
+    """
+        Collects all records emitted while the context is active (in any thread) in a list.
+    """
+    records = []
+    add_hook(records.append)
+    try:
+        yield records
+    finally:
+        remove_hook(records.append)
+
+def _pipelines():
+    if not hasattr(_local, 'pipelines'):
+        _local.pipelines = []
+    return _local.pipelines
+
+def emit(record):
+    """
+        Adds the record of a tool run to the running pipelines of this thread and passes it to all hooks.
+    """
+    if record.cmd is not None:
+        for pipeline in _pipelines():
+            pipeline.add(record)
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(record)
+        except Exception:
+            logging.getLogger(__name__).exception("Metrics hook %r failed", hook)
+
+@contextmanager
+def pipeline(name):
+    """
+        Measures a pipeline, i.e. all tools run in this thread (or in functions wrapped with propagate) while the context is active, and emits its record at the end.
+    """
+    record = StageMetrics(name)
+    pipelines = _pipelines()
+    pipelines.append(record)
+    start = time.time()
+    try:
+        yield record
+        record.exitcode = 0
+    finally:
+        record.wall_time = time.time() - start
+        pipelines.remove(record)
+        emit(record)
+
+def propagate(func):
+    """
+        Returns a function that runs func as part of the pipelines running in the calling thread. Use it for functions that are handed to worker threads.
+    """
+    pipelines = list(_pipelines())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        own = _pipelines()
+        own.extend(pipelines)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for record in pipelines:
+                own.remove(record)
+    return wrapper
+
+def disk_usage(path):
+    """
+        Returns the total size of all files below path.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                # Temporary files may vanish while we walk
+                pass
+    return total
+
+class DiskMonitor(object):
+    """
+        Measures the peak disk usage of a directory in a background thread, until stop() is called.
+    """
+    def __init__(self, path, interval=TEMP_DISK_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, disk_usage(self.path))
+            if self._stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.peak
+
+def peak_rss(pid):
+    """
+        Returns the peak resident set size (VmHWM) of a running process in bytes, or None if it can't be read (on platforms without /proc, or once the process has exited).
+    """
+    try:
+        with open('/proc/%d/status' % pid, 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+class MemoryMonitor(object):
+    """
+        Samples the peak resident set size of a running process in a background thread, until stop() is called.
+        VmHWM starts over when a process execs, so unlike the ru_maxrss of os.wait4 (which includes the peak of the Python process the tool was forked from) it covers the tool only. The last sample is kept, so a peak the tool reaches less than interval seconds before it exits is missed, and tools that exit before the first sample aren't measured at all.
+    """
+    def __init__(self, pid, interval=MEMORY_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            rss = peak_rss(self.pid)
+            if rss is not None:
+                self.peak = rss
+            if self._stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.peak
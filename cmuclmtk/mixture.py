@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Tuning the weights of linearly interpolated language models on held-out text (requires NumPy).
+
+    The probability of every held-out word under every model is computed by evallm (with one process per model, in parallel), then the weights are estimated with the EM algorithm, like the interpolate tool does, but with vectorized NumPy updates. The probability streams can be kept in an ArtifactCache, so that tuning again (e.g. after adding a model) only evaluates the models that are new.
+"""
+
+import os
+import logging
+import pathlib
+import concurrent.futures
+
+import numpy as np
+
+from . import _is_path, _corpus_chunks, _mktemp, ConversionError
+from .cache import hash_file
+from .evallm import EvalLM
+
+# Floor for interpolated probabilities, so that words none of the models can predict don't make the perplexity infinite
+MIN_PROB = 1e-99
+
+class MixtureResult(object):
+    """
+        Weights of the models (in the order they were given) and the perplexity of the mixture on the held-out text.
+    """
+    def __init__(self, weights, perplexity, iterations, words):
+        self.weights = weights
+        self.perplexity = perplexity
+        self.iterations = iterations
+        self.words = words
+
+    def __repr__(self):
+        return '<MixtureResult weights=[%s] perplexity=%s>' % (', '.join('%.4f' % w for w in self.weights), self.perplexity)
+
+def read_probs(probs_file):
+    """
+        Reads a probability stream (one probability per line, as written by evallm -probs) into a NumPy array.
+    """
+    with open(probs_file, 'rb') as f:
+        return np.array(f.read().split(), dtype=np.float64)
+
+def word_probs(lm_file, text, probs_file, context_file=None, cache=None):
+    """
+        Writes the probability of every word of text (a path, a string, an open file object or an iterable of lines) under the language model to probs_file.
+        If a cache (see cmuclmtk.cache.ArtifactCache) is given, the stream is looked up in and stored to it, keyed on the hashes of the model, the context cues and text, which has to be a path in that case.
+    """
+    if cache is not None:
+        key = cache.key('evallm -probs', hash_file(lm_file), hash_file(context_file) if context_file else '', hash_file(os.fspath(text)))
+        if cache.get(key, probs_file) is not None:
+            return
+    with EvalLM(lm_file, context_file) as evallm:
+        result = evallm.perplexity(text, probs_file=probs_file)
+    logging.getLogger(__name__).info("Perplexity of '%s': %s (%d words)", lm_file, result.perplexity, result.words)
+    if cache is not None:
+        cache.put(key, probs_file)
+
+def em_weights(probs, weights=None, stop_ratio=0.999, max_iterations=1000):
+    """
+        Estimates the interpolation weights for a matrix of probabilities (one row per model, one column per word) with the EM algorithm, starting from weights (default: all equal). Stops when an iteration improves the perplexity by a factor smaller than stop_ratio, like interpolate does.
+        Returns the weights, the perplexity of the mixture and the number of iterations.
+    """
+    models = probs.shape[0]
+    weights = np.full(models, 1.0 / models) if weights is None else np.asarray(weights, dtype=np.float64)
+    perplexity = None
+    for iteration in range(1, max_iterations + 1):
+        weighted = weights[:, np.newaxis] * probs
+        mixture = np.maximum(weighted.sum(axis=0), MIN_PROB)
+        new_perplexity = float(np.exp(-np.mean(np.log(mixture))))
+        logging.getLogger(__name__).debug("Iteration %d: perplexity %s, weights %s", iteration, new_perplexity, weights)
+        if perplexity is not None and new_perplexity / perplexity > stop_ratio:
+            return weights, new_perplexity, iteration
+        perplexity = new_perplexity
+        # The new weight of a model is its average share of the mixture probability
+        weights = (weighted / mixture).mean(axis=1)
+    return weights, perplexity, max_iterations
+
+def estimate_weights(lm_files, text, context_file=None, weights=None, stop_ratio=0.999, max_iterations=1000, workers=None, cache=None):
+    """
+        Computes the probabilities of the held-out text (a path, a string, an open file object or an iterable of lines) under each of the language models, with up to workers evallm processes at once (default: one per model), and returns a MixtureResult with the interpolation weights that minimize the perplexity of the mixture.
+        The models have to share their vocabulary, so that they assign probabilities to the same words. See word_probs for the cache and em_weights for the other parameters.
+    """
+    lm_files = list(lm_files)
+    if not lm_files:
+        raise ValueError("estimate_weights needs at least one language model")
+    temp_files = []
+    try:
+        if not _is_path(text):
+            text_file = _mktemp('.txt')
+            temp_files.append(text_file)
+            with open(text_file, 'wb') as f:
+                for chunk in _corpus_chunks(text):
+                    f.write(chunk)
+            text = pathlib.Path(text_file)
+
+        probs_files = [_mktemp('.fprobs') for _ in lm_files]
+        temp_files.extend(probs_files)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers or len(lm_files)) as executor:
+            futures = [executor.submit(word_probs, lm_file, text, probs_file, context_file, cache)
+                       for lm_file, probs_file in zip(lm_files, probs_files)]
+            for future in futures:
+                future.result()
+
+        streams = [read_probs(probs_file) for probs_file in probs_files]
+    finally:
+        for temp_file in temp_files:
+            os.remove(temp_file)
+
+    if not len(streams[0]):
+        raise ConversionError("No words to evaluate the models on")
+    if len(set(len(stream) for stream in streams)) > 1:
+        raise ConversionError("The models assigned probabilities to different numbers of words (%s), they have to share their vocabulary" % ', '.join('%d' % len(stream) for stream in streams))
+
+    weights, perplexity, iterations = em_weights(np.vstack(streams), weights, stop_ratio, max_iterations)
+    logging.getLogger(__name__).info("Mixture weights after %d iterations: %s, perplexity %s", iterations, ', '.join('%.4f' % w for w in weights), perplexity)
+    return MixtureResult(weights.tolist(), perplexity, iterations, len(streams[0]))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Text normalization ahead of counting: case folding, tokenization, sentence markers and context cues.
+
+    normalize() runs a Normalizer over chunks of lines in a pool of processes and yields the normalized corpus in its original order, so it can be passed as text to any of the wrappers (or to text2lm with the normalizer argument) and is streamed to the tools while it is being produced.
+"""
+
+import os
+import re
+import collections
+import multiprocessing
+
+SENTENCE_START = '<s>'
+SENTENCE_END = '</s>'
+
+# Words, including inner apostrophes ("don't") and digits
+WORD_PATTERN = r"\w+(?:'\w+)*"
+
+# Number of lines normalized by a worker at once
+CHUNK_LINES = 10000
+
+class Normalizer(object):
+    """
+        Normalizes lines of text. Every line (or, with sentence_pattern, every part of a line between matches of that regular expression) is a sentence.
+        case_fold lowercases all tokens (with str.casefold). Tokens are the matches of token_pattern, which by default drops all punctuation, or the whitespace separated words of a sentence if token_pattern is None. Words in context_cues (e.g. '<p>' for paragraph breaks) are kept as they are. If sentence_markers is True, every sentence is wrapped in <s> and </s> (unless it already is) and empty sentences are dropped.
+        Normalizers are pickled to be sent to the worker processes, so subclasses overriding normalize_sentence must be defined at module level.
+    """
+    def __init__(self, case_fold=True, token_pattern=WORD_PATTERN, sentence_pattern=None, sentence_markers=True, context_cues=()):
+        self.case_fold = case_fold
+        self.token_pattern = re.compile(token_pattern, re.UNICODE) if token_pattern else None
+        self.sentence_pattern = re.compile(sentence_pattern, re.UNICODE) if sentence_pattern else None
+        self.sentence_markers = sentence_markers
+        self.context_cues = frozenset(context_cues) | (frozenset([SENTENCE_START, SENTENCE_END]) if sentence_markers else frozenset())
+
+    def tokenize(self, sentence):
+        """
+            Returns the normalized tokens of a sentence.
+        """
+        tokens = []
+        for word in sentence.split():
+            if word in self.context_cues:
+                tokens.append(word)
+                continue
+            if self.case_fold:
+                word = word.casefold()
+            if self.token_pattern:
+                tokens.extend(self.token_pattern.findall(word))
+            else:
+                tokens.append(word)
+        return tokens
+
+    def normalize_sentence(self, sentence):
+        """
+            Returns a normalized sentence, or None if nothing is left of it.
+        """
+        tokens = self.tokenize(sentence)
+        if self.sentence_markers:
+            if tokens and tokens[0] == SENTENCE_START:
+                tokens.pop(0)
+            if tokens and tokens[-1] == SENTENCE_END:
+                tokens.pop()
+            if not tokens:
+                return None
+            tokens = [SENTENCE_START] + tokens + [SENTENCE_END]
+        return ' '.join(tokens) if tokens else None
+
+    def normalize_line(self, line):
+        """
+            Returns the normalized sentences of a line of text.
+        """
+        sentences = self.sentence_pattern.split(line) if self.sentence_pattern else [line]
+        return [sentence for sentence in (self.normalize_sentence(s) for s in sentences) if sentence is not None]
+
+    def normalize_lines(self, lines):
+        """
+            Normalizes a list of lines and returns the result as UTF-8 encoded bytes, one sentence per line.
+        """
+        sentences = []
+        for line in lines:
+            sentences.extend(self.normalize_line(line.decode('utf-8') if isinstance(line, bytes) else line))
+        return ''.join(sentence + '\n' for sentence in sentences).encode('utf-8')
+
+    def write_context_cues(self, path):
+        """
+            Writes the context cues to a file, which can be passed to idngram2lm as context_file.
+        """
+        with open(path, 'w') as f:
+            for cue in sorted(self.context_cues):
+                f.write(cue + '\n')
+
+def _lines(text):
+    """
+        Yields the lines of a corpus given as a string, a path, an open file object or an iterable of lines.
+    """
+    if isinstance(text, (bytes, str)):
+        for line in (text.decode('utf-8') if isinstance(text, bytes) else text).splitlines():
+            yield line
+    elif hasattr(text, '__fspath__'):
+        with open(os.fspath(text), encoding='utf-8') as f:
+            for line in f:
+                yield line
+    else:
+        for line in text:
+            yield line
+
+def _chunks(text, chunk_lines):
+    chunk = []
+    for line in _lines(text):
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+_worker_normalizer = None
+
+def _pool_context():
+    # Forking a process that runs other threads (as the wrappers do) can deadlock the child, so the workers are started from a clean process
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def _init_worker(normalizer):
+    global _worker_normalizer
+    _worker_normalizer = normalizer
+
+def _normalize_chunk(lines):
+    return _worker_normalizer.normalize_lines(lines)
+
+def normalize(text, normalizer=None, workers=None, chunk_lines=CHUNK_LINES):
+    """
+        Normalizes a corpus (a string, a path, an open file object or an iterable of lines) with normalizer (default: Normalizer()) in workers processes (default: the number of CPUs) and yields the result as chunks of UTF-8 encoded lines, in the order of the input.
+        At most two chunks per worker are in flight at a time, so the corpus is never held in memory as a whole. The workers are started with the forkserver (or spawn) method, which is safe in threaded programs, so normalizer has to be picklable and the main module importable (not read from stdin).
+    """
+    normalizer = normalizer or Normalizer()
+    workers = workers or multiprocessing.cpu_count()
+    if workers <= 1:
+        for chunk in _chunks(text, chunk_lines):
+            data = normalizer.normalize_lines(chunk)
+            if data:
+                yield data
+        return
+
+    with _pool_context().Pool(workers, initializer=_init_worker, initargs=(normalizer,)) as pool:
+        pending = collections.deque()
+        for chunk in _chunks(text, chunk_lines):
+            pending.append(pool.apply_async(_normalize_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                data = pending.popleft().get()
+                if data:
+                    yield data
+        while pending:
+            data = pending.popleft().get()
+            if data:
+                yield data
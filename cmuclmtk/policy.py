@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Execution policies: resource limits, priority and CPU affinity for the CMUCLMTK tools.
+
+    Every wrapper takes a policy argument. Resource limits, niceness and CPU affinity are set by a small Python shim that then replaces itself with the tool (running code between fork and exec, via preexec_fn, isn't safe in the threaded programs the wrappers are used in), so they only ever affect the tool, never the Python process. Tools run in a session of their own, so that when one is killed (once its timeout has passed, or because the wrapper was interrupted or cancelled) any processes it started are killed along with it.
+    A tool that breaches a limit is killed (by the timeout, or by the kernel for the file size limit) or fails to allocate memory, and the wrapper raises a LimitExceededError instead of a plain ConversionError.
+"""
+
+import os
+import re
+import sys
+import signal
+import logging
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TIMEOUT = 'timeout'
+MEMORY = 'memory'
+FILE_SIZE = 'file_size'
+
+# Seconds to wait for the stderr of a killed tool to be closed by processes that escaped the kill
+STDERR_GRACE = 5
+
+# Messages of the tools (and the C library) when an allocation fails. Must not match progress messages like "Allocating memory for the n-gram buffer..."
+_ALLOCATION_FAILED_RE = re.compile(r"cannot allocate memory|can't allocate|out of memory|alloc\w* failed|failed to allocate|MemoryError|bad_alloc", re.IGNORECASE)
+
+# strerror(EFBIG), for tools that ignore SIGXFSZ and check their writes
+_FILE_TOO_LARGE_RE = re.compile(r'file too large', re.IGNORECASE)
+
+# Signals that a tool which ran out of address space typically dies of
+_MEMORY_SIGNALS = tuple(getattr(signal, name) for name in ('SIGSEGV', 'SIGBUS', 'SIGABRT') if hasattr(signal, name))
+
+# Run as "python -S -c _SHIM memory_limit file_size_limit nice cpus tool args...", with empty strings for unset values.
+# Python ignores SIGPIPE and SIGXFSZ, and ignored signals stay ignored across exec, so they are reset for the tool.
+_SHIM = """
+import os, sys, signal
+memory_limit, file_size_limit, nice, cpus = sys.argv[1:5]
+if memory_limit or file_size_limit:
+    import resource
+    for limit, value in ((resource.RLIMIT_AS, memory_limit), (resource.RLIMIT_FSIZE, file_size_limit)):
+        if value:
+            soft, hard = resource.getrlimit(limit)
+            value = int(value) if hard == resource.RLIM_INFINITY else min(int(value), hard)
+            resource.setrlimit(limit, (value, hard))
+if nice:
+    os.nice(int(nice))
+if cpus:
+    os.sched_setaffinity(0, [int(cpu) for cpu in cpus.split(',')])
+for name in ('SIGPIPE', 'SIGXFSZ'):
+    if hasattr(signal, name):
+        signal.signal(getattr(signal, name), signal.SIG_DFL)
+os.execv(sys.argv[5], sys.argv[5:])
+"""
+
+class ExecutionPolicy(object):
+    """
+        Limits for running a tool: timeout (wall-clock seconds), memory_limit (bytes of address space, RLIMIT_AS), file_size_limit (bytes per file written, RLIMIT_FSIZE), nice (increment of the niceness) and cpus (the CPUs the tool may run on, e.g. range(4)).
+        CPU affinity is ignored (with a warning) where os.sched_setaffinity is not available.
+    """
+    def __init__(self, timeout=None, memory_limit=None, file_size_limit=None, nice=None, cpus=None):
+        if (memory_limit or file_size_limit) and resource is None:
+            raise ValueError("Resource limits are not supported on this platform")
+        if cpus is not None and not hasattr(os, 'sched_setaffinity'):
+            logging.getLogger(__name__).warning("CPU affinity is not supported on this platform, ignoring cpus")
+            cpus = None
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.file_size_limit = file_size_limit
+        self.nice = nice
+        self.cpus = frozenset(cpus) if cpus is not None else None
+
+    def __repr__(self):
+        return '<ExecutionPolicy %s>' % ' '.join('%s=%s' % (name, getattr(self, name)) for name in ('timeout', 'memory_limit', 'file_size_limit', 'nice', 'cpus') if getattr(self, name) is not None)
+
+    def command(self, cmd):
+        """
+            Returns the command line that runs cmd (starting with the absolute path of the tool) with the limits, niceness and CPU affinity of the policy.
+        """
+        if not (self.memory_limit or self.file_size_limit or self.nice or self.cpus is not None):
+            return list(cmd)
+        settings = [self.memory_limit, self.file_size_limit, self.nice, ','.join(str(cpu) for cpu in sorted(self.cpus)) if self.cpus is not None else None]
+        return [sys.executable, '-S', '-c', _SHIM] + [str(value) if value else '' for value in settings] + list(cmd)
+
+    def popen_kwargs(self):
+        """
+            Returns the keyword arguments for subprocess.Popen (or asyncio.create_subprocess_exec) the command has to be run with.
+        """
+        # A session of its own, so that kill() reaches the processes the tool starts as well
+        if hasattr(os, 'killpg'):
+            return {'start_new_session': True}
+        return {}
+
+    def kill(self, proc):
+        """
+            Kills proc and every process in its session (see popen_kwargs). The pid is signalled directly: Popen.kill() polls first, which might reap the child behind the back of os.wait4.
+        """
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(proc.pid, signal.SIGKILL)
+            elif hasattr(signal, 'SIGKILL'):
+                os.kill(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except OSError:
+            # Gone already
+            pass
+
+    def watch(self, proc):
+        """
+            Kills proc (see kill) once the timeout has passed. Returns a Deadline, which has to be cancelled after proc has exited.
+        """
+        return Deadline(proc, self.timeout, self.kill)
+
+    def breach(self, exitcode, timed_out, stderr_lines):
+        """
+            Returns the limit (TIMEOUT, MEMORY or FILE_SIZE) a tool that failed with exitcode most likely breached, or None. A breach of the memory limit can only be guessed from the tool's last lines on stderr or from the signal it died of, a breach of the file size limit likewise.
+        """
+        if timed_out:
+            return TIMEOUT
+        if self.file_size_limit and ((hasattr(signal, 'SIGXFSZ') and exitcode == -signal.SIGXFSZ) or any(_FILE_TOO_LARGE_RE.search(line) for line in stderr_lines)):
+            return FILE_SIZE
+        if self.memory_limit and (-exitcode in _MEMORY_SIGNALS or any(_ALLOCATION_FAILED_RE.search(line) for line in stderr_lines)):
+            return MEMORY
+        return None
+
+class Deadline(object):
+    """
+        Calls kill(proc) after timeout seconds (if timeout is not None), unless cancelled before.
+    """
+    def __init__(self, proc, timeout, kill):
+        self.expired = False
+        self._proc = proc
+        self._kill = kill
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self):
+        self.expired = True
+        self._kill(self._proc)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Live progress of the CMUCLMTK tools.
+
+    The tools report their progress on stderr: text2idngram and idngram2lm print a dot for every 20,000 n-grams they have read, text2idngram announces every temporary file it writes and the final merge, idngram2lm the discounting and back-off phases. The wrappers read stderr while a tool is running and turn it into ProgressEvents, which are passed to all listeners:
+
+        def show(event):
+            if event.kind == progress.NGRAMS:
+                print('%s: %d n-grams' % (event.tool, event.value))
+
+        with progress.listen(show):
+            cmuclmtk.text2lm(pathlib.Path('corpus.txt'), 'corpus.lm')
+
+    Alternatively, iter_events() runs a function in the background and yields its events.
+"""
+
+import re
+import os
+import queue
+import logging
+import collections
+import threading
+import functools
+from contextlib import contextmanager
+
+# Event kinds
+NGRAMS = 'ngrams'            # value: number of n-grams read so far
+SORTING = 'sorting'
+TEMP_FILE = 'temp_file'      # value: number of temporary files written so far, message: file name
+MERGING = 'merging'          # value: number of temporary files being merged
+DISCOUNTING = 'discounting'
+BACKOFF = 'backoff'
+WRITING = 'writing'
+DONE = 'done'
+MESSAGE = 'message'          # any other line, message: the line
+
+# Number of n-grams per progress dot, unless the tool says otherwise
+NGRAMS_PER_DOT = 20000
+
+# Longest partial line that is kept while waiting for its end
+MAX_LINE_LENGTH = 64 * 1024
+
+# Number of lines kept in ProgressParser.last_lines
+LAST_LINES = 20
+
+_PER_DOT_RE = re.compile(r'([\d,]+) n-grams processed for each "\."')
+_PHASES = [(re.compile(pattern, re.IGNORECASE), kind) for pattern, kind in (
+    (r'^Sorting n-grams', SORTING),
+    (r'^Writing sorted n-grams to temporary file (\S+)', TEMP_FILE),
+    (r'^Merging (\d+) temporary files', MERGING),
+    (r'^Calculating discounted counts', DISCOUNTING),
+    (r'^Calculating back-off weights', BACKOFF),
+    (r'^Writing out language model', WRITING),
+    (r'^\S+ : Done\.', DONE),
+)]
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_local = threading.local()
+
+class ProgressEvent(object):
+    """
+        A single progress report of a tool. kind is one of the event kinds defined in this module, value and message depend on the kind.
+    """
+    def __init__(self, tool, kind, value=None, message=None, cmd=None):
+        self.tool = tool
+        self.kind = kind
+        self.value = value
+        self.message = message
+        self.cmd = cmd
+
+    def __repr__(self):
+        return '<ProgressEvent %s %s value=%r>' % (self.tool, self.kind, self.value)
+
+def add_listener(listener):
+    """
+        Registers a callable that is called with the ProgressEvents of all tools, in the thread that reads the tool's stderr. Listeners must return quickly and must not raise.
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+def remove_listener(listener):
+    with _listeners_lock:
+        _listeners.remove(listener)
+
+def _local_listeners():
+    if not hasattr(_local, 'listeners'):
+        _local.listeners = []
+    return _local.listeners
+
+@contextmanager
+def listen(listener):
+    """
+        Passes the ProgressEvents of the tools run by this thread (or by functions wrapped with propagate) to listener while the context is active.
+    """
+    listeners = _local_listeners()
+    listeners.append(listener)
+    try:
+        yield
+    finally:
+        listeners.remove(listener)
+
+def propagate(func):
+    """
+        Returns a function that reports the progress of its tools to the listeners of the calling thread. Use it for functions that are handed to worker threads.
+    """
+    listeners = list(_local_listeners())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        own = _local_listeners()
+        own.extend(listeners)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for listener in listeners:
+                own.remove(listener)
+    return wrapper
+
+def current_listeners():
+    """
+        Returns the listeners interested in the tools run by this thread.
+    """
+    with _listeners_lock:
+        return list(_listeners) + list(_local_listeners())
+
+def iter_events(func, *args, **kwargs):
+    """
+        Calls func(*args, **kwargs) in a background thread and yields the ProgressEvents of its tools as they happen. Exceptions raised by func are re-raised, its return value is the value of the StopIteration ending the iteration.
+    """
+    events = queue.Queue()
+    result = {}
+    finished = object()
+
+    def run():
+        try:
+            with listen(events.put):
+                result['value'] = func(*args, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+        finally:
+            events.put(finished)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    while True:
+        event = events.get()
+        if event is finished:
+            break
+        yield event
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+class ProgressParser(object):
+    """
+        Turns the stderr output of a tool, fed in arbitrary chunks, into ProgressEvents. Every complete line is logged at DEBUG level. Progress dots are reported as soon as they arrive, without waiting for the end of the line.
+    """
+    def __init__(self, cmd, listeners):
+        self.cmd = cmd
+        self.tool = cmd[0]
+        self.listeners = listeners
+        self.ngrams_per_dot = NGRAMS_PER_DOT
+        self.ngrams = 0
+        self.temp_files = 0
+        self._partial = b''
+        self._partial_dots = 0
+        # The last lines of output (without progress dots), e.g. to tell why a tool failed
+        self.last_lines = collections.deque(maxlen=LAST_LINES)
+
+    def _emit(self, kind, value=None, message=None):
+        event = ProgressEvent(self.tool, kind, value, message, self.cmd)
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception:
+                logging.getLogger(__name__).exception("Progress listener %r failed", listener)
+
+    def _dots(self, count):
+        if count > 0:
+            self.ngrams += count * self.ngrams_per_dot
+            self._emit(NGRAMS, self.ngrams)
+
+    def feed(self, data):
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+        if self._partial.strip(b'.') == b'':
+            # Progress dots, possibly followed by more on the same line
+            self._dots(len(self._partial) - self._partial_dots)
+            self._partial_dots = len(self._partial)
+        elif len(self._partial) > MAX_LINE_LENGTH:
+            self._line(self._partial)
+            self._partial = b''
+
+    def close(self):
+        if self._partial:
+            self._line(self._partial)
+            self._partial = b''
+
+    def _line(self, line):
+        line = line.decode('utf-8', 'replace').strip()
+        dots = self._partial_dots
+        self._partial_dots = 0
+        if not line:
+            return
+        logging.getLogger(__name__).debug(line)
+        if not line.strip('.'):
+            self._dots(len(line) - dots)
+            return
+        self.last_lines.append(line)
+
+        if not self.listeners:
+            return
+        match = _PER_DOT_RE.search(line)
+        if match:
+            self.ngrams_per_dot = int(match.group(1).replace(',', ''))
+            return
+        for pattern, kind in _PHASES:
+            match = pattern.search(line)
+            if match:
+                if kind == TEMP_FILE:
+                    self.temp_files += 1
+                    self._emit(kind, self.temp_files, match.group(1))
+                elif kind == MERGING:
+                    self._emit(kind, int(match.group(1)), line)
+                else:
+                    self._emit(kind, message=line)
+                return
+        self._emit(MESSAGE, message=line)
+
+class StderrReader(object):
+    """
+        Pipe for the stderr of a tool, which is read and parsed by a background thread while the tool is running. Pass fileno() as stderr to the child and call close() once it has exited.
+    """
+    def __init__(self, cmd):
+        self.parser = ProgressParser(cmd, current_listeners())
+        self._read_fd, self._write_fd = os.pipe()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def fileno(self):
+        return self._write_fd
+
+    def _run(self):
+        try:
+            while True:
+                data = os.read(self._read_fd, 4096)
+                if not data:
+                    break
+                self.parser.feed(data)
+            self.parser.close()
+        finally:
+            os.close(self._read_fd)
+
+    def close(self, timeout=None):
+        """
+            Closes the write end of the pipe and waits until everything the tool wrote has been parsed, or for at most timeout seconds: processes the tool started may still hold the pipe open after it has exited.
+        """
+        if self._write_fd is not None:
+            os.close(self._write_fd)
+            self._write_fd = None
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logging.getLogger(__name__).warning("Gave up reading the stderr of '%s', which is still held open", self.parser.tool)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
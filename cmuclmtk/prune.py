@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Relative entropy (Stolcke) pruning of ARPA language models.
+
+    Every n-gram of order 2 and above is scored by how much removing it would increase the perplexity of the model, taking into account that its probability would then be computed by backing off and that the back-off weight of its context changes. N-grams whose removal changes the perplexity by less than a threshold are pruned, and the back-off weights of all contexts are recomputed so that the pruned model is normalized again. See A. Stolcke, "Entropy-based Pruning of Backoff Language Models", 1998.
+
+    Only the lower order sections are held in memory. The highest order section, which is usually by far the largest, is streamed from the input file a few times and the n-grams that are kept are spooled to a temporary file.
+"""
+
+import os
+import math
+import shutil
+import logging
+import tempfile
+
+from . import _mktemp, binlm2arpa
+from .evallm import is_arpa_file
+
+SENTENCE_START = '<s>'
+
+# Histogram of the perplexity changes used to find the threshold for a target size: log10 bins from 1e-20 to 100
+HISTOGRAM_MIN = -20
+HISTOGRAM_MAX = 2
+HISTOGRAM_BINS_PER_DECADE = 100
+
+def _scan(f):
+    """
+        Reads the \\data\\ header of an ARPA file opened in binary mode and returns the n-gram counts and the byte offsets at which the n-grams of each order start.
+    """
+    counts = {}
+    offsets = {}
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        line = line.strip()
+        if line.startswith(b'ngram '):
+            n, count = line[6:].split(b'=')
+            counts[int(n)] = int(count)
+        elif line.startswith(b'\\') and line.endswith(b'-grams:'):
+            offsets[int(line[1:line.index(b'-')])] = f.tell()
+        elif line == b'\\end\\':
+            break
+    if not counts:
+        raise ValueError("File is not an ARPA language model")
+    return counts, offsets
+
+def _iter_section(f, offset, order):
+    """
+        Yields (log10 prob, n-gram, log10 back-off weight or None, raw prob) for the n-grams of a section.
+    """
+    f.seek(offset)
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(b'\\'):
+            break
+        fields = line.decode('utf-8').split()
+        bow = float(fields[order + 1]) if len(fields) > order + 1 else None
+        yield float(fields[0]), tuple(fields[1:order+1]), bow, fields[0]
+
+class _Model(object):
+    """
+        The lower order n-grams of a model of the given order (i.e. all but the highest order) with their log10 probabilities and back-off weights.
+    """
+    def __init__(self, order):
+        self.order = order
+        self.probs = dict((k, {}) for k in range(1, order))
+        self.raw_probs = dict((k, {}) for k in range(1, order))
+        self.bows = dict((k, {}) for k in range(1, order))
+
+    def logprob(self, ngram):
+        """
+            Returns log10 P(w | h) for ngram = h + (w,), backing off as necessary, or None if w is unknown. ngram may be at most order - 1 words long.
+        """
+        backoff = 0.0
+        for start in range(len(ngram)):
+            suffix = ngram[start:]
+            prob = self.probs[len(suffix)].get(suffix)
+            if prob is not None:
+                return backoff + prob
+            if len(suffix) > 1:
+                backoff += self.bows[len(suffix) - 1].get(suffix[:-1], 0.0)
+        return None
+
+    def history_logprob(self, history, cache):
+        """
+            Returns log10 P(history), computed with the chain rule. A leading sentence start marker has probability 1.
+        """
+        if history in cache:
+            return cache[history]
+        total = 0.0
+        start = 1 if history and history[0] == SENTENCE_START else 0
+        for i in range(start, len(history)):
+            prob = self.logprob(history[max(0, i - self.order + 2):i + 1])
+            total += prob if prob is not None else -99.0
+        cache[history] = total
+        return total
+
+def _context_sums(ngrams, model):
+    """
+        Returns a dict mapping each context h to [sum of P(w | h), sum of P(w | h without its first word)] over the n-grams (h, w).
+    """
+    sums = {}
+    for logprob, ngram in ngrams:
+        entry = sums.get(ngram[:-1])
+        if entry is None:
+            entry = sums[ngram[:-1]] = [0.0, 0.0]
+        entry[0] += 10 ** logprob
+        lower = model.logprob(ngram[1:])
+        entry[1] += 10 ** lower if lower is not None else 0.0
+    return sums
+
+def _log_ratio(numerator, denominator):
+    if denominator <= 0.0:
+        return 0.0
+    return math.log10(max(numerator, 1e-30) / denominator)
+
+def _perplexity_change(logprob, ngram, sums, model, history_cache):
+    """
+        Returns the relative change of the perplexity of the model if ngram were pruned.
+    """
+    history = ngram[:-1]
+    lower = model.logprob(ngram[1:])
+    if lower is None:
+        return float('inf')
+    prob = 10 ** logprob
+    sum_prob, sum_lower = sums[history]
+    numerator = 1.0 - sum_prob
+    denominator = 1.0 - sum_lower
+    bow = _log_ratio(numerator, denominator)
+    new_bow = _log_ratio(numerator + prob, denominator + 10 ** lower)
+    delta = -(10 ** model.history_logprob(history, history_cache)) * (prob * (lower + new_bow - logprob) + numerator * (new_bow - bow))
+    return 10 ** delta - 1.0
+
+def _threshold_for_size(changes, target_size):
+    """
+        Returns the smallest threshold that leaves at most target_size of the scored n-grams.
+    """
+    bins = [0] * ((HISTOGRAM_MAX - HISTOGRAM_MIN) * HISTOGRAM_BINS_PER_DECADE + 2)
+    for change in changes:
+        if change <= 0:
+            i = 0
+        else:
+            i = int((math.log10(change) - HISTOGRAM_MIN) * HISTOGRAM_BINS_PER_DECADE) + 1
+            i = min(max(i, 0), len(bins) - 1)
+        bins[i] += 1
+    kept = 0
+    for i in range(len(bins) - 1, -1, -1):
+        if kept + bins[i] > target_size:
+            return 10 ** (HISTOGRAM_MIN + float(i) / HISTOGRAM_BINS_PER_DECADE)
+        kept += bins[i]
+    return 0.0
+
+def prune_arpa(lm_file, output_file, threshold=None, target_size=None):
+    """
+        Prunes a language model and writes the result in ARPA format to output_file. Binary models (as written by idngram2lm with arpa_output=False) are converted to ARPA with binlm2arpa first.
+        Either threshold or target_size has to be given: with threshold, every n-gram whose removal increases the perplexity by less than that fraction (e.g. 1e-8) is pruned. With target_size, the threshold is chosen so that about target_size n-grams of order 2 and above are left. N-grams that are the context of a remaining higher order n-gram and unigrams are never pruned.
+        Returns a dict with the number of n-grams of each order in the pruned model.
+    """
+    if (threshold is None) == (target_size is None):
+        raise ValueError("Either threshold or target_size has to be given")
+    if not is_arpa_file(lm_file):
+        arpa_file = _mktemp('.arpa')
+        try:
+            binlm2arpa(lm_file, arpa_file)
+            return prune_arpa(arpa_file, output_file, threshold, target_size)
+        finally:
+            os.remove(arpa_file)
+
+    logger = logging.getLogger(__name__)
+    with open(lm_file, 'rb') as f:
+        counts, offsets = _scan(f)
+        order = max(counts)
+        if order == 1:
+            shutil.copyfile(lm_file, output_file)
+            return counts
+
+        model = _Model(order)
+        for k in range(1, order):
+            for logprob, ngram, bow, raw in _iter_section(f, offsets[k], k):
+                model.probs[k][ngram] = logprob
+                model.raw_probs[k][ngram] = raw
+                model.bows[k][ngram] = bow or 0.0
+        lower = lambda k: [(logprob, ngram) for ngram, logprob in model.probs[k].items()]
+        top = lambda: ((logprob, ngram) for logprob, ngram, _, _ in _iter_section(f, offsets[order], order))
+
+        # All perplexity changes refer to the original model, so the sums over the n-grams of every context are computed up front
+        sums = dict((k, _context_sums(lower(k), model)) for k in range(2, order))
+        sums[order] = _context_sums(top(), model)
+        history_cache = {}
+
+        def changes(k, ngrams):
+            for logprob, ngram in ngrams:
+                yield logprob, ngram, _perplexity_change(logprob, ngram, sums[k], model, history_cache)
+
+        if target_size is not None:
+            def all_changes():
+                for k in range(2, order):
+                    for _, _, change in changes(k, lower(k)):
+                        yield change
+                for _, _, change in changes(order, top()):
+                    yield change
+            threshold = _threshold_for_size(all_changes(), target_size)
+            logger.info("Pruning threshold for %d n-grams: %g", target_size, threshold)
+
+        # Highest order: spool the n-grams that are kept to a temporary file
+        kept_file = tempfile.TemporaryFile()
+        kept_counts = {order: 0}
+        contexts = set()
+        scored = ((raw, ngram, _perplexity_change(logprob, ngram, sums[order], model, history_cache))
+                  for logprob, ngram, _, raw in _iter_section(f, offsets[order], order))
+        for raw, ngram, change in scored:
+            if change >= threshold:
+                kept_file.write(('%s %s\n' % (raw, ' '.join(ngram))).encode('utf-8'))
+                kept_counts[order] += 1
+                contexts.add(ngram[:-1])
+
+    try:
+        # Lower orders from the top down, as an n-gram can only be pruned if it isn't the context of a remaining one
+        for k in range(order - 1, 1, -1):
+            extended = contexts
+            contexts = set()
+            for logprob, ngram, change in changes(k, lower(k)):
+                if ngram not in extended and change < threshold:
+                    del model.probs[k][ngram]
+                    del model.bows[k][ngram]
+                else:
+                    contexts.add(ngram[:-1])
+            kept_counts[k] = len(model.probs[k])
+        kept_counts[1] = len(model.probs[1])
+
+        # Renormalize the back-off weights from the bottom up, as each order depends on the final weights of the lower ones
+        for k in range(1, order):
+            if k < order - 1:
+                new_sums = _context_sums(lower(k + 1), model)
+            else:
+                kept_file.seek(0)
+                new_sums = _context_sums(((float(fields[0]), tuple(fields[1:])) for fields in (line.decode('utf-8').split() for line in kept_file)), model)
+            for context in model.bows[k]:
+                sum_prob, sum_lower = new_sums.get(context, (0.0, 0.0))
+                model.bows[k][context] = _log_ratio(1.0 - sum_prob, 1.0 - sum_lower)
+
+        with open(output_file, 'wb') as out_f:
+            out_f.write(b'\\data\\\n')
+            for k in range(1, order + 1):
+                out_f.write(b'ngram %d=%d\n' % (k, kept_counts[k]))
+            for k in range(1, order):
+                out_f.write(b'\n\\%d-grams:\n' % k)
+                for ngram in model.probs[k]:
+                    out_f.write(('%s %s %.6f\n' % (model.raw_probs[k][ngram], ' '.join(ngram), model.bows[k][ngram])).encode('utf-8'))
+            out_f.write(b'\n\\%d-grams:\n' % order)
+            kept_file.seek(0)
+            shutil.copyfileobj(kept_file, out_f)
+            out_f.write(b'\n\\end\\\n')
+    finally:
+        kept_file.close()
+
+    logger.info("Pruned %s to %s n-grams", ', '.join('%d' % counts[k] for k in sorted(counts)), ', '.join('%d' % kept_counts[k] for k in sorted(kept_counts)))
+    return dict((k, kept_counts[k]) for k in sorted(kept_counts))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Discovery of the CMUCLMTK tools.
+
+    A Toolchain looks up a tool only when it is first run and remembers its absolute path, so importing cmuclmtk doesn't scan $PATH and each run skips the lookup. All wrappers use the toolchain returned by get_toolchain(), which searches $PATH, or the directory given by the environment variable CMUCLMTK_PREFIX, unless it is replaced with set_toolchain().
+"""
+
+import os
+import re
+import shutil
+import logging
+import threading
+import subprocess
+
+# Tools the wrappers in the cmuclmtk module run
+TOOLS = ('text2wfreq', 'wfreq2vocab', 'text2wngram', 'text2idngram', 'ngram2mgram', 'wngram2idngram', 'idngram2stats', 'mergeidngram', 'idngram2lm', 'binlm2arpa')
+
+PREFIX_ENV = 'CMUCLMTK_PREFIX'
+
+_OPTION_RE = re.compile(r'(?<![\w-])-[a-z][a-z0-9_]*')
+
+class ToolNotFoundError(FileNotFoundError):
+    pass
+
+class Toolchain(object):
+    """
+        Finds the CMUCLMTK tools in prefix (or its bin directory), or on $PATH if no prefix is given. tools maps tool names to the paths (or names to look up instead) of individual tools, which take precedence.
+        Lookups are cached and thread-safe. Call clear() after installing or moving tools.
+    """
+    def __init__(self, prefix=None, tools=None):
+        self.prefix = prefix
+        self.tools = dict(tools or {})
+        self._paths = {}
+        self._capabilities = {}
+        self._lock = threading.Lock()
+
+    def _find(self, tool):
+        if tool in self.tools:
+            path = shutil.which(self.tools[tool])
+        elif self.prefix:
+            path = shutil.which(tool, path=os.pathsep.join([os.path.join(self.prefix, 'bin'), self.prefix]))
+        else:
+            path = shutil.which(tool)
+        if not path:
+            if tool in self.tools:
+                where = "at '%s'" % self.tools[tool]
+            elif self.prefix:
+                where = "in '%s'" % self.prefix
+            else:
+                where = "in your $PATH"
+            raise ToolNotFoundError("Can't find CMUCLMTK command '%s'! Please check if CMUCLMTK is installed %s." % (tool, where))
+        return os.path.abspath(path)
+
+    def path(self, tool):
+        """
+            Returns the absolute path of a tool. Raises a ToolNotFoundError if it can't be found.
+        """
+        with self._lock:
+            path = self._paths.get(tool)
+        if path is None:
+            path = self._find(tool)
+            logging.getLogger(__name__).debug("Using '%s' for %s", path, tool)
+            with self._lock:
+                self._paths[tool] = path
+        return path
+
+    def command(self, cmd):
+        """
+            Returns the command line cmd with the tool name replaced by its absolute path.
+        """
+        return [self.path(cmd[0])] + list(cmd[1:])
+
+    def missing(self, tools=TOOLS):
+        """
+            Returns the tools that can't be found.
+        """
+        missing = []
+        for tool in tools:
+            try:
+                self.path(tool)
+            except ToolNotFoundError:
+                missing.append(tool)
+        return missing
+
+    def capabilities(self, tool):
+        """
+            Returns the set of command line options a tool supports (e.g. '-cutoffs' for idngram2lm), as listed by its -help output. CMUCLMTK has no version option, so this is how builds with different features are told apart.
+        """
+        with self._lock:
+            capabilities = self._capabilities.get(tool)
+        if capabilities is None:
+            proc = subprocess.Popen([self.path(tool), '-help'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            try:
+                output, _ = proc.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                output, _ = proc.communicate()
+            capabilities = frozenset(_OPTION_RE.findall(output.decode('utf-8', 'replace'))) - frozenset(['-help'])
+            with self._lock:
+                self._capabilities[tool] = capabilities
+        return capabilities
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._capabilities.clear()
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_toolchain():
+    """
+        Returns the toolchain used by all wrappers. Unless set_toolchain() was called, it is created on first use, with the prefix from the environment variable CMUCLMTK_PREFIX, if set.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Toolchain(os.environ.get(PREFIX_ENV) or None)
+        return _default
+
+def set_toolchain(toolchain):
+    """
+        Makes all wrappers use toolchain, e.g. set_toolchain(Toolchain('/opt/cmuclmtk')). Passing None goes back to the default.
+    """
+    global _default
+    with _default_lock:
+        _default = toolchain
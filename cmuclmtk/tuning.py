@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Automatic choice of the memory parameters of the CMUCLMTK tools.
+
+    The defaults of the tools (e.g. a 2,000,000 entry hash table and a 100 MB n-gram buffer for text2idngram) are too large for small corpora and too small for large ones, which then get sorted in many temporary files that have to be merged. The functions in this module estimate the number of words and distinct words of a corpus from a sample and derive the parameters from those estimates.
+"""
+
+import os
+import math
+import logging
+
+MB = 1024 * 1024
+
+# Number of bytes sampled from a corpus, taken from evenly spaced blocks
+SAMPLE_SIZE = 8 * MB
+SAMPLE_BLOCKS = 8
+
+# Largest n-gram buffer (in MB) text2idngram is given automatically
+MAX_BUFFERSIZE = 4096
+
+# Bytes per n-gram in the text2idngram buffer: n word ids plus a count
+ID_SIZE = 4
+
+# Smallest spec_num value passed to idngram2lm
+MIN_SPEC_NUM = 1000
+
+class CorpusEstimate(object):
+    """
+        Estimated size of a corpus: its size in bytes, its number of words and its number of distinct words.
+    """
+    def __init__(self, size, words, distinct_words):
+        self.size = size
+        self.words = words
+        self.distinct_words = distinct_words
+
+    def __repr__(self):
+        return '<CorpusEstimate size=%d words=%d distinct_words=%d>' % (self.size, self.words, self.distinct_words)
+
+def _sample(path, sample_size, blocks):
+    size = os.path.getsize(path)
+    if size <= sample_size:
+        with open(path, 'rb') as f:
+            return size, f.read()
+    blocksize = sample_size // blocks
+    parts = []
+    with open(path, 'rb') as f:
+        for i in range(blocks):
+            f.seek((size - blocksize) * i // (blocks - 1))
+            block = f.read(blocksize)
+            # Drop the (probably incomplete) first and last words
+            parts.append(b' '.join(block.split()[1:-1]))
+    return size, b' '.join(parts)
+
+def estimate_corpus(text, sample_size=SAMPLE_SIZE):
+    """
+        Estimates the size of a corpus, given as path (e.g. a pathlib.Path) or string.
+        The number of distinct words is extrapolated using Heaps' law, V(N) = K * N^beta, with beta fitted on the first half and the whole of the sample.
+    """
+    if hasattr(text, '__fspath__'):
+        size, sample = _sample(os.fspath(text), sample_size, SAMPLE_BLOCKS)
+    else:
+        sample = text.encode('utf-8') if not isinstance(text, bytes) else text
+        size = len(sample)
+        sample = sample[:sample_size]
+
+    words = sample.split()
+    if not words:
+        return CorpusEstimate(size, 0, 0)
+    half = len(words) // 2
+    distinct = len(set(words))
+    distinct_half = len(set(words[:half])) if half else distinct
+    total_words = int(len(words) * float(size) / max(1, len(sample)))
+
+    if half and distinct > distinct_half and total_words > len(words):
+        beta = min(1.0, math.log(float(distinct) / distinct_half) / math.log(float(len(words)) / half))
+        total_distinct = int(distinct * (float(total_words) / len(words)) ** beta)
+    else:
+        total_distinct = distinct
+    return CorpusEstimate(size, total_words, min(total_distinct, total_words))
+
+def count_vocab(vocab_file):
+    """
+        Returns the number of words in a vocabulary file.
+    """
+    with open(vocab_file, 'rb') as f:
+        return sum(1 for line in f if line.strip() and not line.startswith(b'##'))
+
+def _max_open_files():
+    try:
+        import resource
+        return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError, OSError):
+        return 256
+
+def text2wfreq_parameters(estimate):
+    """
+        Returns text2wfreq keyword arguments for a corpus: a hash table with twice as many entries as distinct words.
+    """
+    return {'hashtablesize': max(1000, 2 * estimate.distinct_words)}
+
+def wfreq2vocab_parameters(estimate):
+    """
+        Returns wfreq2vocab keyword arguments for a corpus: enough records for all distinct words, plus a safety margin.
+    """
+    return {'records': max(1000, int(estimate.distinct_words * 1.25))}
+
+def text2idngram_parameters(estimate, vocab_size, n=3, workers=1, max_buffersize=MAX_BUFFERSIZE):
+    """
+        Returns text2idngram keyword arguments for a corpus and vocabulary: a hash table with twice as many entries as vocabulary words and an n-gram buffer that holds all n-grams of the corpus (up to max_buffersize MB), so that no temporary files have to be merged. If the buffer can't be that large, files is raised so that all temporary files can be merged at once.
+        If the corpus is split among several workers (see cmuclmtk.sharded_text2idngram), every worker only needs a buffer for its share.
+    """
+    required = int(estimate.words / max(1, workers) * (n + 1) * ID_SIZE * 1.1)
+    buffersize = max(1, min(max_buffersize, int(math.ceil(float(required) / MB))))
+    files = int(math.ceil(float(required) / (buffersize * MB))) + 1
+    return {'hashtablesize': max(1000, 2 * vocab_size),
+            'buffersize': buffersize,
+            'files': max(20, min(files, _max_open_files() - 16))}
+
+def idngram2lm_spec_num(idngram_file, n=3, ascii_input=False):
+    """
+        Returns the exact number of 2-grams, ..., n-grams in an id n-gram file, as needed for the spec_num parameter of idngram2lm. Lower order n-grams are counted as the distinct prefixes of the n-grams, which are sorted in the file. Counts below MIN_SPEC_NUM are raised to it.
+        Returns None if NumPy is not available or the file holds no n-grams.
+    """
+    try:
+        import numpy as np
+        from .idngram import iter_idngram
+    except ImportError:
+        return None
+
+    counts = [0] * (n - 1)
+    last = None
+    for chunk in iter_idngram(idngram_file, n, ascii_input=ascii_input):
+        ids = np.asarray(chunk['ids'], dtype=np.int64)
+        if last is not None:
+            ids = np.vstack([last, ids])
+        # changed[i, k] is True if row i differs from the previous row in the first k+1 ids
+        changed = np.logical_or.accumulate(ids[1:] != ids[:-1], axis=1)
+        for k in range(1, n):
+            counts[k-1] += int(changed[:, k].sum())
+        if last is None:
+            counts = [c + 1 for c in counts]
+        last = ids[-1:]
+    if last is None:
+        return None
+    return [max(count, MIN_SPEC_NUM) for count in counts]
+
+def tune_parameters(text, vocab_file=None, n=3, workers=1):
+    """
+        Returns a dict with tuned keyword arguments for the stages 'text2wfreq', 'wfreq2vocab' and (if a vocab_file is given) 'text2idngram'. The parameters of idngram2lm depend on the id n-grams, see idngram2lm_spec_num.
+    """
+    estimate = estimate_corpus(text)
+    logging.getLogger(__name__).debug("Corpus estimate: %r", estimate)
+    parameters = {'text2wfreq': text2wfreq_parameters(estimate),
+                  'wfreq2vocab': wfreq2vocab_parameters(estimate)}
+    if vocab_file:
+        parameters['text2idngram'] = text2idngram_parameters(estimate, count_vocab(vocab_file), n, workers)
+    return parameters
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Vocabulary building across several cores.
+
+    sharded_text2vocab counts the words of each shard of a corpus with its own text2wfreq process, sorts the counts of every shard by word and merges them with a streaming k-way merge. The vocabulary is selected from the merged counts in Python, so unlike with wfreq2vocab there is no limit on the number of distinct words.
+"""
+
+import os
+import heapq
+import logging
+import multiprocessing
+import concurrent.futures
+
+from . import metrics, _propagate, _mktemp, _shard_offsets, _ShardReader, text2wfreq
+
+# Vocabulary size if neither top nor gt is given, like wfreq2vocab
+DEFAULT_TOP = 20000
+
+def read_wfreq(wfreq_file):
+    """
+        Yields (word, count) for every line of a word frequency file, with the word as bytes.
+    """
+    with open(wfreq_file, 'rb') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                yield fields[0], int(fields[1])
+
+def sort_wfreq(wfreq_file, output_file):
+    """
+        Writes the word frequencies of wfreq_file to output_file, sorted by word. The counts are held in memory.
+    """
+    counts = sorted(read_wfreq(wfreq_file))
+    with open(output_file, 'wb') as f:
+        for word, count in counts:
+            f.write(b'%s %d\n' % (word, count))
+
+def merge_sorted_wfreq(wfreq_files):
+    """
+        Merges word frequency files that are sorted by word and yields (word, total count) in the order of the words. Only one line per file is held in memory.
+    """
+    word = None
+    total = 0
+    for next_word, count in heapq.merge(*[read_wfreq(wfreq_file) for wfreq_file in wfreq_files]):
+        if next_word != word:
+            if word is not None:
+                yield word, total
+            word = next_word
+            total = 0
+        total += count
+    if word is not None:
+        yield word, total
+
+def select_vocab(counts, top=None, gt=None):
+    """
+        Selects the vocabulary from (word, count) pairs like wfreq2vocab does: the top most frequent words, or the words that occur more than gt times, or the DEFAULT_TOP most frequent words if neither is given. Of words with the same count, those that come first are preferred.
+        Returns the words sorted (bytewise, as wngram2idngram requires).
+    """
+    if not top and gt:
+        words = [word for word, count in counts if count > gt]
+    else:
+        # nlargest keeps a heap of just top entries
+        words = [word for word, count in heapq.nlargest(top or DEFAULT_TOP, counts, key=lambda item: item[1])]
+    return sorted(words)
+
+def write_vocab(words, output_file):
+    """
+        Writes a vocabulary file with a header comment, in the format of wfreq2vocab.
+    """
+    with open(output_file, 'wb') as f:
+        f.write(b'## Vocabulary of %d words\n' % len(words))
+        for word in words:
+            f.write(word + b'\n')
+
+def _tee_wfreq(counts, wfreq_file):
+    with open(wfreq_file, 'wb') as f:
+        for word, count in counts:
+            f.write(b'%s %d\n' % (word, count))
+            yield word, count
+
+@metrics.pipeline('sharded_text2vocab')
+def sharded_text2vocab(corpus_file, output_file, top=None, gt=None, workers=None, wfreq_file=None, text2wfreq_kwargs={}):
+    """
+        Like text2vocab, but splits the corpus file into one shard per worker (default: the number of CPUs) and runs text2wfreq on all shards in parallel. The word frequencies of the shards are merged and the vocabulary is selected in Python (see select_vocab for top and gt), so the number of distinct words is not limited by wfreq2vocab's records.
+        If wfreq_file is given, the merged word frequencies of the whole corpus are written to it, sorted by word.
+    """
+    corpus_file = os.path.abspath(corpus_file)
+    offsets = _shard_offsets(corpus_file, workers or multiprocessing.cpu_count())
+    shard_files = [_mktemp('.wfreq') for _ in offsets[1:]]
+
+    def count(i):
+        unsorted_file = _mktemp('.wfreq')
+        try:
+            text2wfreq(_ShardReader(corpus_file, offsets[i], offsets[i+1]), unsorted_file, **text2wfreq_kwargs)
+            sort_wfreq(unsorted_file, shard_files[i])
+        finally:
+            os.remove(unsorted_file)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(shard_files)) as executor:
+            for future in [executor.submit(_propagate(count), i) for i in range(len(shard_files))]:
+                future.result()
+
+        counts = merge_sorted_wfreq(shard_files)
+        if wfreq_file:
+            counts = _tee_wfreq(counts, wfreq_file)
+        words = select_vocab(counts, top, gt)
+    finally:
+        for shard_file in shard_files:
+            os.remove(shard_file)
+
+    write_vocab(words, output_file)
+    logging.getLogger(__name__).info("Selected %d words from %d shards", len(words), len(shard_files))
@@ -17,6 +17,8 @@ setup(name='cmuclmtk',
       license='BSD',
       url='https://github.com/Holzhaus/python-cmuclmtk',
       packages=['cmuclmtk'],
+      python_requires='>=3.6',
+      extras_require={'numpy': ['numpy']},
       keywords='cmu sphinx cmuclmtk language modeling training vocabulary dictionary vocab dict',
       zip_safe=True
     )
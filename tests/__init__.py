@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+"""
+    Tests for python-cmuclmtk.
+
+    The tests run against the stand-ins for the CMUCLMTK tools from the benchmarks package, so they don't need CMUCLMTK to be installed. Run "python -m unittest" (or pytest) from the root of the repository.
+"""
+
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+import cmuclmtk
+from benchmarks import generate_corpus, install_standins
+
+class ToolTestCase(unittest.TestCase):
+    """
+        Runs every test in a temporary directory (self.tmpdir), with a toolchain of stand-ins (see benchmarks.standin). Individual tools can be replaced with add_tool().
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmuclmtk-test-')
+        self.bindir = install_standins(os.path.join(self.tmpdir, 'bin'))
+        self._toolchain = cmuclmtk.get_toolchain()
+        cmuclmtk.set_toolchain(cmuclmtk.Toolchain(self.bindir))
+
+    def tearDown(self):
+        cmuclmtk.set_toolchain(self._toolchain)
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def add_tool(self, tool, script):
+        """
+            Replaces the stand-in for tool with a shell script.
+        """
+        path = os.path.join(self.bindir, tool)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + script)
+        os.chmod(path, 0o755)
+        cmuclmtk.get_toolchain().clear()
+        return path
+
+    def corpus(self, size=200000, vocab_size=2000):
+        """
+            Returns the path of a synthetic corpus of size bytes.
+        """
+        path = self.path('corpus-%d.txt' % size)
+        if not os.path.exists(path):
+            generate_corpus(path, size, vocab_size=vocab_size)
+        return path
+
+    def vocab(self, corpus, top=500):
+        """
+            Returns the path of a vocabulary of the top most frequent words of corpus, so that the corpus has unknown words.
+        """
+        path = corpus + '.vocab'
+        if not os.path.exists(path):
+            cmuclmtk.text2vocab(pathlib.Path(corpus), path, wfreq2vocab_kwargs={'top': top})
+        return path
+
+    def assertSameFile(self, first, second):
+        with open(first, 'rb') as f:
+            first_data = f.read()
+        with open(second, 'rb') as f:
+            second_data = f.read()
+        self.assertTrue(first_data, "'%s' is empty" % first)
+        self.assertEqual(first_data, second_data)
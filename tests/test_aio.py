@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import time
+import asyncio
+import pathlib
+import unittest
+
+import cmuclmtk
+import cmuclmtk.aio
+from . import ToolTestCase
+
+async def _lines(text):
+    for line in text.splitlines():
+        yield line
+
+class AioTest(ToolTestCase):
+    def test_same_as_blocking(self):
+        corpus = self.corpus(50000)
+        vocab = self.vocab(corpus)
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('blocking.lm'), vocab_file=vocab, in_process=False)
+        asyncio.run(cmuclmtk.aio.text2lm(pathlib.Path(corpus), self.path('path.lm'), vocab_file=vocab))
+        self.assertSameFile(self.path('blocking.lm'), self.path('path.lm'))
+
+        with open(corpus) as f:
+            text = f.read()
+        asyncio.run(cmuclmtk.aio.text2lm(_lines(text), self.path('lines.lm'), vocab_file=vocab))
+        self.assertSameFile(self.path('blocking.lm'), self.path('lines.lm'))
+
+    def test_text2vocab(self):
+        corpus = self.corpus(50000)
+        cmuclmtk.text2vocab(pathlib.Path(corpus), self.path('blocking.vocab'))
+        asyncio.run(cmuclmtk.aio.text2vocab(pathlib.Path(corpus), self.path('aio.vocab')))
+        self.assertSameFile(self.path('blocking.vocab'), self.path('aio.vocab'))
+
+    def test_failure(self):
+        self.add_tool('text2wfreq', 'exit 3\n')
+        with self.assertRaises(cmuclmtk.ConversionError):
+            asyncio.run(cmuclmtk.aio.text2wfreq('a b c', self.path('out.wfreq')))
+
+    def test_cancel(self):
+        # The background sleep keeps stderr open unless the whole process group is killed
+        self.add_tool('text2wfreq', 'sleep 30 &\nsleep 30\n')
+
+        async def cancel():
+            task = asyncio.ensure_future(cmuclmtk.aio.text2wfreq('a b c', self.path('out.wfreq')))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.time()
+        asyncio.run(cancel())
+        self.assertLess(time.time() - start, 5)
+
+    def test_timeout(self):
+        self.add_tool('text2wfreq', 'sleep 30 &\nsleep 30\n')
+        with self.assertRaises(cmuclmtk.LimitExceededError) as cm:
+            asyncio.run(cmuclmtk.aio.text2wfreq('a b c', self.path('out.wfreq'), policy=cmuclmtk.ExecutionPolicy(timeout=0.5)))
+        self.assertEqual(cm.exception.limit, 'timeout')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import time
+import pathlib
+import threading
+import unittest
+
+import cmuclmtk
+from cmuclmtk.batch import BuildJob, build_many
+from cmuclmtk.normalize import Normalizer
+from . import ToolTestCase
+
+class SleepingJob(BuildJob):
+    """
+        Job that only sleeps, recording how many jobs run at the same time.
+    """
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def run(self):
+        with self.lock:
+            SleepingJob.running += 1
+            SleepingJob.peak = max(SleepingJob.peak, SleepingJob.running)
+        time.sleep(0.2)
+        with self.lock:
+            SleepingJob.running -= 1
+        return self.output_file
+
+def peak_concurrency(jobs, **kwargs):
+    SleepingJob.running = SleepingJob.peak = 0
+    results = build_many(jobs, **kwargs)
+    assert all(result.ok for result in results)
+    return SleepingJob.peak
+
+class BudgetTest(unittest.TestCase):
+    def test_memory_budget(self):
+        jobs = [SleepingJob('text', 'job%d.lm' % i, memory=40) for i in range(4)]
+        self.assertEqual(peak_concurrency(jobs, max_memory=100, max_cpus=8), 2)
+
+    def test_oversized_job_runs_alone(self):
+        jobs = [SleepingJob('text', 'job%d.lm' % i, memory=150) for i in range(3)]
+        self.assertEqual(peak_concurrency(jobs, max_memory=100, max_cpus=8), 1)
+
+    def test_cpu_budget(self):
+        jobs = [SleepingJob('text', 'job%d.lm' % i, memory=1, workers=2) for i in range(4)]
+        self.assertEqual(peak_concurrency(jobs, max_memory=100, max_cpus=4), 2)
+
+    def test_pipe_and_normalizer_cpus(self):
+        self.assertEqual(BuildJob('text', 'a.lm').estimate_cpus(), 1)
+        self.assertEqual(BuildJob('text', 'a.lm', workers=2, pipe=True).estimate_cpus(), 3)
+        self.assertEqual(BuildJob('text', 'a.lm', normalizer=Normalizer(), normalize_workers=3).estimate_cpus(), 4)
+        # Two jobs with a pipe each need 4 CPUs
+        jobs = [SleepingJob('text', 'job%d.lm' % i, memory=1, pipe=True) for i in range(4)]
+        self.assertEqual(peak_concurrency(jobs, max_memory=100, max_cpus=3), 1)
+
+class BuildManyTest(ToolTestCase):
+    def test_results(self):
+        corpus = self.corpus()
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('expected.lm'), in_process=False)
+        jobs = [BuildJob(pathlib.Path(corpus), self.path('job%d.lm' % i), in_process=False) for i in range(3)]
+        results = build_many(jobs, max_cpus=2)
+        self.assertEqual([result.job for result in results], jobs)
+        for i, result in enumerate(results):
+            self.assertTrue(result.ok, result)
+            self.assertIsNotNone(result.duration)
+            self.assertGreater(result.memory, 0)
+            self.assertSameFile(self.path('job%d.lm' % i), self.path('expected.lm'))
+
+    def test_error_isolation(self):
+        corpus = self.corpus()
+        jobs = [BuildJob(pathlib.Path(corpus), self.path('good.lm'), in_process=False),
+                # Fails while estimating its memory, so it is never started
+                BuildJob(pathlib.Path(self.path('missing.txt')), self.path('missing.lm')),
+                # Fails while running
+                BuildJob(pathlib.Path(corpus), self.path('bad.lm'), vocab_file=self.path('missing.vocab'), in_process=False),
+                BuildJob(corpus, self.path('string.lm'), in_process=False)]
+        results = build_many(jobs, max_cpus=1)
+        self.assertEqual([result.ok for result in results], [True, False, False, True])
+        self.assertIsInstance(results[1].error, OSError)
+        self.assertIsNone(results[1].memory)
+        self.assertIsInstance(results[2].error, cmuclmtk.ConversionError)
+        self.assertIsNone(results[2].output)
+        self.assertTrue(results[3].output)
+
+if __name__ == '__main__':
+    unittest.main()
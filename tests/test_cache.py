@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+import cmuclmtk
+from cmuclmtk import metrics
+from cmuclmtk.cache import ArtifactCache
+from . import ToolTestCase
+
+TOOLS = ('text2wfreq', 'wfreq2vocab', 'text2idngram', 'idngram2lm')
+
+class CacheTest(ToolTestCase):
+    def setUp(self):
+        super(CacheTest, self).setUp()
+        self.cache = ArtifactCache(self.path('cache'))
+
+    def build(self, output_file, corpus=None, **kwargs):
+        with metrics.collect() as records:
+            cmuclmtk.text2lm(pathlib.Path(corpus or self.corpus()), self.path(output_file), cache=self.cache, in_process=False, **kwargs)
+        return [record.stage for record in records if record.cmd is not None]
+
+    def test_miss_then_hit(self):
+        cmuclmtk.text2lm(pathlib.Path(self.corpus()), self.path('uncached.lm'), in_process=False)
+        self.assertEqual(self.build('first.lm'), list(TOOLS))
+        self.assertEqual(self.cache.stats()['hits'], 0)
+        self.assertSameFile(self.path('first.lm'), self.path('uncached.lm'))
+
+        # The second build must not run any tool
+        for tool in TOOLS:
+            self.add_tool(tool, 'exit 1\n')
+        self.assertEqual(self.build('second.lm'), [])
+        self.assertGreater(self.cache.stats()['hits'], 0)
+        self.assertSameFile(self.path('second.lm'), self.path('uncached.lm'))
+
+    def test_partial_hit(self):
+        self.build('first.lm')
+        # Only the parameters of idngram2lm change, so the vocabulary and id n-grams are reused
+        self.assertEqual(self.build('second.lm', idngram2lm_kwargs={'cutoffs': [1, 1]}), ['idngram2lm'])
+        # Changing the vocabulary invalidates everything after it
+        self.assertEqual(self.build('third.lm', wfreq2vocab_kwargs={'top': 100}), ['wfreq2vocab', 'text2idngram', 'idngram2lm'])
+
+    def test_other_corpus(self):
+        self.build('first.lm')
+        misses = self.cache.stats()['misses']
+        self.assertEqual(self.build('second.lm', self.corpus(100000)), list(TOOLS))
+        self.assertGreater(self.cache.stats()['misses'], misses)
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmuclmtk-test-')
+        self.cache = ArtifactCache(os.path.join(self.tmpdir, 'cache'), max_size=2500)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def put(self, key, mtime):
+        src = os.path.join(self.tmpdir, key)
+        with open(src, 'wb') as f:
+            f.write(b'x' * 1000)
+        self.cache.put(key, src, 'output of %s' % key)
+        for path in (self.cache._path(key), self.cache._path(key) + '.out'):
+            os.utime(path, (mtime, mtime))
+
+    def test_least_recently_used_is_evicted(self):
+        self.put('a', 1000)
+        self.put('b', 2000)
+        # Reading 'a' makes 'b' the least recently used artifact
+        self.assertEqual(self.cache.get('a', os.path.join(self.tmpdir, 'a.copy')), 'output of a')
+        self.put('c', 3000)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'output of a')
+        self.assertEqual(self.cache.get('c'), 'output of c')
+        self.assertLessEqual(self.cache.size(), 2500)
+        self.assertEqual(self.cache.stats(), {'hits': 3, 'misses': 1, 'evictions': 1})
+
+    def test_output_does_not_count(self):
+        self.put('a', 1000)
+        self.assertEqual(self.cache.output('a'), 'output of a')
+        self.assertIsNone(self.cache.output('b'))
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 0, 'evictions': 0})
+
+if __name__ == '__main__':
+    unittest.main()
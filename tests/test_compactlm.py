@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import math
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .test_prune import write_arpa, read_arpa, logprob
+
+EMPTY_TRIGRAMS_ARPA = '''\\data\\
+ngram 1=3
+ngram 2=2
+ngram 3=0
+
+\\1-grams:
+-0.5 <s> -0.3
+-0.5 a -0.2
+-0.4 b
+
+\\2-grams:
+-0.1 <s> a
+-0.2 a b
+
+\\3-grams:
+
+\\end\\
+'''
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class CompactLMTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmuclmtk-test-')
+        self.lm_file = os.path.join(self.tmpdir, 'corpus.lm')
+        sentences = [('<s> %s </s>' % sentence).split() for sentence in
+                     ('a b c d', 'a b d c', 'b c a', 'c d a b', 'd a b c d', 'a c', 'b d b d', 'c a b')]
+        write_arpa(self.lm_file, sentences)
+        self.probs, self.bows = read_arpa(self.lm_file)
+        self.vocab = sorted(word for (word,) in self.probs[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def compact(self, quantize=None, lm_file=None):
+        from cmuclmtk.compactlm import arpa2compact, CompactLM
+        output_dir = os.path.join(self.tmpdir, 'compact-%s' % quantize)
+        arpa2compact(lm_file or self.lm_file, output_dir, quantize)
+        return CompactLM(output_dir)
+
+    def queries(self):
+        for u in self.vocab:
+            for v in self.vocab:
+                for w in self.vocab:
+                    if w != '<s>':
+                        yield u, v, w
+
+    def test_logprob(self):
+        lm = self.compact()
+        self.assertEqual(lm.order, 3)
+        for u, v, w in self.queries():
+            self.assertAlmostEqual(lm.logprob([u, v], w), logprob(self.probs, self.bows, (u, v, w)), places=5, msg='%s %s %s' % (u, v, w))
+        # Shorter contexts and unigrams
+        self.assertAlmostEqual(lm.logprob(['a'], 'b'), logprob(self.probs, self.bows, ('a', 'b')), places=5)
+        self.assertAlmostEqual(lm.logprob([], 'c'), self.probs[1][('c',)], places=5)
+        # There is no <UNK> in this model
+        self.assertEqual(lm.logprob(['a', 'b'], 'unknown'), -math.inf)
+
+    def test_score_sentences(self):
+        lm = self.compact()
+        sentences = ['<s> a b c d </s>', ['<s>', 'd', 'c', 'b', 'a', '</s>'], 'a b']
+        expected = []
+        for sentence in sentences:
+            words = sentence.split() if isinstance(sentence, str) else sentence
+            total = 0.0
+            for j in range(1 if words[0] == '<s>' else 0, len(words)):
+                total += logprob(self.probs, self.bows, tuple(words[max(0, j - 2):j + 1]))
+            expected.append(total)
+        numpy.testing.assert_allclose(lm.score_sentences(sentences), expected, atol=1e-4)
+
+    def test_quantized(self):
+        exact = self.compact()
+        for bits, tolerance in ((16, 0.01), (8, 0.1)):
+            with self.subTest(bits=bits):
+                lm = self.compact(bits)
+                self.assertTrue(os.path.exists(os.path.join(lm.path, '3.prob.codes.npy')))
+                self.assertFalse(os.path.exists(os.path.join(lm.path, '3.prob.npy')))
+                # Unigrams are never quantized
+                self.assertTrue(os.path.exists(os.path.join(lm.path, '1.prob.npy')))
+                for u, v, w in self.queries():
+                    self.assertAlmostEqual(lm.logprob([u, v], w), exact.logprob([u, v], w), delta=tolerance)
+
+    def test_empty_section(self):
+        lm_file = os.path.join(self.tmpdir, 'empty.lm')
+        with open(lm_file, 'w') as f:
+            f.write(EMPTY_TRIGRAMS_ARPA)
+        for quantize in (None, 8):
+            with self.subTest(quantize=quantize):
+                lm = self.compact(quantize, lm_file)
+                self.assertEqual(lm.order, 3)
+                self.assertAlmostEqual(lm.logprob(['<s>', 'a'], 'b'), -0.2, places=5)
+                self.assertAlmostEqual(lm.logprob(['b', 'a'], 'b'), -0.2, places=5)
+                self.assertAlmostEqual(lm.logprob(['a', 'b'], 'a'), -0.5, places=5)
+                self.assertAlmostEqual(lm.logprob(['b', 'b'], 'b'), -0.4, places=5)
+
+    def test_wrong_counts(self):
+        from cmuclmtk.compactlm import arpa2compact
+        lm_file = os.path.join(self.tmpdir, 'missing.lm')
+        with open(lm_file, 'w') as f:
+            f.write(EMPTY_TRIGRAMS_ARPA.replace('ngram 3=0', 'ngram 3=1'))
+        with self.assertRaises(ValueError):
+            arpa2compact(lm_file, os.path.join(self.tmpdir, 'compact'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import pathlib
+import unittest
+
+import cmuclmtk
+from cmuclmtk.evallm import EvalLM, EvalLMPool, PerplexityResult, is_arpa_file
+from . import ToolTestCase
+
+def read_unigrams(lm_file):
+    unigrams = {}
+    with open(lm_file) as f:
+        in_unigrams = False
+        for line in f:
+            if line.startswith('\\'):
+                in_unigrams = line.strip() == '\\1-grams:'
+            elif in_unigrams and line.strip():
+                fields = line.split()
+                unigrams[fields[1]] = float(fields[0])
+    return unigrams
+
+class EvalLMTest(ToolTestCase):
+    def setUp(self):
+        super(EvalLMTest, self).setUp()
+        corpus = self.corpus()
+        self.lm_file = self.path('corpus.lm')
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.lm_file, vocab_file=self.vocab(corpus), in_process=False)
+        self.unigrams = read_unigrams(self.lm_file)
+        with open(corpus) as f:
+            words = f.read().split()[:300]
+        self.text = ' '.join(words + ['unknownword'])
+        self.known = [word for word in words if word in self.unigrams]
+        self.oovs = [word for word in words if word not in self.unigrams] + ['unknownword']
+
+    def assertPerplexity(self, result, words=None):
+        words = self.known if words is None else words
+        self.assertEqual(result.words, len(words))
+        expected = 10 ** (-sum(self.unigrams[word] for word in words) / len(words))
+        self.assertAlmostEqual(result.perplexity / expected, 1.0, places=3)
+        self.assertAlmostEqual(result.logprob, sum(self.unigrams[word] for word in words), delta=0.01 * len(words))
+
+    def test_perplexity(self):
+        self.assertTrue(self.oovs[:-1], "The text has no unknown words besides 'unknownword'")
+        with EvalLM(self.lm_file) as evallm:
+            result = evallm.perplexity(self.text)
+        self.assertPerplexity(result)
+        self.assertEqual(result.oovs, len(self.oovs))
+        self.assertEqual(result.context_cues, 0)
+
+    def test_text_types(self):
+        path = self.path('text.txt')
+        with open(path, 'w') as f:
+            f.write(self.text)
+        with EvalLM(self.lm_file) as evallm:
+            results = [evallm.perplexity(pathlib.Path(path)),
+                       evallm.perplexity(self.text.split(' ')),
+                       evallm.perplexity(self.text.encode('utf-8'))]
+            with open(path) as f:
+                results.append(evallm.perplexity(f))
+        for result in results:
+            self.assertPerplexity(result)
+
+    def test_probs_and_oovs(self):
+        with EvalLM(self.lm_file) as evallm:
+            evallm.perplexity(self.text, probs_file=self.path('probs'), oovs_file=self.path('oovs'))
+        with open(self.path('probs')) as f:
+            probs = [float(line) for line in f]
+        self.assertEqual(len(probs), len(self.known))
+        for prob, word in zip(probs, self.known):
+            self.assertAlmostEqual(prob, 10 ** self.unigrams[word])
+        with open(self.path('oovs')) as f:
+            self.assertEqual(f.read().split(), self.oovs)
+
+    def test_whitespace_in_paths(self):
+        directory = self.path('with space')
+        os.makedirs(directory)
+        text_file = os.path.join(directory, 'text.txt')
+        with open(text_file, 'w') as f:
+            f.write(self.text)
+        probs_file = os.path.join(directory, 'probs')
+        with EvalLM(self.lm_file) as evallm:
+            self.assertPerplexity(evallm.perplexity(pathlib.Path(text_file), probs_file=probs_file))
+        with open(probs_file) as f:
+            self.assertEqual(len(f.read().split()), len(self.known))
+
+    def test_perplexities(self):
+        sentences = [' '.join(self.known[i:i+10]) for i in range(0, 50, 10)]
+        with EvalLM(self.lm_file) as evallm:
+            results = evallm.perplexities(sentences)
+        for result, sentence in zip(results, sentences):
+            self.assertPerplexity(result, sentence.split())
+
+    def test_pool(self):
+        sentences = [' '.join(self.known[i:i+10]) for i in range(0, 100, 10)]
+        with EvalLMPool(self.lm_file, workers=3) as pool:
+            results = pool.perplexities(sentences)
+            self.assertPerplexity(pool.perplexity(self.text))
+        self.assertEqual(len(results), len(sentences))
+        for result, sentence in zip(results, sentences):
+            self.assertPerplexity(result, sentence.split())
+
+    def test_format(self):
+        self.assertTrue(is_arpa_file(self.lm_file))
+        with open(self.path('binary.lm'), 'wb') as f:
+            f.write(b'evallm binary model\0\1\2')
+        self.assertFalse(is_arpa_file(self.path('binary.lm')))
+        with EvalLM(self.lm_file) as evallm:
+            self.assertEqual(evallm.cmd[1], '-arpa')
+        # The stand-in reads models given with -binary as ARPA models, too
+        with EvalLM(self.lm_file, arpa=False) as evallm:
+            self.assertEqual(evallm.cmd[1], '-binary')
+            self.assertPerplexity(evallm.perplexity(self.text))
+
+    def test_context_cues(self):
+        context_file = self.path('context')
+        with open(context_file, 'w') as f:
+            f.write('%s\n' % self.known[0])
+        with EvalLM(self.lm_file, context_file) as evallm:
+            result = evallm.perplexity(self.text)
+        self.assertEqual(result.context_cues, self.known.count(self.known[0]))
+
+    def test_exited(self):
+        self.add_tool('evallm', 'echo "evallm : "\nexit 3\n')
+        evallm = EvalLM(self.lm_file)
+        try:
+            with self.assertRaises(cmuclmtk.ConversionError):
+                evallm.perplexity(self.text)
+        finally:
+            evallm.close()
+
+    def test_start_failure(self):
+        self.add_tool('evallm', 'exit 3\n')
+        with self.assertRaises(cmuclmtk.ConversionError):
+            EvalLM(self.lm_file)
+
+class ParseTest(unittest.TestCase):
+    def test_parse(self):
+        result = PerplexityResult.parse('Perplexity = 100.00, Entropy = 6.64 bits\nComputation based on 50 words.\n'
+                                        '3 OOVs (5.45%) and 2 context cues were removed from the calculation.\n')
+        self.assertEqual((result.perplexity, result.entropy, result.words, result.oovs, result.context_cues), (100.0, 6.64, 50, 3, 2))
+        self.assertAlmostEqual(result.logprob, -100.0, delta=0.1)
+
+    def test_unexpected_output(self):
+        with self.assertRaises(cmuclmtk.ConversionError):
+            PerplexityResult.parse('Unknown command : perplexity\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import shutil
+import pathlib
+import unittest
+
+import cmuclmtk
+from . import ToolTestCase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class ShardedTest(ToolTestCase):
+    def test_sharded_equals_serial(self):
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        for n, write_ascii in ((3, False), (2, True)):
+            with self.subTest(n=n, write_ascii=write_ascii):
+                serial = self.path('serial-%d.idngram' % n)
+                sharded = self.path('sharded-%d.idngram' % n)
+                cmuclmtk.text2idngram(pathlib.Path(corpus), vocab, serial, n=n, write_ascii=write_ascii)
+                cmuclmtk.sharded_text2idngram(corpus, vocab, sharded, workers=4, n=n, write_ascii=write_ascii)
+                self.assertSameFile(serial, sharded)
+
+    def test_text2lm_workers(self):
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('serial.lm'), vocab_file=vocab, in_process=False)
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('sharded.lm'), vocab_file=vocab, workers=4, in_process=False)
+        self.assertSameFile(self.path('serial.lm'), self.path('sharded.lm'))
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class InProcessTest(ToolTestCase):
+    def test_count_idngrams_equals_text2idngram(self):
+        from cmuclmtk import idngram
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        for n, write_ascii in ((3, False), (2, True)):
+            for text in (pathlib.Path(corpus), open(corpus).read()):
+                with self.subTest(n=n, write_ascii=write_ascii, text=type(text).__name__):
+                    tool = self.path('tool.idngram')
+                    in_process = self.path('in-process.idngram')
+                    cmuclmtk.text2idngram(text, vocab, tool, n=n, write_ascii=write_ascii)
+                    idngram.count_idngrams(text, vocab, in_process, n=n, write_ascii=write_ascii)
+                    self.assertSameFile(tool, in_process)
+
+    def test_text2lm_in_process(self):
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('tool.lm'), vocab_file=vocab, in_process=False)
+        outputs = cmuclmtk.text2lm(pathlib.Path(corpus), self.path('in-process.lm'), vocab_file=vocab, in_process=True)
+        self.assertSameFile(self.path('tool.lm'), self.path('in-process.lm'))
+        self.assertIn('3-grams occurring:', outputs[0])
+
+    def test_fof_report(self):
+        from cmuclmtk import idngram
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        output_file = self.path('in-process.idngram')
+        report = idngram.count_idngrams(pathlib.Path(corpus), vocab, output_file, n=3, fof_size=5)
+        counts = idngram.open_idngram(output_file, n=3)['count']
+        header, zero, *rows = report.split('\n\n')[1].strip().split('\n')
+        self.assertTrue(header.startswith('3-grams occurring:'))
+        self.assertEqual(int(zero.split()[1]), len(counts))
+        self.assertEqual(len(rows), 5)
+        for row in (line.split() for line in rows):
+            self.assertEqual(int(row[1]), int((counts == int(row[0])).sum()))
+            self.assertEqual(int(row[2]), int((counts > int(row[0])).sum()))
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class IOTest(ToolTestCase):
+    def setUp(self):
+        super(IOTest, self).setUp()
+        corpus = self.corpus()
+        self.vocab_file = self.vocab(corpus)
+        self.binary = self.path('corpus.idngram')
+        self.ascii = self.path('corpus.idngram.txt')
+        cmuclmtk.text2idngram(pathlib.Path(corpus), self.vocab_file, self.binary)
+        cmuclmtk.text2idngram(pathlib.Path(corpus), self.vocab_file, self.ascii, write_ascii=True)
+
+    def test_open_idngram(self):
+        from cmuclmtk import idngram
+        ngrams = idngram.open_idngram(self.binary)
+        self.assertIsInstance(ngrams, numpy.memmap)
+        self.assertEqual(ngrams['ids'].shape, (len(ngrams), 3))
+        with open(self.ascii) as f:
+            expected = numpy.array([line.split() for line in f], dtype=numpy.int64)
+        numpy.testing.assert_array_equal(ngrams['ids'], expected[:, :3])
+        numpy.testing.assert_array_equal(ngrams['count'], expected[:, 3])
+
+    def test_iter_idngram(self):
+        from cmuclmtk import idngram
+        ngrams = idngram.open_idngram(self.binary)
+        for ascii_input in (False, True):
+            with self.subTest(ascii_input=ascii_input):
+                path = self.ascii if ascii_input else self.binary
+                chunks = list(idngram.iter_idngram(path, chunksize=1000, ascii_input=ascii_input))
+                self.assertEqual([len(chunk) for chunk in chunks[:-1]], [1000] * (len(chunks) - 1))
+                numpy.testing.assert_array_equal(numpy.concatenate(chunks), ngrams)
+                filtered = numpy.concatenate(list(idngram.iter_idngram(path, ascii_input=ascii_input, min_count=2, max_count=5)))
+                numpy.testing.assert_array_equal(filtered, ngrams[(ngrams['count'] >= 2) & (ngrams['count'] <= 5)])
+
+    def test_write_idngram(self):
+        from cmuclmtk import idngram
+        ngrams = idngram.open_idngram(self.binary)
+        idngram.write_idngram(self.path('copy.idngram'), idngram.iter_idngram(self.binary, chunksize=1000))
+        self.assertSameFile(self.path('copy.idngram'), self.binary)
+        idngram.write_idngram(self.path('copy.idngram.txt'), ngrams, ascii_output=True)
+        self.assertSameFile(self.path('copy.idngram.txt'), self.ascii)
+        # The tools read what write_idngram writes
+        cmuclmtk.mergeidngram(self.path('merged.idngram.txt'), [self.path('copy.idngram')], ascii_output=True)
+        self.assertSameFile(self.path('merged.idngram.txt'), self.ascii)
+
+    def test_other_layouts(self):
+        from cmuclmtk import idngram
+        ngrams = idngram.open_idngram(self.binary)
+        path = self.path('little.idngram')
+        idngram.write_idngram(path, ngrams, id_size=2, byteorder='<')
+        self.assertEqual(os.path.getsize(path), len(ngrams) * (3 * 2 + 4))
+        copy = idngram.open_idngram(path, id_size=2, byteorder='<')
+        numpy.testing.assert_array_equal(copy['ids'], ngrams['ids'])
+        numpy.testing.assert_array_equal(copy['count'], ngrams['count'])
+
+    def test_modify_in_place(self):
+        from cmuclmtk import idngram
+        shutil.copyfile(self.binary, self.path('copy.idngram'))
+        ngrams = idngram.open_idngram(self.path('copy.idngram'), mode='r+')
+        ngrams['count'] *= 2
+        ngrams.flush()
+        del ngrams
+        numpy.testing.assert_array_equal(idngram.open_idngram(self.path('copy.idngram'))['count'],
+                                         idngram.open_idngram(self.binary)['count'] * 2)
+
+    def test_filter_and_statistics(self):
+        from cmuclmtk import idngram
+        counts = numpy.array(idngram.open_idngram(self.binary)['count'])
+        written = idngram.filter_idngram(self.binary, self.path('filtered.idngram'), min_count=2)
+        self.assertEqual(written, int((counts >= 2).sum()))
+        self.assertGreater(written, 0)
+        self.assertLess(written, len(counts))
+        numpy.testing.assert_array_equal(idngram.open_idngram(self.path('filtered.idngram'))['count'], counts[counts >= 2])
+
+        fof = idngram.count_of_counts(self.binary, max_count=5)
+        self.assertEqual(len(fof), 6)
+        for count in range(1, 6):
+            self.assertEqual(fof[count], int((counts == count).sum()))
+        numpy.testing.assert_array_equal(idngram.count_of_counts(self.ascii, max_count=5, ascii_input=True), fof)
+
+    def test_invalid_files(self):
+        from cmuclmtk import idngram
+        with open(self.path('empty.idngram'), 'wb'):
+            pass
+        self.assertEqual(len(idngram.open_idngram(self.path('empty.idngram'))), 0)
+        self.assertEqual(list(idngram.iter_idngram(self.path('empty.idngram'))), [])
+        with open(self.path('truncated.idngram'), 'wb') as f:
+            with open(self.binary, 'rb') as g:
+                f.write(g.read()[:-1])
+        with self.assertRaises(ValueError):
+            idngram.open_idngram(self.path('truncated.idngram'))
+
+    def test_read_vocab_ids(self):
+        from cmuclmtk import idngram
+        with open(self.path('test.vocab'), 'wb') as f:
+            f.write(b'## comment\n<s>\n</s>\n\nword\n')
+        self.assertEqual(idngram.read_vocab_ids(self.path('test.vocab')), {b'<s>': 1, b'</s>': 2, b'word': 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import glob
+import pathlib
+import unittest
+
+import cmuclmtk
+from cmuclmtk.incremental import IncrementalLM, merge_wfreq
+from benchmarks import generate_corpus
+from . import ToolTestCase
+
+class IncrementalTest(ToolTestCase):
+    def setUp(self):
+        super(IncrementalTest, self).setUp()
+        self.first = self.corpus()
+        self.second = self.path('second.txt')
+        generate_corpus(self.second, 100000, vocab_size=2000, seed=1)
+        self.directory = self.path('model')
+
+    def expected_lm(self, corpora, vocab_file):
+        """
+            Builds the model of the corpora from scratch: every corpus is counted separately and the id n-grams are merged.
+        """
+        idngram_files = []
+        for i, corpus in enumerate(corpora):
+            idngram_files.append(self.path('expected-%d.idngram' % i))
+            cmuclmtk.text2idngram(pathlib.Path(corpus), vocab_file, idngram_files[-1])
+        cmuclmtk.mergeidngram(self.path('expected.idngram'), idngram_files)
+        cmuclmtk.idngram2lm(self.path('expected.idngram'), vocab_file, self.path('expected.lm'))
+        return self.path('expected.lm')
+
+    def test_incremental_update(self):
+        vocab_file = self.vocab(self.first)
+        lm = IncrementalLM(self.directory, vocab_file=vocab_file)
+        lm.build(pathlib.Path(self.first))
+        self.assertTrue(lm.update(pathlib.Path(self.second)))
+        self.assertSameFile(lm.lm_file, self.expected_lm([self.first, self.second], vocab_file))
+        self.assertFalse(lm.needs_rebuild())
+
+    def test_reopen(self):
+        vocab_file = self.vocab(self.first)
+        IncrementalLM(self.directory, vocab_file=vocab_file).build(pathlib.Path(self.first))
+        lm = IncrementalLM(self.directory, vocab_file=vocab_file)
+        self.assertEqual(lm.meta['corpora'], [os.path.abspath(self.first)])
+        with open(self.second) as f:
+            self.assertTrue(lm.update(f.read()))
+        # Strings are spooled into the directory
+        self.assertEqual(len(glob.glob(os.path.join(self.directory, 'corpus-*.txt'))), 1)
+        self.assertSameFile(lm.lm_file, self.expected_lm([self.first, self.second], vocab_file))
+
+    def test_vocabulary_change(self):
+        lm = IncrementalLM(self.directory, wfreq2vocab_kwargs={'top': 500})
+        lm.build(pathlib.Path(self.first))
+        new_words = ' '.join(['newword'] * 5000) + '\n'
+        self.assertTrue(lm.needs_rebuild(self.write_wfreq(lm, new_words)))
+
+        # Without rebuilds, the vocabulary is kept
+        self.assertTrue(lm.update(new_words, allow_rebuild=False))
+        self.assertNotIn(b'newword', self.read(lm.vocab_file))
+
+        # The vocabulary changes, so the model is rebuilt from all corpora
+        self.assertFalse(lm.update(new_words))
+        self.assertIn(b'newword', self.read(lm.vocab_file))
+        self.assertEqual(len(lm.meta['corpora']), 3)
+        self.assertSameFile(lm.lm_file, self.expected_lm(lm.meta['corpora'], lm.vocab_file))
+
+    def test_other_settings_rebuild(self):
+        vocab_file = self.vocab(self.first)
+        IncrementalLM(self.directory, vocab_file=vocab_file).build(pathlib.Path(self.first))
+        lm = IncrementalLM(self.directory, n=2, vocab_file=vocab_file)
+        self.assertTrue(lm.needs_rebuild())
+        self.assertFalse(lm.update(pathlib.Path(self.second)))
+
+    def test_failed_update_removes_spooled_corpus(self):
+        vocab_file = self.vocab(self.first)
+        lm = IncrementalLM(self.directory, vocab_file=vocab_file)
+        lm.build(pathlib.Path(self.first))
+        self.add_tool('text2wfreq', 'exit 1\n')
+        with self.assertRaises(cmuclmtk.ConversionError):
+            lm.update('some new text\n')
+        with self.assertRaises(cmuclmtk.ConversionError):
+            lm.build('some new text\n')
+        self.assertEqual(glob.glob(os.path.join(self.directory, 'corpus-*.txt')), [])
+        # Corpora given as paths are never removed
+        with self.assertRaises(cmuclmtk.ConversionError):
+            lm.update(pathlib.Path(self.second))
+        self.assertTrue(os.path.exists(self.second))
+
+    def test_merge_wfreq(self):
+        with open(self.path('a.wfreq'), 'wb') as f:
+            f.write(b'a 1\nb 2\n')
+        with open(self.path('b.wfreq'), 'wb') as f:
+            f.write(b'b 3\nc 4\n\n')
+        merge_wfreq([self.path('a.wfreq'), self.path('b.wfreq')], self.path('merged.wfreq'))
+        self.assertEqual(self.read(self.path('merged.wfreq')), b'a 1\nb 5\nc 4\n')
+
+    def write_wfreq(self, lm, text):
+        cmuclmtk.text2wfreq(text, self.path('new.wfreq'))
+        merge_wfreq([lm.wfreq_file, self.path('new.wfreq')], self.path('merged.wfreq'))
+        return self.path('merged.wfreq')
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+if __name__ == '__main__':
+    unittest.main()
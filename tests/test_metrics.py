@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import unittest
+
+import cmuclmtk
+from cmuclmtk import metrics
+from . import ToolTestCase
+
+MB = 1024 * 1024
+
+class MetricsTest(ToolTestCase):
+    def test_tool_records(self):
+        text = 'a b c a b\n' * 1000
+        with metrics.collect() as records:
+            cmuclmtk.text2vocab(text, self.path('out.vocab'))
+        self.assertEqual([record.stage for record in records], ['text2wfreq', 'wfreq2vocab', 'text2vocab'])
+        text2wfreq, wfreq2vocab, pipeline = records
+        self.assertEqual(text2wfreq.cmd[0], 'text2wfreq')
+        self.assertEqual(text2wfreq.exitcode, 0)
+        self.assertEqual(text2wfreq.bytes_in, len(text))
+        self.assertEqual(text2wfreq.bytes_out, wfreq2vocab.bytes_in)
+        self.assertEqual(wfreq2vocab.bytes_out, os.path.getsize(self.path('out.vocab')))
+        self.assertIsNotNone(text2wfreq.user_time)
+        self.assertIsNotNone(text2wfreq.temp_disk)
+
+        self.assertIsNone(pipeline.cmd)
+        self.assertEqual(pipeline.tools, 2)
+        self.assertEqual(pipeline.bytes_in, text2wfreq.bytes_in + wfreq2vocab.bytes_in)
+        self.assertGreaterEqual(pipeline.wall_time, text2wfreq.wall_time + wfreq2vocab.wall_time)
+
+    def test_failing_hook(self):
+        def hook(record):
+            raise RuntimeError("Broken hook")
+        metrics.add_hook(hook)
+        try:
+            with metrics.collect() as records:
+                cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'))
+        finally:
+            metrics.remove_hook(hook)
+        self.assertEqual(len(records), 1)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/status'), "Peak memory is only measured where /proc is available")
+    def test_max_rss_is_the_tools_own(self):
+        self.add_tool('text2wfreq', 'cat >/dev/null\nsleep 0.3\n')
+        # Touch every page, so that they count towards the peak memory of this process
+        ballast = bytearray(b'\x01') * (400 * MB)
+        with metrics.collect() as records:
+            cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'))
+        del ballast
+        self.assertIsNotNone(records[0].max_rss)
+        self.assertLess(records[0].max_rss, 100 * MB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import pathlib
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import cmuclmtk
+from cmuclmtk.cache import ArtifactCache
+from cmuclmtk.evallm import EvalLM
+from benchmarks import generate_corpus, install_standins
+from . import ToolTestCase
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class EMTest(unittest.TestCase):
+    def test_better_model_gets_more_weight(self):
+        from cmuclmtk.mixture import em_weights
+        probs = numpy.array([[0.5, 0.4, 0.1, 0.6, 0.5],
+                             [0.1, 0.1, 0.3, 0.1, 0.2]])
+        weights, perplexity, iterations = em_weights(probs)
+        self.assertAlmostEqual(sum(weights), 1.0)
+        self.assertGreater(weights[0], 0.5)
+        self.assertGreater(iterations, 1)
+        # Models that are good on different words are better together
+        probs = numpy.array([[0.5, 0.05], [0.05, 0.5]])
+        weights, perplexity, _ = em_weights(probs)
+        self.assertAlmostEqual(weights[0], 0.5)
+        for model in probs:
+            self.assertLess(perplexity, numpy.exp(-numpy.mean(numpy.log(model))))
+        # A model that never helps ends up with no weight
+        weights, _, _ = em_weights(numpy.array([[0.5, 0.5], [0.1, 0.1]]), stop_ratio=1.0, max_iterations=200)
+        self.assertLess(weights[1], 0.01)
+
+    def test_initial_weights(self):
+        from cmuclmtk.mixture import em_weights
+        probs = numpy.array([[0.2, 0.2], [0.2, 0.2]])
+        weights, perplexity, iterations = em_weights(probs, weights=[0.3, 0.7])
+        self.assertEqual(list(weights), [0.3, 0.7])
+        self.assertAlmostEqual(perplexity, 5.0)
+        self.assertEqual(iterations, 2)
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class EstimateWeightsTest(ToolTestCase):
+    def setUp(self):
+        super(EstimateWeightsTest, self).setUp()
+        first = self.corpus()
+        second = self.path('second.txt')
+        generate_corpus(second, 200000, vocab_size=2000, exponent=0.5, seed=1)
+        self.vocab_file = self.vocab(first)
+        self.lm_files = [self.path('first.lm'), self.path('second.lm')]
+        for corpus, lm_file in zip((first, second), self.lm_files):
+            cmuclmtk.text2lm(pathlib.Path(corpus), lm_file, vocab_file=self.vocab_file, in_process=False)
+        with open(first) as f:
+            self.text = ' '.join(f.read().split()[:2000])
+
+    def test_estimate_weights(self):
+        from cmuclmtk.mixture import estimate_weights
+        result = estimate_weights(self.lm_files, self.text, stop_ratio=0.99999)
+        self.assertAlmostEqual(sum(result.weights), 1.0)
+        self.assertGreater(result.weights[0], result.weights[1])
+        for lm_file in self.lm_files:
+            with EvalLM(lm_file) as evallm:
+                single = evallm.perplexity(self.text)
+            self.assertEqual(result.words, single.words)
+            self.assertLessEqual(result.perplexity, single.perplexity * 1.001)
+
+    def test_no_models(self):
+        from cmuclmtk.mixture import estimate_weights
+        for workers in (None, 2):
+            with self.assertRaisesRegex(ValueError, 'at least one language model'):
+                estimate_weights([], self.text, workers=workers)
+
+    def test_read_probs(self):
+        from cmuclmtk.mixture import read_probs, word_probs
+        word_probs(self.lm_files[0], self.text, self.path('text.fprobs'))
+        probs = read_probs(self.path('text.fprobs'))
+        with EvalLM(self.lm_files[0]) as evallm:
+            result = evallm.perplexity(self.text)
+        self.assertEqual(len(probs), result.words)
+        self.assertTrue(((probs > 0) & (probs <= 1)).all())
+        self.assertAlmostEqual(numpy.exp(-numpy.mean(numpy.log(probs))) / result.perplexity, 1.0, places=3)
+
+    def test_cache(self):
+        from cmuclmtk.mixture import estimate_weights
+        cache = ArtifactCache(self.path('cache'))
+        text_file = self.path('heldout.txt')
+        with open(text_file, 'w') as f:
+            f.write(self.text)
+        expected = estimate_weights(self.lm_files, pathlib.Path(text_file), cache=cache)
+        # The probability streams come from the cache, so evallm isn't run again
+        self.add_tool('evallm', 'exit 1\n')
+        try:
+            result = estimate_weights(self.lm_files, pathlib.Path(text_file), cache=cache)
+            self.assertEqual(result.weights, expected.weights)
+            self.assertEqual(result.perplexity, expected.perplexity)
+            # A new model has to be evaluated
+            with open(self.lm_files[0]) as f, open(self.path('third.lm'), 'w') as out_f:
+                out_f.write(f.read() + '\n')
+            with self.assertRaises(cmuclmtk.ConversionError):
+                estimate_weights(self.lm_files + [self.path('third.lm')], pathlib.Path(text_file), cache=cache)
+        finally:
+            install_standins(self.bindir)
+            cmuclmtk.get_toolchain().clear()
+
+if __name__ == '__main__':
+    unittest.main()
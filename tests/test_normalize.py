@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import pathlib
+import tempfile
+import unittest
+
+import cmuclmtk
+from cmuclmtk.normalize import Normalizer, normalize
+from . import ToolTestCase
+
+RAW_TEXT = '''The Quick brown fox. It jumped!
+<p>
+Don't panic, it's 42 o'clock?  Really.
+<s> Already Marked </s>
+...
+'''
+
+class UpperNormalizer(Normalizer):
+    """
+        Subclass that has to be pickled to the workers.
+    """
+    def normalize_sentence(self, sentence):
+        sentence = super(UpperNormalizer, self).normalize_sentence(sentence)
+        return sentence and sentence.upper()
+
+class NormalizerTest(unittest.TestCase):
+    def normalized(self, normalizer, text=RAW_TEXT):
+        return normalizer.normalize_lines(text.splitlines()).decode('utf-8').splitlines()
+
+    def test_defaults(self):
+        self.assertEqual(self.normalized(Normalizer()), [
+            '<s> the quick brown fox it jumped </s>',
+            '<s> p </s>',
+            "<s> don't panic it's 42 o'clock really </s>",
+            '<s> already marked </s>'])
+
+    def test_sentences_and_context_cues(self):
+        normalizer = Normalizer(sentence_pattern=r'(?<=[.!?])\s+', context_cues=['<p>'])
+        self.assertEqual(self.normalized(normalizer), [
+            '<s> the quick brown fox </s>',
+            '<s> it jumped </s>',
+            '<s> <p> </s>',
+            "<s> don't panic it's 42 o'clock </s>",
+            '<s> really </s>',
+            '<s> already marked </s>'])
+
+    def test_options(self):
+        normalizer = Normalizer(case_fold=False, token_pattern=None, sentence_markers=False)
+        self.assertEqual(self.normalized(normalizer), [
+            'The Quick brown fox. It jumped!',
+            '<p>',
+            "Don't panic, it's 42 o'clock? Really.",
+            '<s> Already Marked </s>',
+            '...'])
+        self.assertIsNone(Normalizer(sentence_markers=False).normalize_sentence('...'))
+        self.assertEqual(Normalizer().normalize_lines([b'\xc3\x84RGER\n']), '<s> ärger </s>\n'.encode('utf-8'))
+
+    def test_context_cues_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            Normalizer(context_cues=['<p>']).write_context_cues(path)
+            with open(path) as f:
+                self.assertEqual(f.read().split(), ['</s>', '<p>', '<s>'])
+        finally:
+            os.remove(path)
+
+class NormalizeTest(ToolTestCase):
+    def test_pool_equals_serial(self):
+        corpus = self.corpus(50000)
+        with open(corpus) as f:
+            raw = f.read().replace(' 1 ', ' One, ')
+        serial = b''.join(normalize(raw, workers=1))
+        self.assertTrue(serial)
+        texts = {'string': lambda: raw, 'bytes': lambda: raw.encode('utf-8'), 'path': lambda: pathlib.Path(corpus),
+                 'lines': lambda: iter(raw.splitlines(True)), 'file': lambda: open(corpus)}
+        expected_path = b''.join(normalize(pathlib.Path(corpus), workers=1))
+        for name, text in texts.items():
+            with self.subTest(text=name):
+                result = b''.join(normalize(text(), workers=3, chunk_lines=7))
+                self.assertEqual(result, expected_path if name in ('path', 'file') else serial)
+
+    def test_subclass(self):
+        result = b''.join(normalize(RAW_TEXT, UpperNormalizer(), workers=2, chunk_lines=1))
+        self.assertEqual(result.decode('utf-8').splitlines()[0], '<S> THE QUICK BROWN FOX IT JUMPED </S>')
+
+    def test_text2lm(self):
+        corpus = self.corpus()
+        normalizer = Normalizer(context_cues=['<p>'])
+        with open(self.path('normalized.txt'), 'wb') as f:
+            for chunk in normalize(pathlib.Path(corpus), normalizer, workers=1):
+                f.write(chunk)
+        cmuclmtk.text2lm(pathlib.Path(self.path('normalized.txt')), self.path('expected.lm'), in_process=False)
+        for workers in (1, 2):
+            with self.subTest(normalize_workers=workers):
+                cmuclmtk.text2lm(pathlib.Path(corpus), self.path('corpus.lm'), normalizer=normalizer, normalize_workers=workers, in_process=False)
+                self.assertSameFile(self.path('corpus.lm'), self.path('expected.lm'))
+
+if __name__ == '__main__':
+    unittest.main()
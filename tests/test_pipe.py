@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import pathlib
+import unittest
+
+import cmuclmtk
+from cmuclmtk import metrics
+from cmuclmtk.cache import ArtifactCache
+from benchmarks import install_standins
+from . import ToolTestCase
+
+def lines(path):
+    with open(path) as f:
+        for line in f:
+            yield line
+
+def option(cmd, name):
+    return cmd[cmd.index(name) + 1]
+
+@unittest.skipUnless(hasattr(os, 'mkfifo'), "Named pipes are not available")
+class PipeTest(ToolTestCase):
+    def texts(self, corpus):
+        with open(corpus) as f:
+            text = f.read()
+        return {'path': lambda: pathlib.Path(corpus), 'string': lambda: text, 'lines': lambda: lines(corpus)}
+
+    def test_text2vocab(self):
+        corpus = self.corpus()
+        cmuclmtk.text2vocab(pathlib.Path(corpus), self.path('expected.vocab'))
+        for name, text in self.texts(corpus).items():
+            with self.subTest(text=name):
+                cmuclmtk.text2vocab(text(), self.path('pipe.vocab'), pipe=True)
+                self.assertSameFile(self.path('pipe.vocab'), self.path('expected.vocab'))
+
+    def test_text2lm(self):
+        corpus = self.corpus()
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('expected.lm'), in_process=False)
+        for name, text in self.texts(corpus).items():
+            for workers in (1, 2):
+                with self.subTest(text=name, workers=workers):
+                    with metrics.collect() as records:
+                        cmuclmtk.text2lm(text(), self.path('pipe.lm'), pipe=True, workers=workers, in_process=False)
+                    self.assertSameFile(self.path('pipe.lm'), self.path('expected.lm'))
+                    # idngram2lm read the id n-grams from a named pipe, which is gone now
+                    path = option(self.record(records, 'idngram2lm').cmd, '-idngram')
+                    self.assertEqual(os.path.basename(path), 'idngram')
+                    self.assertFalse(os.path.exists(path))
+
+    def test_fallback_to_temporary_file(self):
+        corpus = self.corpus()
+        cmuclmtk.text2lm(pathlib.Path(corpus), self.path('expected.lm'), in_process=False)
+        # The id n-grams are read twice with a cache, so they can't go through a pipe
+        with metrics.collect() as records:
+            cmuclmtk.text2lm(pathlib.Path(corpus), self.path('pipe.lm'), pipe=True, cache=ArtifactCache(self.path('cache')), in_process=False)
+        self.assertSameFile(self.path('pipe.lm'), self.path('expected.lm'))
+        self.assertNotEqual(os.path.basename(option(self.record(records, 'idngram2lm').cmd, '-idngram')), 'idngram')
+
+    def record(self, records, stage):
+        return [record for record in records if record.stage == stage][0]
+
+    def test_failures(self):
+        corpus = pathlib.Path(self.corpus())
+        vocab = self.vocab(str(corpus))
+        for tool, pipeline in (('text2wfreq', 'text2vocab'), ('wfreq2vocab', 'text2vocab'),
+                               ('text2idngram', 'text2lm'), ('idngram2lm', 'text2lm')):
+            with self.subTest(tool=tool):
+                self.add_tool(tool, 'exit 3\n')
+                try:
+                    with self.assertRaises(cmuclmtk.ConversionError) as cm:
+                        if pipeline == 'text2vocab':
+                            cmuclmtk.text2vocab(corpus, self.path('failed.vocab'), pipe=True)
+                        else:
+                            cmuclmtk.text2lm(corpus, self.path('failed.lm'), vocab_file=vocab, pipe=True, in_process=False)
+                    self.assertIn(tool, str(cm.exception))
+                finally:
+                    install_standins(self.bindir)
+                    cmuclmtk.get_toolchain().clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import sys
+import time
+import unittest
+
+import cmuclmtk
+from cmuclmtk import policy
+from . import ToolTestCase
+
+class PolicyTest(ToolTestCase):
+    def test_timeout(self):
+        # The background sleep keeps stderr open unless the whole process group is killed
+        self.add_tool('text2wfreq', 'sleep 30 &\nsleep 30\n')
+        start = time.time()
+        with self.assertRaises(cmuclmtk.LimitExceededError) as cm:
+            cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'), policy=cmuclmtk.ExecutionPolicy(timeout=1))
+        self.assertEqual(cm.exception.limit, policy.TIMEOUT)
+        self.assertLess(time.time() - start, policy.STDERR_GRACE)
+
+    @unittest.skipIf(policy.resource is None, "Resource limits are not supported on this platform")
+    def test_memory_limit(self):
+        self.add_tool('text2wfreq', 'exec "%s" -c "bytearray(1 << 31)"\n' % sys.executable)
+        with self.assertRaises(cmuclmtk.LimitExceededError) as cm:
+            cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'), policy=cmuclmtk.ExecutionPolicy(memory_limit=512 * 1024**2))
+        self.assertEqual(cm.exception.limit, policy.MEMORY)
+
+    def test_progress_is_no_breach(self):
+        self.add_tool('text2wfreq', 'echo "Allocating memory for the n-gram buffer..." >&2\nexit 1\n')
+        with self.assertRaises(cmuclmtk.ConversionError) as cm:
+            cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'), policy=cmuclmtk.ExecutionPolicy(memory_limit=512 * 1024**2))
+        self.assertNotIsInstance(cm.exception, cmuclmtk.LimitExceededError)
+
+if __name__ == '__main__':
+    unittest.main()
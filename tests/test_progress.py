@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import pathlib
+import asyncio
+import threading
+import unittest
+
+import cmuclmtk
+from cmuclmtk import progress
+from . import ToolTestCase
+
+TEXT2IDNGRAM_OUTPUT = (b'text2idngram\n'
+                       b'10,000 n-grams processed for each ".", 1,000,000 for each line.\n'
+                       b'.....\n'
+                       b'...\n'
+                       b'Sorting n-grams\n'
+                       b'Writing sorted n-grams to temporary file /tmp/text2idngram.temp.1\n'
+                       b'Writing sorted n-grams to temporary file /tmp/text2idngram.temp.2\n'
+                       b'Merging 2 temporary files...\n'
+                       b'text2idngram : Done.\n')
+
+def parse(chunks, cmd=('text2idngram',)):
+    events = []
+    parser = progress.ProgressParser(list(cmd), [events.append])
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser, [(event.kind, event.value) for event in events]
+
+class ParserTest(unittest.TestCase):
+    def test_events(self):
+        parser, events = parse([TEXT2IDNGRAM_OUTPUT])
+        self.assertEqual(events, [(progress.MESSAGE, None),
+                                  (progress.NGRAMS, 50000), (progress.NGRAMS, 80000),
+                                  (progress.SORTING, None),
+                                  (progress.TEMP_FILE, 1), (progress.TEMP_FILE, 2),
+                                  (progress.MERGING, 2),
+                                  (progress.DONE, None)])
+        self.assertEqual(parser.last_lines[-1], 'text2idngram : Done.')
+        self.assertNotIn('.....', parser.last_lines)
+
+    def test_chunks(self):
+        # Dots are reported as they arrive, also without the end of their line
+        _, events = parse([TEXT2IDNGRAM_OUTPUT[i:i+1] for i in range(len(TEXT2IDNGRAM_OUTPUT))])
+        ngrams = [value for kind, value in events if kind == progress.NGRAMS]
+        self.assertEqual(ngrams, list(range(10000, 90000, 10000)))
+        _, whole = parse([TEXT2IDNGRAM_OUTPUT])
+        self.assertEqual([event for event in events if event[0] != progress.NGRAMS], [event for event in whole if event[0] != progress.NGRAMS])
+
+    def test_default_dots(self):
+        _, events = parse([b'..', b'.\n'], cmd=['idngram2lm'])
+        self.assertEqual(events, [(progress.NGRAMS, 2 * progress.NGRAMS_PER_DOT), (progress.NGRAMS, 3 * progress.NGRAMS_PER_DOT)])
+
+    def test_idngram2lm_phases(self):
+        _, events = parse([b'Calculating discounted counts.\nCalculating back-off weights...\nWriting out language model...\nidngram2lm : Done.\n'], cmd=['idngram2lm'])
+        self.assertEqual([kind for kind, _ in events], [progress.DISCOUNTING, progress.BACKOFF, progress.WRITING, progress.DONE])
+
+    def test_last_lines(self):
+        parser, _ = parse([b''.join(b'line %d\n' % i for i in range(100)), b'no newline'])
+        self.assertEqual(list(parser.last_lines), ['line %d' % i for i in range(81, 100)] + ['no newline'])
+
+    def test_long_line(self):
+        parser, events = parse([b'x' * (progress.MAX_LINE_LENGTH + 1), b'y\n'])
+        self.assertEqual(events, [(progress.MESSAGE, None), (progress.MESSAGE, None)])
+
+    def test_failing_listener(self):
+        def fail(event):
+            raise RuntimeError('listener failed')
+        events = []
+        parser = progress.ProgressParser(['text2idngram'], [fail, events.append])
+        parser.feed(TEXT2IDNGRAM_OUTPUT)
+        self.assertEqual(len(events), 8)
+
+class ToolProgressTest(ToolTestCase):
+    def test_iter_events(self):
+        corpus = pathlib.Path(self.corpus(1000000))
+        events = progress.iter_events(cmuclmtk.text2lm, corpus, self.path('corpus.lm'), in_process=False)
+        kinds = {}
+        ngrams = []
+        while True:
+            try:
+                event = next(events)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            kinds.setdefault(event.tool, []).append(event.kind)
+            if event.kind == progress.NGRAMS and event.tool == 'text2idngram':
+                ngrams.append(event.value)
+        self.assertEqual(len(result), 2)
+        self.assertTrue(ngrams)
+        self.assertEqual(ngrams, sorted(ngrams))
+        for kind in (progress.NGRAMS, progress.SORTING, progress.DONE):
+            self.assertIn(kind, kinds['text2idngram'])
+        for kind in (progress.DISCOUNTING, progress.WRITING, progress.DONE):
+            self.assertIn(kind, kinds['idngram2lm'])
+
+    def test_iter_events_error(self):
+        self.add_tool('text2wfreq', 'echo "text2wfreq : Failed." >&2\nexit 1\n')
+        events = []
+        with self.assertRaises(cmuclmtk.ConversionError):
+            for event in progress.iter_events(cmuclmtk.text2wfreq, 'some text', self.path('wfreq')):
+                events.append(event)
+        self.assertEqual([event.message for event in events], ['text2wfreq : Failed.'])
+
+    def test_listeners(self):
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        own = []
+        everywhere = []
+        progress.add_listener(everywhere.append)
+        try:
+            with progress.listen(own.append):
+                # Tools of other threads are only seen by global listeners
+                thread = threading.Thread(target=cmuclmtk.text2wfreq, args=(pathlib.Path(corpus), self.path('other.wfreq')))
+                thread.start()
+                thread.join()
+                # Worker threads of the wrappers report to the listeners of the calling thread
+                cmuclmtk.sharded_text2idngram(corpus, vocab, self.path('corpus.idngram'), workers=2)
+        finally:
+            progress.remove_listener(everywhere.append)
+        self.assertEqual(set(event.tool for event in own), {'text2idngram', 'mergeidngram'})
+        self.assertEqual(set(event.tool for event in everywhere), {'text2wfreq', 'text2idngram', 'mergeidngram'})
+        self.assertEqual(len([event for event in own if event.kind == progress.DONE and event.tool == 'text2idngram']), 2)
+
+    def test_aio(self):
+        from cmuclmtk import aio
+        corpus = self.corpus()
+        vocab = self.vocab(corpus)
+        events = []
+        with progress.listen(events.append):
+            asyncio.run(aio.text2idngram(pathlib.Path(corpus), vocab, self.path('corpus.idngram')))
+        self.assertIn(progress.NGRAMS, [event.kind for event in events])
+        self.assertEqual(events[-1].kind, progress.DONE)
+
+if __name__ == '__main__':
+    unittest.main()
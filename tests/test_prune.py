@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import math
+import unittest
+import collections
+
+from cmuclmtk.prune import prune_arpa
+from . import ToolTestCase
+
+DISCOUNT = 0.5
+
+def write_arpa(path, sentences, order=3):
+    """
+        Writes a back-off model with absolute discounting of the sentences (lists of words, including <s> and </s>) to path.
+    """
+    counts = dict((k, collections.Counter()) for k in range(1, order + 1))
+    for words in sentences:
+        for k in range(1, order + 1):
+            for i in range(len(words) - k + 1):
+                counts[k][tuple(words[i:i+k])] += 1
+    # <s> is never predicted
+    total = float(sum(counts[1].values()) - counts[1][('<s>',)])
+    probs = {1: dict((ngram, count / total) for ngram, count in counts[1].items())}
+    probs[1][('<s>',)] = 0.0
+    bows = {}
+
+    def prob(ngram):
+        if ngram in probs[len(ngram)]:
+            return probs[len(ngram)][ngram]
+        return bows.get(ngram[:-1], 1.0) * prob(ngram[1:])
+
+    for k in range(2, order + 1):
+        context_counts = collections.Counter()
+        for ngram, count in counts[k].items():
+            context_counts[ngram[:-1]] += count
+        probs[k] = dict((ngram, (count - DISCOUNT) / context_counts[ngram[:-1]]) for ngram, count in counts[k].items())
+        seen = collections.defaultdict(lambda: [0.0, 0.0])
+        for ngram, p in probs[k].items():
+            seen[ngram[:-1]][0] += p
+            seen[ngram[:-1]][1] += prob(ngram[1:])
+        for context, (sum_prob, sum_lower) in seen.items():
+            bows[context] = (1.0 - sum_prob) / (1.0 - sum_lower)
+
+    log10 = lambda p: math.log10(p) if p > 0 else -99.0
+    with open(path, 'w') as f:
+        f.write('\\data\\\n')
+        for k in range(1, order + 1):
+            f.write('ngram %d=%d\n' % (k, len(probs[k])))
+        for k in range(1, order + 1):
+            f.write('\n\\%d-grams:\n' % k)
+            for ngram in sorted(probs[k]):
+                if k < order:
+                    f.write('%.8f %s %.8f\n' % (log10(probs[k][ngram]), ' '.join(ngram), log10(bows.get(ngram, 1.0))))
+                else:
+                    f.write('%.8f %s\n' % (log10(probs[k][ngram]), ' '.join(ngram)))
+        f.write('\n\\end\\\n')
+
+def read_arpa(path):
+    """
+        Returns the log10 probabilities and back-off weights of an ARPA model, by order.
+    """
+    probs = collections.defaultdict(dict)
+    bows = collections.defaultdict(dict)
+    order = 0
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if line.startswith('\\') and line.strip().endswith('-grams:'):
+                order = int(line[1:line.index('-')])
+            elif order and len(fields) > order:
+                ngram = tuple(fields[1:order+1])
+                probs[order][ngram] = float(fields[0])
+                if len(fields) > order + 1:
+                    bows[order][ngram] = float(fields[order+1])
+    return probs, bows
+
+def logprob(probs, bows, ngram):
+    if ngram in probs[len(ngram)]:
+        return probs[len(ngram)][ngram]
+    return bows[len(ngram) - 1].get(ngram[:-1], 0.0) + logprob(probs, bows, ngram[1:])
+
+class PruneTest(ToolTestCase):
+    def sentences(self):
+        with open(self.corpus(20000, vocab_size=200)) as f:
+            return [line.split() for line in f if line.strip()]
+
+    def assertNormalized(self, path):
+        probs, bows = read_arpa(path)
+        vocab = [ngram for ngram in probs[1]]
+        for k in (1, 2):
+            for context in bows[k]:
+                total = sum(10 ** logprob(probs, bows, context + word) for word in vocab)
+                self.assertAlmostEqual(total, 1.0, places=4, msg="P(w | %s) sums to %f" % (' '.join(context), total))
+
+    def test_normalized(self):
+        lm_file = self.path('corpus.lm')
+        write_arpa(lm_file, self.sentences())
+        self.assertNormalized(lm_file)
+
+        counts, _ = read_arpa(lm_file)
+        for kwargs in ({'threshold': 1e-6}, {'target_size': 1000}):
+            with self.subTest(**kwargs):
+                pruned_file = self.path('pruned.lm')
+                kept = prune_arpa(lm_file, pruned_file, **kwargs)
+                pruned, _ = read_arpa(pruned_file)
+                self.assertEqual(kept, dict((k, len(pruned[k])) for k in (1, 2, 3)))
+                self.assertLess(kept[2] + kept[3], len(counts[2]) + len(counts[3]))
+                self.assertEqual(kept[1], len(counts[1]))
+                self.assertNormalized(pruned_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import asyncio
+import unittest
+
+import cmuclmtk
+import cmuclmtk.aio
+from . import ToolTestCase
+
+# Writes the directory the tool runs in to stdout and leaves a file behind there
+LITTERING_TOOL = 'cat >/dev/null\npwd\ntouch litter\n'
+
+class ScratchDirTest(ToolTestCase):
+    def setUp(self):
+        super(ScratchDirTest, self).setUp()
+        self._cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        super(ScratchDirTest, self).tearDown()
+
+    def assertScratchDir(self, output_file):
+        with open(output_file) as f:
+            cwd = f.read().strip()
+        self.assertNotEqual(os.path.realpath(cwd), os.path.realpath(self.tmpdir))
+        self.assertFalse(os.path.exists(cwd))
+        self.assertFalse(os.path.exists(self.path('litter')))
+        self.assertEqual(os.getcwd(), self.tmpdir)
+
+    def test_blocking(self):
+        self.add_tool('text2wfreq', LITTERING_TOOL)
+        cmuclmtk.text2wfreq('a b c', 'out.wfreq')
+        self.assertScratchDir(self.path('out.wfreq'))
+
+    def test_aio(self):
+        self.add_tool('text2wfreq', LITTERING_TOOL)
+        self.add_tool('wfreq2vocab', LITTERING_TOOL)
+        asyncio.run(cmuclmtk.aio.text2wfreq('a b c', 'out.wfreq'))
+        self.assertScratchDir(self.path('out.wfreq'))
+        asyncio.run(cmuclmtk.aio.wfreq2vocab('out.wfreq', 'out.vocab'))
+        self.assertScratchDir(self.path('out.vocab'))
+
+    def test_relative_paths(self):
+        # Paths on the command line are relative to the directory of the caller, not the scratch directory
+        with open('model.binlm', 'w') as f:
+            f.write('model')
+        cmuclmtk.binlm2arpa('model.binlm', 'blocking.arpa')
+        asyncio.run(cmuclmtk.aio.binlm2arpa('model.binlm', 'aio.arpa'))
+        self.assertSameFile('model.binlm', 'blocking.arpa')
+        self.assertSameFile('model.binlm', 'aio.arpa')
+
+    def test_failing_tool(self):
+        self.add_tool('text2wfreq', 'pwd > "%s"\ntouch litter\nexit 1\n' % self.path('where'))
+        with self.assertRaises(cmuclmtk.ConversionError):
+            cmuclmtk.text2wfreq('a b c', 'out.wfreq')
+        self.assertScratchDir(self.path('where'))
+
+if __name__ == '__main__':
+    unittest.main()
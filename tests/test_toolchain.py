@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import os
+import sys
+import subprocess
+import unittest
+
+import cmuclmtk
+from cmuclmtk import toolchain
+from . import ToolTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ToolchainTest(ToolTestCase):
+    def test_import_without_tools(self):
+        # Importing doesn't look up any tools, nor load the submodules and parts of the standard library only some functions need
+        script = ("import sys, cmuclmtk; "
+                  "print(' '.join(name for name in ('multiprocessing', 'concurrent.futures', 'hashlib', 'pathlib', 'cmuclmtk.normalize', 'cmuclmtk.tuning', 'cmuclmtk.metrics') if name in sys.modules))")
+        env = dict(os.environ, PATH=self.tmpdir)
+        env.pop(toolchain.PREFIX_ENV, None)
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT, env=env)
+        self.assertEqual(output.decode('utf-8').strip(), '')
+
+    def test_missing_tool(self):
+        cmuclmtk.set_toolchain(cmuclmtk.Toolchain(self.path('nonexistent')))
+        self.assertFalse(cmuclmtk.check_cmuclmtk_installation())
+        self.assertEqual(cmuclmtk.get_toolchain().missing(), list(toolchain.TOOLS))
+        with self.assertRaises(cmuclmtk.ToolNotFoundError):
+            cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'))
+
+    def test_prefix(self):
+        self.assertTrue(cmuclmtk.check_cmuclmtk_installation())
+        self.assertEqual(cmuclmtk.get_toolchain().path('text2wfreq'), os.path.join(self.bindir, 'text2wfreq'))
+        # The bin directory below the prefix is searched, too
+        cmuclmtk.set_toolchain(cmuclmtk.Toolchain(self.tmpdir))
+        self.assertEqual(cmuclmtk.get_toolchain().path('text2wfreq'), os.path.join(self.bindir, 'text2wfreq'))
+
+    def test_tool_override(self):
+        other = self.path('other-text2wfreq')
+        with open(other, 'w') as f:
+            f.write('#!/bin/sh\ncat >/dev/null\necho "overridden 1"\n')
+        os.chmod(other, 0o755)
+        cmuclmtk.set_toolchain(cmuclmtk.Toolchain(self.bindir, tools={'text2wfreq': other}))
+        cmuclmtk.text2wfreq('a b c', self.path('out.wfreq'))
+        with open(self.path('out.wfreq')) as f:
+            self.assertEqual(f.read(), 'overridden 1\n')
+        self.assertEqual(cmuclmtk.get_toolchain().path('wfreq2vocab'), os.path.join(self.bindir, 'wfreq2vocab'))
+
+    def test_lookup_is_cached(self):
+        chain = cmuclmtk.get_toolchain()
+        path = chain.path('text2wfreq')
+        os.rename(path, path + '.moved')
+        self.assertEqual(chain.path('text2wfreq'), path)
+        chain.clear()
+        with self.assertRaises(cmuclmtk.ToolNotFoundError):
+            chain.path('text2wfreq')
+
+    def test_capabilities(self):
+        self.add_tool('idngram2lm', 'echo "Usage : idngram2lm -idngram .id -vocab .vocab -arpa .arpa [ -cutoffs 0 0 ]"\n')
+        capabilities = cmuclmtk.get_toolchain().capabilities('idngram2lm')
+        self.assertIn('-cutoffs', capabilities)
+        self.assertIn('-idngram', capabilities)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-*-
+import pathlib
+import unittest
+import collections
+
+import cmuclmtk
+from cmuclmtk.vocab import sharded_text2vocab, select_vocab, read_wfreq
+from . import ToolTestCase
+
+def read_words(vocab_file):
+    with open(vocab_file, 'rb') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith(b'##')]
+
+class SelectVocabTest(unittest.TestCase):
+    def test_select_vocab(self):
+        counts = [(b'c', 3), (b'a', 1), (b'b', 3), (b'd', 2)]
+        self.assertEqual(select_vocab(counts, top=2), [b'b', b'c'])
+        self.assertEqual(select_vocab(counts, top=3, gt=2), [b'b', b'c', b'd'])
+        self.assertEqual(select_vocab(counts, gt=1), [b'b', b'c', b'd'])
+        # Of words with the same count, the first ones are kept
+        self.assertEqual(select_vocab(counts, top=1), [b'c'])
+
+class ShardedVocabTest(ToolTestCase):
+    def setUp(self):
+        super(ShardedVocabTest, self).setUp()
+        self.corpus_file = self.corpus()
+        with open(self.corpus_file, 'rb') as f:
+            self.counts = collections.Counter(f.read().split())
+
+    def test_word_counts(self):
+        for workers in (1, 3, 8):
+            with self.subTest(workers=workers):
+                sharded_text2vocab(self.corpus_file, self.path('sharded.vocab'), workers=workers, wfreq_file=self.path('sharded.wfreq'))
+                # No word is lost or split at the borders of the shards
+                self.assertEqual(list(read_wfreq(self.path('sharded.wfreq'))), sorted(self.counts.items()))
+
+    def test_gt(self):
+        cmuclmtk.text2vocab(pathlib.Path(self.corpus_file), self.path('expected.vocab'), wfreq2vocab_kwargs={'gt': 5})
+        sharded_text2vocab(self.corpus_file, self.path('sharded.vocab'), gt=5, workers=4)
+        self.assertEqual(read_words(self.path('sharded.vocab')), read_words(self.path('expected.vocab')))
+
+    def test_top(self):
+        cmuclmtk.text2vocab(pathlib.Path(self.corpus_file), self.path('expected.vocab'), wfreq2vocab_kwargs={'top': 300})
+        sharded_text2vocab(self.corpus_file, self.path('sharded.vocab'), top=300, workers=4)
+        words = read_words(self.path('sharded.vocab'))
+        self.assertEqual(words, sorted(words))
+        self.assertEqual(len(words), 300)
+        # Words with the count of the least frequent selected word may be chosen differently by wfreq2vocab
+        threshold = min(self.counts[word] for word in words)
+        expected = set(read_words(self.path('expected.vocab')))
+        self.assertEqual(set(word for word in words if self.counts[word] > threshold),
+                         set(word for word in expected if self.counts[word] > threshold))
+        self.assertTrue(all(self.counts[word] <= threshold for word in set(self.counts) - set(words)))
+
+if __name__ == '__main__':
+    unittest.main()